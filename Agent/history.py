@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+
+from config import CHAT_HISTORY_MAX_TOKENS, CHAT_HISTORY_KEEP_TURNS, CHAT_HISTORY_SUMMARY_MAX_TOKENS, \
+    CHAT_HISTORY_SUMMARY_LLM_MODEL_NAME, CHAT_HISTORY_SUMMARY_CACHE_SIZE, BASE_LLM_MODEL_NAME
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken встановлюється разом з langchain-openai, але є й проста оцінка без нього
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+Summarize the conversation between a customer and a consultant of the Aurora retail store.
+Keep the facts needed to continue the conversation: products, categories, prices and quantities
+that were discussed, the customer's preferences and open questions. Write in Ukrainian, at most
+{max_tokens} tokens, plain text.
+
+Previous summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Кількість токенів у тексті для моделі основного агента (без tiktoken — приблизно 4 символи на токен)."""
+    global _encoding, tiktoken
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(BASE_LLM_MODEL_NAME)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Файл кодування завантажується при першому використанні; без мережі рахуємо за довжиною
+            logger.warning("tiktoken encoding unavailable, estimating tokens by length: %s", e)
+            tiktoken = None
+            return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    # Кілька додаткових токенів на повідомлення: роль і роздільники формату чату
+    return count_tokens(message.content) + 4
+
+
+class HistoryCompactor:
+    """
+    Стискає історію чату перед передачею основному агенту.
+
+    Останні `keep_turns` ходів (пари повідомлень користувача та асистента) передаються дослівно, поки
+    вміщаються в `max_tokens`; усе старіше згортається в накопичувальне резюме. Резюме кешуються за
+    ланцюжковим хешем згорнутих повідомлень, тож перераховуються лише коли вікно зсувається, і тоді
+    до попереднього резюме додаються тільки щойно згорнуті повідомлення.
+    """
+
+    def __init__(self, max_tokens: int = CHAT_HISTORY_MAX_TOKENS, keep_turns: int = CHAT_HISTORY_KEEP_TURNS,
+                 summary_max_tokens: int = CHAT_HISTORY_SUMMARY_MAX_TOKENS,
+                 cache_size: int = CHAT_HISTORY_SUMMARY_CACHE_SIZE, llm=None):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+        self._llm = llm
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = ChatOpenAI(model=CHAT_HISTORY_SUMMARY_LLM_MODEL_NAME, temperature=0,
+                                   openai_api_key=os.getenv("GPT_API_KEY"))
+        return self._llm
+
+    def compact(self, chat_history: List[BaseMessage]) -> List[BaseMessage]:
+        """Історія для промпту: повідомлення з резюме (якщо є) та останні ходи."""
+        split = self._split_point(chat_history)
+        if split == 0:
+            return list(chat_history)
+        summary = self._summary_for(chat_history[:split])
+        summary_message = SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")
+        return [summary_message] + list(chat_history[split:])
+
+    def _split_point(self, chat_history: List[BaseMessage]) -> int:
+        """Індекс першого повідомлення, що передається дослівно; все до нього потрапляє в резюме."""
+        split = max(0, len(chat_history) - 2 * self.keep_turns)
+        budget = self.max_tokens - self.summary_max_tokens if split else self.max_tokens
+        used = sum(count_message_tokens(message) for message in chat_history[split:])
+        # Зсуваємо вікно цілими ходами, поки дослівна частина не вміститься в бюджет (останній хід лишається завжди)
+        while used > budget and split < len(chat_history) - 2:
+            used -= sum(count_message_tokens(message) for message in chat_history[split:split + 2])
+            split = min(split + 2, len(chat_history))
+            budget = self.max_tokens - self.summary_max_tokens
+        return split
+
+    def _summary_for(self, folded: List[BaseMessage]) -> str:
+        digests = _chained_digests(folded)
+        key = digests[-1]
+        with self._mutex:
+            if key in self._summaries:
+                self._summaries.move_to_end(key)
+                return self._summaries[key]
+            # Шукаємо найдовший префікс, для якого вже є резюме, і підсумовуємо лише згорнуте після нього
+            start, summary = 0, ""
+            for index in range(len(digests) - 2, -1, -1):
+                if digests[index] in self._summaries:
+                    start, summary = index + 1, self._summaries[digests[index]]
+                    break
+
+        summary = self._summarize(summary, folded[start:])
+
+        with self._mutex:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        rendered = "\n".join(
+            f"{'Customer' if isinstance(message, HumanMessage) else 'Consultant'}: {message.content}"
+            for message in messages
+        )
+        prompt = SUMMARY_PROMPT.format(max_tokens=self.summary_max_tokens, summary=summary or "(none)",
+                                       messages=rendered)
+        return self.llm.invoke(prompt).content.strip()
+
+
+def _chained_digests(messages: List[BaseMessage]) -> List[str]:
+    """digests[i] ідентифікує messages[:i + 1]: однакові префікси двох історій мають однакові хеші."""
+    digests = []
+    running = hashlib.sha1()
+    for message in messages:
+        running.update(message.type.encode())
+        running.update(b"\0")
+        running.update(message.content.encode("utf-8"))
+        running.update(b"\0")
+        digests.append(running.copy().hexdigest())
+    return digests
+
+
+history_compactor = HistoryCompactor()
+
+
+def compact_chat_history(chat_history: List[BaseMessage]) -> List[BaseMessage]:
+    return history_compactor.compact(chat_history)
@@ -1,4 +1,5 @@
 import os
+import threading
 from typing import List
 from datetime import datetime, timezone
 
@@ -6,6 +7,8 @@ from langchain_core.agents import AgentAction
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 
+from Agent.history import compact_chat_history
+from Agent.scratchpad import scratchpad_builder
 from Tools.tools_innit import tools
 from config import BASE_LLM_MODEL_NAME, TEMPERATURE
 
@@ -102,43 +105,52 @@ MAIN_AGENT_PROMPT = ChatPromptTemplate.from_messages([
     ("assistant", "Current intermediate_steps: {intermediate_steps}")
 ])
 
-llm = ChatOpenAI(
-    model=BASE_LLM_MODEL_NAME,
-    openai_api_key=os.getenv("GPT_API_KEY"),
-    # temperature=TEMPERATURE
-)
+# LLM і пайплайн створюються при першому використанні (або під час прогріву на старті),
+# тому імпорт модуля не створює HTTP-клієнтів і не потребує API-ключа
+_llm = None
+_main_agent_pipeline = None
+_init_lock = threading.Lock()
+
+
+def get_llm() -> ChatOpenAI:
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                _llm = ChatOpenAI(
+                    model=BASE_LLM_MODEL_NAME,
+                    openai_api_key=os.getenv("GPT_API_KEY"),
+                    # temperature=TEMPERATURE
+                )
+    return _llm
 
 
 def create_scratchpad(intermediate_steps: List[AgentAction]) -> str:
     """
     Створюємо текстове представлення історії інструментальних викликів (scratchpad),
     яке передається агенту в якості промпту.
+    Кожен крок рендериться один раз, великі результати обрізаються, а повторні виклики
+    з тим самим входом замінюються посиланням на останній такий крок.
     """
-    # print("[DEBUG] Creating scratchpad from intermediate_steps.")
-    research_steps = []
-    for i, action in enumerate(intermediate_steps):
-        if action.log != "TBD":
-            research_steps.append(
-                f"Tool: {action.tool}\nInput: {action.tool_input}\nOutput: {action.log}"
-            )
-        else:
-            # Якщо ще не було запущено інструмент і log = "TBD"
-            research_steps.append(
-                f"Tool: {action.tool}\nInput: {action.tool_input}\nOutput: [no output yet]"
-            )
-    scratchpad_text = "\n---\n".join(research_steps)
-    # print("[DEBUG] Scratchpad:\n", scratchpad_text)
-    return scratchpad_text
-
-
-main_agent_pipeline = (
-    {
-        # Підготувати вхідні дані для промпту
-        "input": lambda state: state["input"],
-        "chat_history": lambda state: state["chat_history"],
-        "intermediate_steps": lambda state: create_scratchpad(state["intermediate_steps"]),
-    }
-    # Промпт
-    | MAIN_AGENT_PROMPT
-    | llm.bind_tools(tools, tool_choice="auto")
-)
+    return scratchpad_builder.build(intermediate_steps)
+
+
+def get_main_agent_pipeline():
+    global _main_agent_pipeline
+    if _main_agent_pipeline is None:
+        llm_with_tools = get_llm().bind_tools(tools, tool_choice="auto")
+        with _init_lock:
+            if _main_agent_pipeline is None:
+                _main_agent_pipeline = (
+                    {
+                        # Підготувати вхідні дані для промпту
+                        "input": lambda state: state["input"],
+                        # Старі повідомлення згортаються у підсумок, щоб промпт не ріс разом з розмовою
+                        "chat_history": lambda state: compact_chat_history(state["chat_history"]),
+                        "intermediate_steps": lambda state: create_scratchpad(state["intermediate_steps"]),
+                    }
+                    # Промпт
+                    | MAIN_AGENT_PROMPT
+                    | llm_with_tools
+                )
+    return _main_agent_pipeline
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+from langchain_core.agents import AgentAction
+
+from Agent.history import count_tokens
+from Tools.tool_cache import tool_call_key
+from config import SCRATCHPAD_STEP_MAX_TOKENS, SCRATCHPAD_CACHE_SIZE, METRICS_ENABLED
+from metrics import SCRATCHPAD_TOKENS
+
+logger = logging.getLogger(__name__)
+
+STEP_SEPARATOR = "\n---\n"
+
+
+def step_key(action: AgentAction) -> str:
+    """Ідентифікатор виклику інструмента: назва інструмента та канонічний JSON його аргументів."""
+    return tool_call_key(action.tool, action.tool_input)
+
+
+def truncate_output(output: str, max_tokens: int) -> str:
+    """
+    Обрізає результат інструмента до max_tokens по межах рядків. Результати інструментів подаються
+    таблицями з одним рядком даних на рядок тексту (див. Tools.tool_results), тож рядки не обрізаються посередині.
+    """
+    if count_tokens(output) <= max_tokens:
+        return output
+
+    lines = output.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        line_tokens = count_tokens(line) + 1
+        if used + line_tokens > max_tokens:
+            break
+        kept.append(line)
+        used += line_tokens
+
+    if not kept:
+        # Один величезний рядок: обрізаємо за символами (приблизно 4 символи на токен)
+        return output[:max_tokens * 4] + "\n[... output truncated]"
+    return "\n".join(kept) + f"\n[... {len(lines) - len(kept)} more lines omitted]"
+
+
+class ScratchpadBuilder:
+    """
+    Формує з intermediate_steps текст scratchpad для основного агента.
+
+    - кожен крок форматується (і його токени рахуються) один раз, а далі береться з LRU-кешу,
+      тож повторні проходи через main_agent форматують лише нові кроки;
+    - великі результати обрізаються до `step_max_tokens`;
+    - крок, який пізніше повторено тим самим інструментом з тими самими аргументами, замінюється
+      коротким посиланням, щоб однаковий результат не надсилався LLM двічі.
+    """
+
+    def __init__(self, step_max_tokens: int = SCRATCHPAD_STEP_MAX_TOKENS, cache_size: int = SCRATCHPAD_CACHE_SIZE):
+        self.step_max_tokens = step_max_tokens
+        self.cache_size = cache_size
+        self._rendered: "OrderedDict[Tuple[str, str], Tuple[str, int]]" = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def render_step(self, action: AgentAction) -> Tuple[str, int]:
+        """Текст одного кроку та кількість його токенів."""
+        cache_key = (step_key(action), hashlib.sha1(action.log.encode("utf-8")).hexdigest())
+        with self._mutex:
+            cached = self._rendered.get(cache_key)
+            if cached is not None:
+                self._rendered.move_to_end(cache_key)
+                return cached
+
+        if action.log == "TBD":
+            # Якщо ще не було запущено інструмент і log = "TBD"
+            output = "[no output yet]"
+        else:
+            output = truncate_output(action.log, self.step_max_tokens)
+        text = f"Tool: {action.tool}\nInput: {action.tool_input}\nOutput: {output}"
+        rendered = (text, count_tokens(text))
+
+        with self._mutex:
+            self._rendered[cache_key] = rendered
+            while len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        return rendered
+
+    def build(self, intermediate_steps: List[AgentAction]) -> str:
+        last_index = {step_key(action): index for index, action in enumerate(intermediate_steps)}
+
+        parts, tokens = [], 0
+        for index, action in enumerate(intermediate_steps):
+            superseded_by = last_index[step_key(action)]
+            if superseded_by != index:
+                text = f"Tool: {action.tool}\nInput: {action.tool_input}\nOutput: [same as step {superseded_by + 1}]"
+                text_tokens = count_tokens(text)
+            else:
+                text, text_tokens = self.render_step(action)
+            parts.append(text)
+            tokens += text_tokens
+
+        # Builder спільний для паралельних запитів, тому кількість токенів іде в гістограму, а не в атрибут
+        if METRICS_ENABLED:
+            SCRATCHPAD_TOKENS.observe(tokens)
+        logger.info("Scratchpad: %d steps, %d tokens", len(intermediate_steps), tokens)
+        return STEP_SEPARATOR.join(parts)
+
+
+scratchpad_builder = ScratchpadBuilder()
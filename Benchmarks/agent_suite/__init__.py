@@ -0,0 +1,8 @@
+"""
+Deterministic end-to-end benchmark of the assistant with scripted stand-ins for OpenAI.
+
+The main agent LLM, the sql_db_tool LLM, the chat-history summarizer and the embeddings of the FAISS
+tools are replaced by fakes with a fixed latency (fakes.py). The graph, the tools, sqlite, FAISS, the
+caches and the HTTP layer run for real through multi-tool conversations (scenarios.py), so the
+numbers change only when the code does. See __main__.py for the report and the baseline comparison.
+"""
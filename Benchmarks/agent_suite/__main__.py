@@ -0,0 +1,298 @@
+"""
+End-to-end benchmark with scripted LLMs and embeddings (no network, no API costs).
+
+Phases:
+    sequential  - every conversation of scenarios.py through run_user_query (the sync graph path):
+                  latency per turn (p50/p95/p99), mean time per graph node, tool, sqlite query and
+                  FAISS search, LLM calls and tokens per turn
+    concurrent  - `--concurrency` virtual users run the conversations through POST /chat of the
+                  FastAPI app (the async path, in process): requests per second and latency
+    memory      - one more sequential pass under tracemalloc: peak traced memory and peak RSS
+
+The results are compared with a baseline file (`--baseline`, written with `--save-baseline`).
+`--fail-above 10` exits with status 1 when a latency, token or memory figure got more than 10% worse.
+By default caches stay warm between conversations (steady state); `--cold` clears the SQL, tool-call
+and template caches before every conversation of the sequential phases and before the concurrent one.
+
+With `--cassette` the conversations and the replies come from a cassette recorded against the real
+models (see cassette.py): the LLM and embedding latencies are the recorded ones times `--replay-speed`,
+and the baseline defaults to `<cassette>.baseline.json`.
+
+Run from the repository root:
+    python -m Benchmarks.agent_suite --repeat 5 --concurrency 8
+    python -m Benchmarks.agent_suite --save-baseline
+    python -m Benchmarks.agent_suite --cassette Benchmarks/agent_suite/cassettes/mix.jsonl.gz --fail-above 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env")
+# The fakes need no key, but the OpenAI client classes are still imported
+os.environ.setdefault("GPT_API_KEY", "sk-benchmark")
+
+from Benchmarks.agent_suite.cassette import Cassette, CassetteEmbeddings, replay_models, turn_context
+from Benchmarks.agent_suite.fakes import FakeEmbeddings, install
+from Benchmarks.agent_suite.scenarios import CONVERSATIONS, scripted_models
+from metrics import LLM_SECONDS, LLM_TOKENS, SPAN_SECONDS
+
+try:
+    import httpx
+except ImportError:  # comes with the FastAPI test client; without it the concurrent phase is skipped
+    httpx = None
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Figures where a higher value is better; for every other figure lower is better
+HIGHER_IS_BETTER = {"concurrent.requests_per_second"}
+# Figures that depend on the machine or the run size rather than on the code
+NOT_COMPARED = {"concurrent.requests", "sequential.turns", "memory.max_rss_mib"}
+# A latency figure counts as worse only if it also grew by at least this much (sub-millisecond spans are noisy)
+MIN_CHANGE_MS = 1.0
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(timings_ms: List[float]) -> Dict[str, float]:
+    return {"mean_ms": round(statistics.mean(timings_ms), 2),
+            **{f"p{p}_ms": round(percentile(timings_ms, p), 2) for p in (50, 95, 99)}}
+
+
+def samples(metric) -> Dict[Tuple[str, Tuple[str, ...]], float]:
+    """Current values of a Prometheus metric: {(sample suffix, label values): value}."""
+    values = {}
+    for family in metric.collect():
+        for sample in family.samples:
+            suffix = sample.name[len(family.name):]
+            values[(suffix, tuple(sample.labels.values()))] = sample.value
+    return values
+
+
+def delta(after, before):
+    return {key: value - before.get(key, 0.0) for key, value in after.items() if value != before.get(key, 0.0)}
+
+
+def reset_caches() -> None:
+    from Tools import sql_db_tool
+    from Tools.query_templates import QueryTemplateLibrary
+    from Tools.tool_cache import tool_call_cache
+
+    sql_db_tool.sql_cache.queries.clear()
+    sql_db_tool.sql_cache.results.clear()
+    sql_db_tool.query_templates = QueryTemplateLibrary(log_path=None)
+    tool_call_cache.shared.clear()
+
+
+def run_sequential(conversations: Dict[str, List[str]], repeat: int, cold: bool, tag: str) -> List[float]:
+    from chat import run_user_query
+
+    timings = []
+    for round_index in range(repeat):
+        for name, turns in conversations.items():
+            if cold:
+                reset_caches()
+            user_id = f"{tag}-{name}-{round_index}"
+            for index, text in enumerate(turns):
+                with turn_context(f"{name}/{index}"):
+                    started = time.perf_counter()
+                    run_user_query(user_id, text)
+                    timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run_concurrent(conversations: Dict[str, List[str]], concurrency: int, repeat: int,
+                         cold: bool) -> Tuple[List[float], float, int]:
+    from api import app
+
+    timings, errors = [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def user(worker: int):
+            nonlocal errors
+            for round_index in range(repeat):
+                for name, turns in conversations.items():
+                    user_id = f"api-{worker}-{name}-{round_index}"
+                    for index, text in enumerate(turns):
+                        with turn_context(f"{name}/{index}"):
+                            started = time.perf_counter()
+                            response = await client.post("/chat", json={"user_id": user_id, "input": text})
+                            timings.append((time.perf_counter() - started) * 1000)
+                        errors += response.status_code != 200
+
+        if cold:
+            reset_caches()
+        started = time.perf_counter()
+        await asyncio.gather(*(user(worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return timings, elapsed, errors
+
+
+def node_report(before, after, turns: int) -> Dict[str, Dict[str, float]]:
+    totals: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for (suffix, labels), value in delta(after, before).items():
+        if suffix in ("_count", "_sum"):
+            totals[":".join(labels)][suffix] = value
+    report = {}
+    for name, values in sorted(totals.items()):
+        count = values.get("_count", 0)
+        if count:
+            report[name] = {"calls_per_turn": round(count / turns, 2),
+                            "mean_ms": round(values.get("_sum", 0.0) / count * 1000, 2)}
+    return report
+
+
+def llm_report(seconds_before, seconds_after, tokens_before, tokens_after, turns: int) -> Dict[str, float]:
+    calls = sum(value for (suffix, _), value in delta(seconds_after, seconds_before).items() if suffix == "_count")
+    tokens = defaultdict(float)
+    for (suffix, labels), value in delta(tokens_after, tokens_before).items():
+        if suffix == "_total":
+            tokens[labels[-1]] += value
+    return {"calls_per_turn": round(calls / turns, 2),
+            "prompt_tokens_per_turn": round(tokens["prompt"] / turns, 1),
+            "completion_tokens_per_turn": round(tokens["completion"] / turns, 1)}
+
+
+def flatten(report: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, fail_above: float, out=sys.stdout) -> bool:
+    """Prints the changes against the baseline; False when a figure got worse by more than fail_above %."""
+    if baseline.get("config") != report["config"]:
+        print(f"Note: the baseline was recorded with {baseline.get('config')}; the figures are not comparable.",
+              file=out)
+    current, previous = flatten(report), flatten(baseline)
+    ok = True
+    print(f"\n{'metric':<58} {'baseline':>11} {'current':>11} {'change':>8}", file=out)
+    for path, value in current.items():
+        if path.startswith(("config.", "cassette.")) or path in NOT_COMPARED or path not in previous:
+            continue
+        old = previous[path]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = -change if path in HIGHER_IS_BETTER else change
+        flag = ""
+        noise = path.endswith("_ms") and abs(value - old) < MIN_CHANGE_MS
+        if fail_above is not None and worse > fail_above and not noise:
+            flag, ok = "  WORSE", False
+        print(f"{path:<58} {old:>11.2f} {value:>11.2f} {change:>+7.1f}%{flag}", file=out)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the conversations per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="Virtual users of the concurrent phase")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Seconds per fake embedding call")
+    parser.add_argument("--cold", action="store_true", help="Clear the caches before every conversation")
+    parser.add_argument("--cassette", help="Replay this recorded cassette instead of the scripted models")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Multiplier of the recorded latencies when replaying a cassette (0 = no waiting)")
+    parser.add_argument("--baseline", help=f"Default: {os.path.relpath(BASELINE_PATH)}, or <cassette>.baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--fail-above", type=float, help="Exit with 1 if a figure got worse by more than this %%")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    cassette = None
+    if args.cassette:
+        cassette = Cassette.load(args.cassette)
+        conversations = cassette.conversations
+        install(replay_models(cassette, args.replay_speed), CassetteEmbeddings(cassette, speed=args.replay_speed))
+        args.baseline = args.baseline or f"{args.cassette.rsplit('.jsonl', 1)[0]}.baseline.json"
+        models = {"cassette": os.path.basename(args.cassette), "replay_speed": args.replay_speed}
+    else:
+        conversations = {name: [turn.user for turn in turns] for name, turns in CONVERSATIONS.items()}
+        install(scripted_models(args.llm_latency), FakeEmbeddings(args.embedding_latency))
+        args.baseline = args.baseline or BASELINE_PATH
+        models = {"llm_latency": args.llm_latency, "embedding_latency": args.embedding_latency}
+    turns_per_pass = sum(len(turns) for turns in conversations.values())
+    report = {"config": {"repeat": args.repeat, "concurrency": args.concurrency, **models, "cold": args.cold,
+                         "conversations": len(conversations), "turns_per_pass": turns_per_pass}}
+
+    # Loads indexes, schema and catalog, and fills the caches in warm mode; not measured
+    run_sequential(conversations, 1, args.cold, "warmup")
+
+    spans, llm_seconds, llm_tokens = samples(SPAN_SECONDS), samples(LLM_SECONDS), samples(LLM_TOKENS)
+    timings = run_sequential(conversations, args.repeat, args.cold, "seq")
+    report["sequential"] = {"turns": len(timings), **latency_summary(timings)}
+    report["llm"] = llm_report(llm_seconds, samples(LLM_SECONDS), llm_tokens, samples(LLM_TOKENS), len(timings))
+    report["nodes"] = node_report(spans, samples(SPAN_SECONDS), len(timings))
+
+    if httpx is not None:
+        timings, elapsed, errors = asyncio.run(run_concurrent(conversations, args.concurrency, args.repeat,
+                                                             args.cold))
+        report["concurrent"] = {"requests": len(timings), "errors": errors,
+                                "requests_per_second": round(len(timings) / elapsed, 2), **latency_summary(timings)}
+    else:
+        print("httpx is not installed; skipping the concurrent phase.", file=sys.stderr)
+
+    tracemalloc.start()
+    run_sequential(conversations, 1, args.cold, "memory")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in KiB on Linux
+    report["memory"] = {"peak_traced_mib": round(peak / 2 ** 20, 2),
+                        "max_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if cassette is not None:
+        # Fallbacks and misses mean the requests changed since the recording
+        report["cassette"] = cassette.stats()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        sequential, llm = report["sequential"], report["llm"]
+        print(f"Sequential: {sequential['turns']} turns   mean {sequential['mean_ms']:.1f} ms   "
+              f"p50 {sequential['p50_ms']:.1f}   p95 {sequential['p95_ms']:.1f}   p99 {sequential['p99_ms']:.1f} ms")
+        print(f"LLM per turn: {llm['calls_per_turn']} calls, {llm['prompt_tokens_per_turn']} prompt and "
+              f"{llm['completion_tokens_per_turn']} completion tokens")
+        print(f"\n{'span':<40} {'calls/turn':>10} {'mean ms':>9}")
+        for name, values in report["nodes"].items():
+            print(f"{name:<40} {values['calls_per_turn']:>10.2f} {values['mean_ms']:>9.2f}")
+        if "concurrent" in report:
+            concurrent = report["concurrent"]
+            print(f"\nConcurrent ({args.concurrency} users): {concurrent['requests']} requests, "
+                  f"{concurrent['errors']} errors, {concurrent['requests_per_second']:.1f} req/s   "
+                  f"p50 {concurrent['p50_ms']:.1f}   p95 {concurrent['p95_ms']:.1f}   p99 {concurrent['p99_ms']:.1f} ms")
+        print(f"Memory: peak traced {report['memory']['peak_traced_mib']} MiB, "
+              f"peak RSS {report['memory']['max_rss_mib']} MiB")
+        if cassette is not None:
+            print(f"Cassette: {report['cassette']}")
+
+    # With --json, stdout carries only the results
+    out, ok = sys.stderr if args.json else sys.stdout, True
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}", file=out)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            ok = compare(report, json.load(f), args.fail_above, out)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
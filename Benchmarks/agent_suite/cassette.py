@@ -0,0 +1,331 @@
+"""
+Record/replay cassettes of the OpenAI traffic of real conversations.
+
+Recording runs conversations through run_user_query against the real models: every request of the
+main agent, of sql_db_tool (write_query, rephrase_query, the speculative candidates) and of the history
+summarizer is stored with its reply (text, tool calls or structured output), token usage and latency,
+and so is every embedding vector. Replaying serves those replies offline, so the benchmark suite can
+measure latency, LLM round trips and prompt tokens per turn on the real conversation mix:
+
+    python -m Benchmarks.agent_suite.cassette record --out Benchmarks/agent_suite/cassettes/mix.jsonl.gz
+    python -m Benchmarks.agent_suite --cassette Benchmarks/agent_suite/cassettes/mix.jsonl.gz --save-baseline
+    python -m Benchmarks.agent_suite --cassette Benchmarks/agent_suite/cassettes/mix.jsonl.gz --fail-above 10
+
+Requests are keyed by a hash of the normalized request: component, messages with whitespace collapsed
+and the current date masked, tool names, tool choice and output schema. When a change to the prompts
+or the graph produces a request that was not recorded, the reply recorded at the same position of the
+same turn (the n-th call of that component) is served instead and counted as a fallback; its prompt
+tokens are scaled by the size of the new prompt, so prompt growth still shows in the token figures.
+
+A cassette is a gzip-compressed JSONL file: a header with the conversations and models, then one line
+per distinct request or embedded text. Vectors are stored as base64 float32.
+"""
+import argparse
+import base64
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage
+
+from Benchmarks.agent_suite.fakes import OPENAI_EMBEDDING_DIM, ScriptedChatModel, install
+from Tools.product_vector_index import HashingEmbedder
+
+CASSETTE_VERSION = 1
+COMPONENTS = ("main", "sql", "summary")
+
+# The main agent prompt contains the time the process started
+_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}( [A-Z]{2,5})?")
+
+# (turn id, calls made so far in this turn per component); set by the code that runs the conversations.
+# copy_context() in the graph and the tool pool carries it into the threads of the turn.
+_turn: contextvars.ContextVar[Optional[Tuple[str, Counter]]] = contextvars.ContextVar("cassette_turn", default=None)
+
+
+@contextmanager
+def turn_context(turn_id: str) -> Iterator[None]:
+    """Marks the calls made inside as belonging to one turn of a conversation ("<conversation>/<index>")."""
+    token = _turn.set((turn_id, Counter()))
+    try:
+        yield
+    finally:
+        _turn.reset(token)
+
+
+def _position(component: str) -> Tuple[Optional[str], int]:
+    current = _turn.get()
+    if current is None:
+        return None, 0
+    turn_id, calls = current
+    position = calls[component]
+    calls[component] += 1
+    return turn_id, position
+
+
+def _text(content: Any) -> str:
+    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return _DATETIME.sub("<now>", " ".join(text.split()))
+
+
+def normalize_request(component: str, messages: List[BaseMessage], options: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a chat request that decide the reply, in a stable form."""
+    return {
+        "component": component,
+        "messages": [[message.type, _text(message.content),
+                      [[call["name"], call["args"]] for call in getattr(message, "tool_calls", None) or []]]
+                     for message in messages],
+        "tools": sorted(tool["function"]["name"] for tool in options.get("tools") or []),
+        "tool_choice": options.get("tool_choice"),
+        "structured": options.get("structured"),
+    }
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()[:24]
+
+
+def _prompt_chars(request: Dict[str, Any]) -> int:
+    return sum(len(text) for _, text, _ in request["messages"])
+
+
+class Cassette:
+    """Recorded chat replies and embedding vectors, with hit/fallback/miss counters for replay."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict[str, Any] = {"type": "header", "version": CASSETTE_VERSION, "conversations": {},
+                                       "models": {}}
+        self.chats: Dict[str, dict] = {}
+        self.by_position: Dict[Tuple[str, str, int], dict] = {}
+        self.vectors: Dict[str, dict] = {}
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["type"] == "header":
+                    if entry.get("version") != CASSETTE_VERSION:
+                        raise ValueError(f"{path}: cassette version {entry.get('version')}, "
+                                         f"expected {CASSETTE_VERSION}; record it again")
+                    cassette.header = entry
+                elif entry["type"] == "chat":
+                    cassette._add_chat(entry)
+                elif entry["type"] == "embedding":
+                    cassette.vectors[entry["key"]] = entry
+        return cassette
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8", compresslevel=9) as f:
+            for entry in [self.header, *self.chats.values(), *self.vectors.values()]:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _add_chat(self, entry: dict) -> None:
+        self.chats.setdefault(entry["key"], entry)
+        if entry.get("turn") is not None:
+            self.by_position.setdefault((entry["turn"], entry["component"], entry["position"]), entry)
+
+    @property
+    def conversations(self) -> Dict[str, List[str]]:
+        return self.header["conversations"]
+
+    # Recording
+
+    def recorder(self, component: str, llm):
+        """respond() for ScriptedChatModel that asks the real `llm` and stores the exchange."""
+        self.header["models"][component] = getattr(llm, "model_name", None) or type(llm).__name__
+
+        def respond(messages: List[BaseMessage], options: Dict[str, Any]) -> Tuple[AIMessage, float]:
+            turn_id, position = _position(component)
+            started = time.perf_counter()
+            if options.get("structured"):
+                output = llm.with_structured_output(options["schema"], include_raw=True).invoke(messages)
+                raw = output["raw"]
+                message = AIMessage(content=json.dumps(output["parsed"], ensure_ascii=False))
+            else:
+                runnable = llm.bind_tools(options["tools"], tool_choice=options.get("tool_choice")) \
+                    if options.get("tools") else llm
+                raw = message = runnable.invoke(messages)
+            seconds = time.perf_counter() - started
+            message.usage_metadata = raw.usage_metadata
+            request = normalize_request(component, messages, options)
+            entry = {"type": "chat", "key": request_key(request), "component": component, "turn": turn_id,
+                     "position": position, "content": message.content,
+                     "tool_calls": [{"name": call["name"], "args": call["args"], "id": call["id"]}
+                                    for call in message.tool_calls],
+                     "usage": dict(raw.usage_metadata or {}), "prompt_chars": _prompt_chars(request),
+                     "seconds": round(seconds, 4)}
+            with self._lock:
+                self._add_chat(entry)
+                self.counters[f"{component}_recorded"] += 1
+            return message, 0.0
+
+        return respond
+
+    def record_vectors(self, model: str, texts: List[str], vectors: List[List[float]], seconds: float) -> None:
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                self.vectors.setdefault(text_key(model, text), {
+                    "type": "embedding", "key": text_key(model, text), "seconds": round(seconds / len(texts), 4),
+                    "vector": base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")})
+                self.counters["embedding_recorded"] += 1
+
+    # Replay
+
+    def replayer(self, component: str, speed: float = 1.0):
+        """respond() for ScriptedChatModel that serves recorded replies, waiting `speed` x the recorded time."""
+
+        def respond(messages: List[BaseMessage], options: Dict[str, Any]) -> Tuple[AIMessage, float]:
+            turn_id, position = _position(component)
+            request = normalize_request(component, messages, options)
+            entry = self.chats.get(request_key(request))
+            outcome = "hit"
+            if entry is None:
+                entry = self.by_position.get((turn_id, component, position))
+                outcome = "fallback" if entry is not None else "miss"
+            with self._lock:
+                self.counters[f"{component}_{outcome}"] += 1
+            if entry is None:
+                raise KeyError(f"No recorded {component} reply for turn {turn_id}, call {position + 1}; "
+                               f"record the cassette again")
+            usage = dict(entry["usage"])
+            if outcome == "fallback" and usage.get("input_tokens") and entry.get("prompt_chars"):
+                # Same tokens per character as the recorded prompt
+                usage["input_tokens"] = round(usage["input_tokens"] * _prompt_chars(request) / entry["prompt_chars"])
+                usage["total_tokens"] = usage["input_tokens"] + usage.get("output_tokens", 0)
+            message = AIMessage(content=entry["content"], tool_calls=[dict(call) for call in entry["tool_calls"]],
+                                usage_metadata=usage)
+            return message, entry["seconds"] * speed
+
+        return respond
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self.counters.items()))
+
+
+class CassetteEmbeddings(Embeddings):
+    """
+    Embeddings that record the vectors of `inner` into the cassette, or (without `inner`) replay them.
+    A text that was never recorded gets a HashingEmbedder vector and is counted as a miss.
+    """
+
+    def __init__(self, cassette: Cassette, inner: Optional[Embeddings] = None, speed: float = 1.0):
+        self.cassette = cassette
+        self.inner = inner
+        self.speed = speed
+        self.model = cassette.header.setdefault("embedding_model", getattr(inner, "model", None) or "unknown")
+        self._fallback = HashingEmbedder(OPENAI_EMBEDDING_DIM)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.inner is not None:
+            started = time.perf_counter()
+            vectors = self.inner.embed_documents(texts)
+            self.cassette.record_vectors(self.model, texts, vectors, time.perf_counter() - started)
+            return vectors
+        vectors, seconds = [], 0.0
+        for text in texts:
+            entry = self.cassette.vectors.get(text_key(self.model, text))
+            with self.cassette._lock:
+                self.cassette.counters["embedding_hit" if entry else "embedding_miss"] += 1
+            if entry is None:
+                vectors.append(self._fallback.embed_query(text))
+                continue
+            vectors.append(np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32).tolist())
+            seconds = max(seconds, entry["seconds"])
+        time.sleep(seconds * self.speed)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def replay_models(cassette: Cassette, speed: float = 1.0) -> Dict[str, ScriptedChatModel]:
+    return {component: ScriptedChatModel(respond=cassette.replayer(component, speed),
+                                         model_name=f"replay:{cassette.header['models'].get(component, component)}")
+            for component in COMPONENTS}
+
+
+def record(path: str, conversations: Dict[str, List[str]]) -> Cassette:
+    """Runs the conversations against the real models and writes the cassette."""
+    from Agent import history, main_agent
+    from Tools import embedding_cache, sql_db_tool
+    from chat import run_user_query
+
+    cassette = Cassette(path)
+    cassette.header.update({"conversations": conversations, "created": round(time.time())})
+    # The real clients, created before install() points the application at the recorders
+    real = {"main": main_agent.get_llm(), "sql": sql_db_tool.get_llm(), "summary": history.history_compactor.llm}
+    embeddings = CassetteEmbeddings(cassette, inner=embedding_cache.get_embeddings())
+    install({component: ScriptedChatModel(respond=cassette.recorder(component, llm),
+                                          model_name=f"record:{cassette.header['models'][component]}")
+             for component, llm in real.items()}, embeddings)
+
+    for name, turns in conversations.items():
+        user_id = f"cassette-{name}-{round(time.time())}"
+        for index, text in enumerate(turns):
+            with turn_context(f"{name}/{index}"):
+                response = run_user_query(user_id, text)
+            print(f"{name}/{index}: {text!r} -> {json.dumps(response, ensure_ascii=False)[:120]}")
+    cassette.save()
+    return cassette
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=".env")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record conversations against the real OpenAI models")
+    record_parser.add_argument("--out", required=True, help="Cassette to write (.jsonl.gz)")
+    record_parser.add_argument("--conversations", help='JSON file {"name": ["message", ...], ...} '
+                                                       "(default: the user messages of scenarios.py)")
+    info_parser = commands.add_parser("info", help="Summarize a cassette")
+    info_parser.add_argument("cassette")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.conversations:
+            with open(args.conversations, encoding="utf-8") as f:
+                conversations = json.load(f)
+        else:
+            from Benchmarks.agent_suite.scenarios import CONVERSATIONS
+
+            conversations = {name: [turn.user for turn in turns] for name, turns in CONVERSATIONS.items()}
+        cassette = record(args.out, conversations)
+        print(f"\n{cassette.stats()}\nWritten {args.out} ({os.path.getsize(args.out) / 1024:.0f} KiB)")
+    else:
+        cassette = Cassette.load(args.cassette)
+        per_component = Counter(entry["component"] for entry in cassette.chats.values())
+        tokens = Counter()
+        for entry in cassette.chats.values():
+            tokens[entry["component"]] += entry["usage"].get("input_tokens", 0)
+        print(f"{args.cassette}: {os.path.getsize(args.cassette) / 1024:.0f} KiB, models {cassette.header['models']}, "
+              f"embedding model {cassette.header.get('embedding_model')}")
+        print(f"{len(cassette.conversations)} conversations, "
+              f"{sum(map(len, cassette.conversations.values()))} turns, {len(cassette.vectors)} embedded texts")
+        for component, count in sorted(per_component.items()):
+            print(f"  {component:<8} {count:4d} requests, {tokens[component]:7d} prompt tokens")
+
+
+if __name__ == "__main__":
+    main()
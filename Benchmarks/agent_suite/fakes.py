@@ -0,0 +1,133 @@
+"""
+Scripted fakes for the OpenAI clients.
+
+ScriptedChatModel answers through a `respond(messages, options)` function after a fixed latency and
+reports token usage (about 4 characters per token), so the LLM metrics see realistic calls.
+bind_tools() and with_structured_output() work the way the code under test uses them: the tools and the
+schema reach `respond` in `options`, and a structured reply is a message whose content is the JSON
+object. The record/replay cassettes (cassette.py) use the same protocol. FakeEmbeddings
+wraps the repository's deterministic HashingEmbedder with a latency and the dimension of the FAISS
+indexes on disk.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from Tools.product_vector_index import HashingEmbedder
+
+# Dimension of text-embedding-ada-002 / text-embedding-3-small, which built the shop and holiday indexes
+OPENAI_EMBEDDING_DIM = 1536
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+# A reply, or a reply with its own latency in seconds
+Reply = Union[AIMessage, Tuple[AIMessage, float]]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model whose replies come from `respond`. Every call takes `latency` seconds unless the reply
+    brings its own, and replies without usage_metadata get an estimated one.
+    """
+
+    respond: Callable[[List[BaseMessage], Dict[str, Any]], Reply]
+    latency: float = 0.0
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency": self.latency}
+
+    def _reply(self, messages: List[BaseMessage], options: Dict[str, Any]) -> Tuple[ChatResult, float]:
+        reply = self.respond(messages, options)
+        message, latency = reply if isinstance(reply, tuple) else (reply, self.latency)
+        if message.usage_metadata is None:
+            prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+            completion_tokens = estimate_tokens(str(message.content)
+                                                + json.dumps(message.tool_calls, ensure_ascii=False))
+            message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                                      "total_tokens": prompt_tokens + completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)]), latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, latency = self._reply(messages, kwargs)
+        time.sleep(latency)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, latency = self._reply(messages, kwargs)
+        await asyncio.sleep(latency)
+        return result
+
+    def bind_tools(self, tools, *, tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        # The reply content is the JSON object; `structured` tells respond() which schema is asked for
+        def parse(message: AIMessage):
+            parsed = json.loads(message.content)
+            return {"raw": message, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+
+        return self.bind(structured=schema.__name__, schema=schema) | RunnableLambda(parse)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings with the latency of one API round trip per call."""
+
+    def __init__(self, latency: float = 0.0, dim: int = OPENAI_EMBEDDING_DIM):
+        self.latency = latency
+        self.embedder = HashingEmbedder(dim)
+        self.model = f"fake-{dim}"
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def install(models: Dict[str, BaseChatModel], embeddings: Embeddings) -> None:
+    """
+    Points the lazily created clients of the application at the given chat models ("main", "sql",
+    "summary") and embeddings, and migrates the database as the server's warm-up does. Call it before
+    the first request, while no index is loaded yet.
+    """
+    from Agent import history, main_agent
+    from Tools import embedding_cache, holiday_info_tool, shop_info_tool, sql_db_tool
+    from Tools.db_migrations import migrate_database
+    from Tools.query_templates import QueryTemplateLibrary
+
+    main_agent._llm = models["main"]
+    main_agent._main_agent_pipeline = None
+    sql_db_tool._llm = models["sql"]
+    history.history_compactor._llm = models["summary"]
+
+    def get_embeddings(model: Optional[str] = None) -> Embeddings:
+        return embeddings
+
+    embedding_cache.get_embeddings = get_embeddings
+    shop_info_tool.get_embeddings = get_embeddings
+    holiday_info_tool.get_embeddings = get_embeddings
+    # Templates learned from the local query log would make runs differ between machines, and benchmark
+    # traffic must not end up in that log
+    sql_db_tool.query_templates = QueryTemplateLibrary(log_path=None)
+    # Indexes and the full-text table of the product search
+    migrate_database()
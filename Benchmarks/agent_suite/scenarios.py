@@ -0,0 +1,132 @@
+"""
+Conversations of the benchmark and the scripts the fake LLMs follow.
+
+Every turn lists the rounds of tool calls the main agent makes (calls of one round run in parallel)
+and the final answer. The scripted main agent picks the next round by counting the tool results in the
+scratchpad, so the real graph, tools and caches decide everything else. The scripted SQL writer turns
+the product word of the question into LIKE filters, the way the real prompt asks for.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from Benchmarks.agent_suite.fakes import ScriptedChatModel
+
+# Placeholder for the ProductIDs found by sql_db_tool earlier in the same turn
+FOUND_IDS = "$found_ids"
+
+
+@dataclass
+class Turn:
+    user: str
+    rounds: List[List[Tuple[str, Dict[str, Any]]]] = field(default_factory=list)
+    answer: str = ""
+
+
+def sql(question: str) -> Tuple[str, Dict[str, Any]]:
+    return "sql_db_tool", {"question": question, "history": []}
+
+
+def lookup() -> Tuple[str, Dict[str, Any]]:
+    return "product_lookup_tool", {"product_ids": FOUND_IDS}
+
+
+CONVERSATIONS: Dict[str, List[Turn]] = {
+    # Product search with a follow-up question: sql_db_tool, then product cards
+    "product_search": [
+        Turn("Добрий день! Чи є у вас пледи?", [[sql("пледи")], [lookup()]]),
+        Turn("А махрові рушники?", [[sql("рушники махрові")], [lookup()]]),
+    ],
+    # Knowledge base only
+    "shop_info": [
+        Turn("Де знаходиться ваш магазин і до котрої ви працюєте?", [[("shop_info_tool", {})]],
+             "Наш магазин працює щодня з 9:00 до 21:00. Чекаємо на вас!"),
+    ],
+    # Holiday index, then two product searches in parallel, then product cards
+    "holiday_gift": [
+        Turn("Що можна подарувати на Новий рік?",
+             [[("holiday_info_tool", {"key": "Новий рік"})], [sql("свічки"), sql("пледи новорічні")], [lookup()]]),
+        Turn("Дякую, а щось недороге до 200 грн?", [[sql("свічки до 200 грн")], [lookup()]]),
+    ],
+    # A product the database does not have: empty SQL, full-text fallback and a speculative retry round
+    "not_found": [
+        Turn("Чи продаєте ви пилососи?", [[sql("пилососи")]],
+             "На жаль, пилососів у нашому магазині немає. Можу запропонувати товари для прибирання."),
+    ],
+    # Two different tools in one round
+    "mixed": [
+        Turn("Скільки коштує чай і чи працюєте ви в неділю?", [[sql("чай"), ("shop_info_tool", {})]],
+             "Чай є від 35 грн, а в неділю ми працюємо з 10:00 до 20:00."),
+        Turn("Покажіть чай, будь ласка", [[sql("чай")], [lookup()]]),
+    ],
+}
+
+TURNS: Dict[str, Turn] = {turn.user: turn for turns in CONVERSATIONS.values() for turn in turns}
+
+_STEP = re.compile(r"^Tool: ", re.MULTILINE)
+_PRODUCT_ROW = re.compile(r"^(\d+) \| ", re.MULTILINE)
+
+
+def _last_human(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+
+def main_agent_reply(messages: List[BaseMessage], options: Dict[str, Any]) -> AIMessage:
+    """Next round of tool calls of the turn, or its final answer once every round has run."""
+    turn = TURNS.get(_last_human(messages), Turn(""))
+    scratchpad = str(messages[-1].content)
+    done = len(_STEP.findall(scratchpad))
+    started = 0
+    for index, calls in enumerate(turn.rounds):
+        if started == done:
+            found = list(dict.fromkeys(_PRODUCT_ROW.findall(scratchpad)))[:3]
+            return AIMessage(content="", tool_calls=[
+                {"name": name, "id": f"call_{index}_{position}",
+                 "args": {key: found if value == FOUND_IDS else value for key, value in args.items()}}
+                for position, (name, args) in enumerate(calls)])
+        started += len(calls)
+    return AIMessage(content=turn.answer or "Дякую за запитання! Чим ще можу допомогти?")
+
+
+def _stem(word: str) -> str:
+    return word[:5] if len(word) > 5 else word.rstrip("иіаяь")
+
+
+def _like_query(stem: str) -> str:
+    conditions = " OR ".join(f"ProductTitle LIKE '%{variant}%'" for variant in dict.fromkeys((stem, stem.capitalize())))
+    return f"SELECT ProductID, ProductTitle, ProductPrice, StockProduct FROM StockTable WHERE {conditions} LIMIT 10"
+
+
+def sql_writer_reply(messages: List[BaseMessage], options: Dict[str, Any]) -> AIMessage:
+    """SQL for the product word of the question: the query, alternatives for a retry, or an answer."""
+    prompt = _last_human(messages)
+    retry = re.search(r"based on the question: '(.+?)'", prompt)
+    question = retry.group(1) if retry else (re.findall(r"^Question: (.*)$", prompt, re.MULTILINE) or [""])[-1]
+    words = [word for word in re.findall(r"\w+", question.lower()) if len(word) > 2 and not word.isdigit()]
+    stem = _stem(words[0]) if words else "товар"
+    if options.get("structured") == "QueryOutput":
+        return AIMessage(content=json.dumps({"query": _like_query(stem)}, ensure_ascii=False))
+    if options.get("structured") == "QueryCandidates":
+        # Only the shorter stem can find more than the first query did, so the speculative round always
+        # has the same winner and runs stay comparable
+        queries = [_like_query(stem[:4]), _like_query(words[0] if words else stem)]
+        return AIMessage(content=json.dumps({"queries": queries}, ensure_ascii=False))
+    if retry:
+        return AIMessage(content=_like_query(stem[:4]))
+    return AIMessage(content="Ось що вдалося знайти.")
+
+
+def summary_reply(messages: List[BaseMessage], options: Dict[str, Any]) -> AIMessage:
+    return AIMessage(content="Клієнт цікавився товарами магазину та графіком роботи.")
+
+
+def scripted_models(latency: float) -> Dict[str, ScriptedChatModel]:
+    """The three chat models of the application, scripted for these conversations."""
+    return {
+        "main": ScriptedChatModel(respond=main_agent_reply, latency=latency, model_name="scripted-main"),
+        "sql": ScriptedChatModel(respond=sql_writer_reply, latency=latency, model_name="scripted-sql"),
+        "summary": ScriptedChatModel(respond=summary_reply, latency=latency, model_name="scripted-summary"),
+    }
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: per-request overhead of compiling the LangGraph on every message
+versus reusing the graph compiled once at import time.
+
+The main agent LLM is replaced with a stub that answers immediately, so the numbers
+measure only graph construction and execution overhead.
+
+Run from the repository root:
+    python -m Benchmarks.graph_compile_bench --requests 200
+"""
+import argparse
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import graph as graph_module
+from chat import graph_config
+
+
+def stub_pipeline(state):
+    return AIMessage(content="Добрий день! Чим можу допомогти?")
+
+
+def fresh_state():
+    return {"input": "Привіт", "chat_history": [], "intermediate_steps": []}
+
+
+def measure(run, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   "
+          f"p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    stub = RunnableLambda(stub_pipeline)
+    graph_module.get_main_agent_pipeline = lambda: stub
+    config = graph_config()
+
+    # Warm up lazy imports inside langgraph before timing anything
+    graph_module.compiled_graph.invoke(fresh_state(), config=config)
+
+    compile_only = measure(graph_module.graph.compile, args.requests)
+    before = measure(lambda: graph_module.graph.compile().invoke(fresh_state(), config=config), args.requests)
+    after = measure(lambda: graph_module.compiled_graph.invoke(fresh_state(), config=config), args.requests)
+
+    report("compile() only", compile_only)
+    report("compile() + invoke (before)", before)
+    report("compiled invoke (after)", after)
+    print(f"Saved per request: {statistics.mean(before) - statistics.mean(after):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
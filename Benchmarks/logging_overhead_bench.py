@@ -0,0 +1,114 @@
+"""
+Benchmark: request-path cost of logging tool calls (logging_setup.py).
+
+A stub main agent calls sql_db_tool, which returns `--rows` product rows, and then answers. Each graph
+pass logs the tool input and the full result, as the old print() calls did. For every mode the
+report shows the time of a whole graph pass and of a single "Tool executed" log call. Modes:
+
+    off        - records below WARNING are disabled
+    sync_full  - synchronous plain-text handler with the untruncated result (what the prints did)
+    sync_json  - synchronous JSON handler with truncation
+    queue      - setup_logging(): queue handler, JSON formatting and writing on a background thread
+
+Output goes to a temporary file (or --output). No network calls are made.
+
+Run from the repository root:
+    python -m Benchmarks.logging_overhead_bench --requests 300 --rows 300
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import graph as graph_module
+import logging_setup
+import Tools.tools_innit as tools_module
+from chat import graph_config
+from metrics import request_context
+from Tools.tool_results import PRODUCT_COLUMNS, SqlRows
+
+MODES = ("off", "sync_full", "sync_json", "queue")
+
+
+def stub_pipeline(state):
+    if not state["intermediate_steps"]:
+        return AIMessage(content="", tool_calls=[{"name": "sql_db_tool", "id": "1", "args": {
+            "question": "Які є пледи?", "history": []}}])
+    return AIMessage(content="Ось пледи, які є в наявності.")
+
+
+def fresh_state():
+    return {"input": "Які є пледи?", "chat_history": [], "intermediate_steps": [], "tool_memo": {}}
+
+
+def configure(mode, stream):
+    logging_setup.stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(logging.WARNING if mode == "off" else logging.INFO)
+    if mode == "sync_full":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s %(tool_input)s %(result)s", defaults={
+            "tool_input": "", "result": ""}))
+        root.addHandler(handler)
+    elif mode == "sync_json":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging_setup.JsonFormatter())
+        handler.addFilter(logging_setup.RequestFilter())
+        root.addHandler(handler)
+    elif mode == "queue":
+        return logging_setup.setup_logging(stream=stream)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--output", help="File the log is written to (default: a temporary file)")
+    args = parser.parse_args()
+
+    rows = SqlRows(PRODUCT_COLUMNS, tuple((i, f"Плед вовняний «Карпати» {i}, 140x200 см", 1299.0 + i, 12)
+                                          for i in range(args.rows)))
+    print(f"Tool result: {args.rows} rows, {len(rows.to_text())} characters\n")
+    stub = RunnableLambda(stub_pipeline)
+    graph_module.get_main_agent_pipeline = lambda: stub
+    tools_module.find_data_in_db = lambda question, history: rows
+
+    logger = logging.getLogger("graph")
+    result_text = rows.to_text()
+    output = args.output or os.path.join(tempfile.mkdtemp(), "bench.log")
+    for mode in MODES:
+        with open(output, "w", encoding="utf-8") as stream:
+            listener = configure(mode, stream)
+            timings = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                with request_context("bench", "bench"):
+                    graph_module.compiled_graph.invoke(fresh_state(), config=graph_config())
+                timings.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            with request_context("bench", "bench"):
+                for _ in range(args.requests):
+                    logger.info("Tool executed: %s", "sql_db_tool", extra={"tool": "sql_db_tool",
+                                                                            "result": result_text})
+            call_us = (time.perf_counter() - started) / args.requests * 1e6
+            drain_started = time.perf_counter()
+            dropped = logging.getLogger().handlers[0].dropped if listener is not None else 0
+            configure("off", stream)
+            drain_ms = (time.perf_counter() - drain_started) * 1000
+        timings.sort()
+        print(f"{mode:<10} pass mean {statistics.mean(timings):7.3f} ms  p50 {statistics.median(timings):7.3f} ms  "
+              f"p95 {timings[int(len(timings) * 0.95) - 1]:7.3f} ms   log call {call_us:7.1f} us   "
+              f"log {os.path.getsize(output) / 1024:6.0f} KiB"
+              + (f"   drained in {drain_ms:.0f} ms, dropped {dropped}" if listener is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: overhead of the metrics instrumentation (metrics.py).
+
+Measures a bare timing span, one LLM call on a fake chat model with and without the token/latency
+callback handler, and a full graph pass (stub main agent, one cached-free tool call) with metrics
+enabled and disabled. No network calls are made.
+
+Run from the repository root:
+    python -m Benchmarks.metrics_overhead_bench --requests 300
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import graph as graph_module
+import metrics
+import Tools.tools_innit as tools_module
+from chat import graph_config
+from metrics import llm_metrics_handler, request_context, span
+
+USAGE = {"input_tokens": 1200, "output_tokens": 40, "total_tokens": 1240}
+
+
+def stub_pipeline(state):
+    if not state["intermediate_steps"]:
+        return AIMessage(content="", tool_calls=[{"name": "shop_info_tool", "args": {}, "id": "1"}])
+    return AIMessage(content="Добрий день! Чим можу допомогти?")
+
+
+def fresh_state():
+    return {"input": "Привіт", "chat_history": [], "intermediate_steps": [], "tool_memo": {}}
+
+
+def measure(run, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<34} mean {statistics.mean(timings):8.4f} ms   p50 {statistics.median(timings):8.4f} ms   "
+          f"p95 {p95:8.4f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    def bare_span():
+        with span("bench", "span"):
+            pass
+
+    spans = 10_000
+    started = time.perf_counter()
+    with request_context("bench", "bench"):
+        for _ in range(spans):
+            bare_span()
+    print(f"span(): {(time.perf_counter() - started) / spans * 1e6:.2f} us per span (inside a request trace)\n")
+
+    model = GenericFakeChatModel(messages=iter(lambda: AIMessage(content="ok", usage_metadata=USAGE), None))
+    plain = measure(lambda: model.invoke("Привіт"), args.requests)
+    handled = measure(lambda: model.invoke("Привіт", config={"callbacks": [llm_metrics_handler]}), args.requests)
+    report("LLM call (fake), no handler", plain)
+    report("LLM call (fake), metrics handler", handled)
+
+    stub = RunnableLambda(stub_pipeline)
+    graph_module.get_main_agent_pipeline = lambda: stub
+    tools_module.shop_info = lambda: "Магазин Аврора"
+
+    def graph_pass():
+        with request_context("bench", "bench"):
+            graph_module.compiled_graph.invoke(fresh_state(), config=graph_config())
+
+    graph_pass()
+    metrics.METRICS_ENABLED = False
+    disabled = measure(graph_pass, args.requests)
+    metrics.METRICS_ENABLED = True
+    enabled = measure(graph_pass, args.requests)
+    report("graph pass, metrics disabled", disabled)
+    report("graph pass, metrics enabled", enabled)
+    overhead = statistics.mean(enabled) - statistics.mean(disabled)
+    print(f"Overhead per request: {overhead:.3f} ms ({overhead / statistics.mean(disabled):.1%})")
+
+
+if __name__ == "__main__":
+    main()
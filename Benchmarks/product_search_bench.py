@@ -0,0 +1,80 @@
+"""
+Benchmark: FTS5 product search (Tools/product_search.py) against the LIKE queries the
+sql_db_tool prompt makes gpt-4o write (lower, upper and title case variants of the term).
+
+Runs on a temporary copy of Data/database.db, so the real database is not modified.
+The LIKE side measures only sqlite time; in production it also costs one LLM call per search.
+
+Run from the repository root:
+    python -m Benchmarks.product_search_bench --repeat 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from config import PRODUCT_DB_PATH
+from Tools.product_search import ProductSearch
+
+TERMS = ["чай", "подушка", "свічка", "рушник", "кава", "іграшка", "ковдра", "шампунь", "ліхтарик", "парасолька"]
+
+LIKE_QUERY = """
+SELECT ProductID, ProductTitle, ProductPrice, StockProduct
+FROM StockTable
+WHERE (ProductTitle LIKE ? OR ProductTitle LIKE ? OR ProductTitle LIKE ?) AND StockProduct > 0
+{order}
+LIMIT 10
+"""
+
+
+def like_args(term):
+    return f"%{term.lower()}%", f"%{term.upper()}%", f"%{term.title()}%"
+
+
+def timed(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.mean(timings), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "database.db")
+        shutil.copyfile(PRODUCT_DB_PATH, db_path)
+
+        started = time.perf_counter()
+        search = ProductSearch(db_path)
+        search.search("чай")
+        print(f"FTS index build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        conn = sqlite3.connect(db_path)
+        print(f"{'term':<12} {'LIKE ms':>9} {'LIKE+ORDER ms':>14} {'FTS ms':>8} {'LIKE rows':>10} {'FTS rows':>9}")
+        totals = {"like": [], "like_ordered": [], "fts": []}
+        for term in TERMS:
+            like, like_rows = timed(lambda: conn.execute(LIKE_QUERY.format(order=""), like_args(term)).fetchall(),
+                                    args.repeat)
+            # Ranking LIKE results (e.g. ORDER BY price) forces a full scan of StockTable
+            like_ordered, _ = timed(
+                lambda: conn.execute(LIKE_QUERY.format(order="ORDER BY ProductPrice"), like_args(term)).fetchall(),
+                args.repeat)
+            fts, fts_rows = timed(lambda: search.search(term), args.repeat)
+            totals["like"].append(like)
+            totals["like_ordered"].append(like_ordered)
+            totals["fts"].append(fts)
+            print(f"{term:<12} {like:9.3f} {like_ordered:14.3f} {fts:8.3f} {like_rows:10d} {fts_rows:9d}")
+        print(f"{'mean':<12} {statistics.mean(totals['like']):9.3f} {statistics.mean(totals['like_ordered']):14.3f} "
+              f"{statistics.mean(totals['fts']):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: memory footprint and query latency of the product vector index
+(Tools/product_vector_index.py) for synthetic catalogs of 10k to 1M products.
+
+Catalogs are generated by recombining words of the real product titles in Data/database.db and are
+embedded with the deterministic HashingEmbedder, so no API calls are made. About 30% of the synthetic
+products are marked out of stock to exercise the in-stock filter.
+
+Run from the repository root:
+    python -m Benchmarks.product_vector_bench --sizes 10000 100000 1000000 --types hnsw ivf
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from contextlib import closing
+
+import numpy as np
+
+from config import PRODUCT_DB_PATH, PRODUCT_VECTOR_HASHING_DIM
+from Tools.product_vector_index import HashingEmbedder, ProductVectorIndex, build_vector_index, _normalized
+
+QUERIES = ["зелений чай", "м'яка іграшка", "свічка ароматична", "рушник махровий", "кава мелена",
+           "подушка декоративна", "ліхтарик", "шампунь для волосся", "парасолька", "ковдра"]
+
+
+class SyntheticIndex(ProductVectorIndex):
+    """Index over generated vectors; the in-stock mask is fixed instead of read from sqlite."""
+
+    def __init__(self, index, product_ids, embedder, in_stock):
+        super().__init__(index, product_ids, embedder, meta={})
+        self._mask = in_stock
+
+    def _stock_version(self):
+        return 0
+
+    def _load_stock_mask(self):
+        return self._mask
+
+
+def synthetic_titles(count, rng):
+    with closing(sqlite3.connect(PRODUCT_DB_PATH)) as conn:
+        words = [title.split() for (title,) in conn.execute("SELECT ProductTitle FROM StockTable")]
+    vocabulary = [word for title in words for word in title]
+    return [" ".join(rng.choice(words)[:2] + rng.sample(vocabulary, 3)) for _ in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(size, index_type, embedder, rng, queries):
+    started = time.perf_counter()
+    vectors = _normalized(embedder.embed_documents(synthetic_titles(size, rng)))
+    embed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = build_vector_index(vectors, index_type)
+    build_seconds = time.perf_counter() - started
+
+    in_stock = np.asarray([rng.random() > 0.3 for _ in range(size)], dtype=bool)
+    product_index = SyntheticIndex(index, np.arange(size, dtype=np.int64), embedder, in_stock)
+    del vectors
+
+    query_vectors = [_normalized([embedder.embed_query(query)])[0] for query in queries]
+    for vector in query_vectors[:3]:
+        product_index.search_vector(vector)
+    timings = []
+    for _ in range(20):
+        for vector in query_vectors:
+            started = time.perf_counter()
+            product_index.search_vector(vector)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    print(f"{size:>9,} {index_type:<5} {product_index.memory_bytes() / 2 ** 20:10.1f} MiB "
+          f"embed {embed_seconds:7.1f}s  build {build_seconds:7.1f}s  "
+          f"query p50 {statistics.median(timings):7.3f} ms  p95 {percentile(timings, 0.95):7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--types", nargs="+", default=["hnsw", "ivf"], choices=["hnsw", "ivf"])
+    parser.add_argument("--dim", type=int, default=PRODUCT_VECTOR_HASHING_DIM)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(args.dim)
+    for size in args.sizes:
+        for index_type in args.types:
+            run(size, index_type, embedder, random.Random(args.seed), QUERIES)
+
+
+if __name__ == "__main__":
+    main()
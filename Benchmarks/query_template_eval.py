@@ -0,0 +1,88 @@
+"""
+Offline evaluation of the SQL query-template library (Tools/query_templates.py) over the log of
+successful sql_db_tool runs.
+
+The log is replayed in order: every question is first matched against the templates learned from the
+entries before it, then learned itself, as in production. A matched SQL counts as correct when it
+returns the same rows as the SQL the LLM wrote for that question. For every similarity threshold the
+report shows coverage, precision, and the LLM calls and latency the matches would have saved.
+
+Queries run on a temporary copy of Data/database.db, so the real database is not modified.
+
+Run from the repository root:
+    python -m Benchmarks.query_template_eval --thresholds 0.8 0.85 0.9 0.95
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from config import PRODUCT_DB_PATH, SQL_QUERY_LOG_PATH
+from Tools.query_templates import QueryTemplateLibrary, read_log
+
+
+def run(conn, sql):
+    try:
+        return sorted(map(repr, conn.execute(sql).fetchall()))
+    except sqlite3.Error:
+        return None
+
+
+def evaluate(entries, conn, threshold, expected):
+    library = QueryTemplateLibrary(log_path=None, min_similarity=threshold)
+    totals = {"questions": 0, "matched": 0, "correct": 0, "llm_calls_saved": 0, "seconds_saved": 0.0,
+              "match_ms": 0.0}
+    for entry in entries:
+        totals["questions"] += 1
+        started = time.perf_counter()
+        match = library.match(entry["question"])
+        totals["match_ms"] += (time.perf_counter() - started) * 1000
+        if match is not None:
+            totals["matched"] += 1
+            started = time.perf_counter()
+            rows = run(conn, match.sql)
+            if rows and rows == expected[entry["sql"]]:
+                totals["correct"] += 1
+                totals["llm_calls_saved"] += entry.get("llm_calls", 1)
+                totals["seconds_saved"] += entry.get("seconds", 0.0) - (time.perf_counter() - started)
+        library.learn(entry)
+    totals["templates"] = len(library.templates)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=SQL_QUERY_LOG_PATH)
+    parser.add_argument("--db", default=PRODUCT_DB_PATH)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.85, 0.9, 0.95])
+    args = parser.parse_args()
+
+    # Template hits are not learned from in production either
+    entries = [entry for entry in read_log(args.log) if entry.get("source") == "llm"]
+    if not entries:
+        print(f"No LLM-written queries in {args.log}; the log fills up as sql_db_tool answers questions.")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "database.db")
+        shutil.copyfile(args.db, db_path)
+        conn = sqlite3.connect(db_path)
+        expected = {entry["sql"]: run(conn, entry["sql"]) for entry in entries}
+        llm_calls = sum(entry.get("llm_calls", 1) for entry in entries)
+        llm_seconds = sum(entry.get("seconds", 0.0) for entry in entries)
+        print(f"{len(entries)} logged questions, {llm_calls} LLM calls, {llm_seconds:.1f} s spent finding the SQL\n")
+        print(f"{'threshold':>9} {'templates':>9} {'matched':>8} {'correct':>8} {'precision':>9} "
+              f"{'LLM calls saved':>16} {'s saved':>8} {'match ms':>9}")
+        for threshold in args.thresholds:
+            totals = evaluate(entries, conn, threshold, expected)
+            precision = totals["correct"] / totals["matched"] if totals["matched"] else 0.0
+            print(f"{threshold:9.2f} {totals['templates']:9d} {totals['matched']:8d} {totals['correct']:8d} "
+                  f"{precision:9.1%} {totals['llm_calls_saved']:7d} ({totals['llm_calls_saved'] / llm_calls:5.1%}) "
+                  f"{totals['seconds_saved']:8.1f} {totals['match_ms'] / totals['questions']:9.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: building the sql_db_tool prompt per call (SQLDatabase.get_table_info() + PromptTemplate,
+as before) versus the schema snapshot and the cached static prefix (Tools/schema_snapshot.py).
+
+Also checks that the prefix is byte-identical between calls, which is what the provider-side prompt
+cache needs, and measures a snapshot rebuild after the database changed.
+
+Runs on a temporary copy of Data/database.db, so the real database is not modified.
+
+Run from the repository root:
+    python -m Benchmarks.schema_prompt_bench --repeat 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from langchain_community.utilities import SQLDatabase
+from langchain_core.prompts import PromptTemplate
+
+from config import PRODUCT_DB_PATH, SQL_DB_TOOL_TOP_K
+from Tools.product_catalog import ProductCatalog
+from Tools.schema_snapshot import SchemaSnapshot
+from Tools.sql_db_tool import tool_prompt_prefix
+
+QUESTIONS = ["Чи є зелений чай?", "Покажи подушки до 300 грн", "Які є свічки?", "Рушник махровий",
+             "Іграшки для дітей до 200 грн"]
+
+# The template used before the snapshot: schema and question rendered together on every call
+PER_CALL_PROMPT = PromptTemplate.from_template(tool_prompt_prefix.template + "Question: {input}\n")
+
+
+def timed(run, repeat):
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        run(QUESTIONS[i % len(QUESTIONS)])
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<30} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   "
+          f"p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "database.db")
+        shutil.copyfile(PRODUCT_DB_PATH, db_path)
+        db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
+        # Check the database version on every call, the worst case for the snapshot
+        catalog = ProductCatalog(db_path, refresh_interval=0)
+        snapshot = SchemaSnapshot(lambda: db, catalog=catalog)
+
+        def per_call(question):
+            return PER_CALL_PROMPT.invoke({"dialect": db.dialect, "top_k": SQL_DB_TOOL_TOP_K,
+                                           "table_info": db.get_table_info(), "input": question}).to_string()
+
+        prefixes = {}
+
+        def snapshotted(question):
+            table_info = snapshot.table_info()
+            prefix = prefixes.get(table_info)
+            if prefix is None:
+                prefix = prefixes[table_info] = tool_prompt_prefix.format(
+                    dialect=db.dialect, top_k=SQL_DB_TOOL_TOP_K, table_info=table_info)
+            return prefix + f"Question: {question}\n"
+
+        started = time.perf_counter()
+        first = snapshotted(QUESTIONS[0])
+        print(f"Snapshot build (cold): {(time.perf_counter() - started) * 1000:.1f} ms, "
+              f"prefix {len(first.encode('utf-8'))} bytes")
+
+        before = timed(per_call, args.repeat)
+        after = timed(snapshotted, args.repeat)
+        report("get_table_info per call", before)
+        report("snapshot + cached prefix", after)
+        print(f"Saved per prompt: {statistics.mean(before) - statistics.mean(after):.3f} ms")
+
+        identical = len({snapshotted(question).rsplit("Question:", 1)[0] for question in QUESTIONS}) == 1
+        print(f"Prefix byte-identical across questions: {identical}")
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE StockTable SET StockProduct = StockProduct + 1 "
+                         "WHERE ProductID = (SELECT MIN(ProductID) FROM StockTable)")
+        started = time.perf_counter()
+        snapshotted(QUESTIONS[0])
+        print(f"Rebuild after a database change: {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"(generation {snapshot.generation})")
+        catalog.pool.close()
+
+
+if __name__ == "__main__":
+    main()
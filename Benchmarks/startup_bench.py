@@ -0,0 +1,80 @@
+"""
+Startup benchmark: time to import the API application versus time to warm up its lazy resources
+(FAISS indexes, database schema, product catalog, LLM clients).
+
+Every run starts a fresh interpreter, so the numbers are cold-start numbers. With --importtime the
+modules with the largest own import time are listed as well (python -X importtime).
+
+Run from the repository root:
+    python -m Benchmarks.startup_bench --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, os, time
+# Clients are only constructed during warm-up, never called; a placeholder key is enough
+os.environ.setdefault("GPT_API_KEY", "sk-benchmark")
+started = time.perf_counter()
+import api
+imported = time.perf_counter() - started
+from warmup import warmup
+warmup.run()
+print(json.dumps({"import": imported, "warmup": warmup.seconds, "ready": warmup.ready,
+                  "components": warmup.report()}))
+"""
+
+
+def run_child() -> dict:
+    completed = subprocess.run([sys.executable, "-c", CHILD], cwd=REPO_ROOT, capture_output=True, text=True,
+                               check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top: int):
+    """(self us, cumulative us, module) of the `top` modules with the largest own import time."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True,
+                               env={**os.environ, "GPT_API_KEY": os.environ.get("GPT_API_KEY", "sk-benchmark")})
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="also list the N modules with the largest own import time")
+    args = parser.parse_args()
+
+    runs = [run_child() for _ in range(args.runs)]
+    imports = [run["import"] * 1000 for run in runs]
+    warmups = [run["warmup"] * 1000 for run in runs]
+    print(f"import api      mean {statistics.mean(imports):8.1f} ms   min {min(imports):8.1f} ms")
+    print(f"warm-up         mean {statistics.mean(warmups):8.1f} ms   min {min(warmups):8.1f} ms   "
+          f"(ready: {runs[-1]['ready']})")
+    print("\nComponents (last run):")
+    for name, component in runs[-1]["components"].items():
+        seconds = component["seconds"] if component["seconds"] is not None else 0.0
+        error = f"  {component['error']}" if component["error"] else ""
+        print(f"  {name:<22} {component['state']:<8} {seconds * 1000:8.1f} ms{error}")
+
+    if args.importtime:
+        print(f"\nTop {args.importtime} modules by own import time:")
+        for self_us, cumulative_us, module in import_profile(args.importtime):
+            print(f"  {self_us / 1000:8.1f} ms self  {cumulative_us / 1000:8.1f} ms cumulative  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import logging
+import sqlite3
+from contextlib import closing
+from typing import Callable, List, NamedTuple, Union
+
+from config import PRODUCT_DB_PATH
+from Tools.product_search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # SQL script or a function that applies the change on the given connection
+    apply: Union[str, Callable[[sqlite3.Connection], None]]
+
+
+# Applied in order; PRAGMA user_version stores the version of the last applied migration.
+# Never edit a released migration, append a new one instead.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "index StockTable.ProductID",
+              "CREATE INDEX IF NOT EXISTS idx_stock_product_id ON StockTable(ProductID);"),
+    Migration(2, "index StockTable.Category, SubCategory",
+              "CREATE INDEX IF NOT EXISTS idx_stock_category ON StockTable(Category, SubCategory);"),
+    Migration(3, "full-text search table StockSearch", ensure_search_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[Migration]:
+    """Applies the pending migrations, each in its own transaction. Returns the applied ones."""
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= schema_version(conn):
+            continue
+        logger.info("Applying migration %d: %s", migration.version, migration.description)
+        if callable(migration.apply):
+            migration.apply(conn)
+        else:
+            with conn:
+                conn.executescript(migration.apply)
+        with conn:
+            # PRAGMA does not accept bound parameters; the version is an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+        applied.append(migration)
+    if applied:
+        conn.execute("ANALYZE")
+    return applied
+
+
+def migrate_database(db_path: str = PRODUCT_DB_PATH) -> List[Migration]:
+    """
+    Brings the product database to the latest schema. A database the process cannot write to is left
+    as it is: every query still works, only without the indexes.
+    """
+    try:
+        with closing(sqlite3.connect(db_path)) as conn:
+            if schema_version(conn) >= LATEST_VERSION:
+                return []
+            return migrate(conn)
+    except sqlite3.OperationalError as e:
+        logger.warning("Could not migrate %s: %s", db_path, e)
+        return []
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Applies pending schema migrations to the product database.")
+    parser.add_argument("--db", default=PRODUCT_DB_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with closing(sqlite3.connect(args.db)) as connection:
+        before = schema_version(connection)
+        done = migrate(connection)
+        print(f"Schema version {before} -> {schema_version(connection)}, applied {len(done)} migration(s).")
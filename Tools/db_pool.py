@@ -0,0 +1,53 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from config import PRODUCT_DB_PATH, PRODUCT_DB_POOL_SIZE
+
+
+def connect_read_only(db_path: str = PRODUCT_DB_PATH) -> sqlite3.Connection:
+    """
+    Read-only connection to a sqlite database. Opening the file in mode=ro makes sqlite reject any
+    write and never create the file when the path is wrong.
+    """
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    # The pool hands connections to whichever thread asks; each one is used by one thread at a time
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+class ConnectionPool:
+    """Small pool of read-only sqlite connections, opened on demand and reused across threads."""
+
+    def __init__(self, db_path: str = PRODUCT_DB_PATH, size: int = PRODUCT_DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._available = threading.Semaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection, waiting for one to be returned when all `size` are in use."""
+        self._available.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = connect_read_only(self.db_path)
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._available.release()
+
+    def close(self) -> None:
+        """Closes the idle connections (e.g. after the database file was replaced)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
@@ -0,0 +1,262 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking between processes, run a single writer there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+LOCK_FILE = "lock"
+
+# Slots are added to the vector file in chunks, so it is not resized on every new text
+_GROW_BY = 1024
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of an embedding: sha256 of the model name and the exact text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk LRU store of the vectors of one model.
+
+    Vectors live in a float32 file mapped into memory with numpy.memmap (one row per slot), so the
+    store is not read into RAM at startup; index.json maps each key to its slot in LRU order. When the
+    store is full, the least recently used slot is overwritten.
+
+    Several processes (API workers, the index builder) share a store: writers hold an exclusive flock
+    on the lock file and start from the index.json on disk, readers hold a shared one and reload the
+    index when another process has rewritten it, so a slot is never read while it is being reused.
+    """
+
+    def __init__(self, directory: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.dim: Optional[int] = None
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._vectors: Optional[np.memmap] = None
+        # Keys read since the index was last written; their recency is applied to the index on disk
+        self._touched: Dict[str, None] = {}
+        # Identity of the index.json this process has loaded or written
+        self._stamp = None
+        self._mutex = threading.Lock()
+        with self._mutex, self._file_lock(exclusive=False):
+            self._sync()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None or (not exclusive and not os.path.isdir(self.directory)):
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _index_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, INDEX_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _sync(self) -> None:
+        """Reloads the index if another process rewrote it (call with the file lock held)."""
+        stamp = self._index_stamp()
+        if stamp != self._stamp:
+            self._load()
+            self._stamp = stamp
+            for key in self._touched:
+                if key in self._slots:
+                    self._slots.move_to_end(key)
+
+    def _load(self) -> None:
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(vectors_path)):
+            return
+        if self._vectors is not None:
+            del self._vectors
+            self._vectors = None
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.dim = index["dim"]
+            self._slots = OrderedDict(index["slots"])
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+").reshape(-1, self.dim)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Embedding cache in %s is unreadable, starting empty: %s", self.directory, e)
+            self.dim, self._slots, self._vectors = None, OrderedDict(), None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._mutex, self._file_lock(exclusive=False):
+            self._sync()
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._slots.move_to_end(key)
+                    # Recency changed; the order is written together with the next new vectors or at exit
+                    self._touched[key] = None
+                    found[key] = self._vectors[slot].tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        with self._mutex, self._file_lock(exclusive=True):
+            # Slots are assigned from the latest index, whichever process wrote it
+            self._sync()
+            for key, vector in items.items():
+                if self.dim is None:
+                    self.dim = len(vector)
+                elif len(vector) != self.dim:
+                    raise ValueError(f"Embedding has {len(vector)} dimensions, the cache stores {self.dim}")
+                slot = self._slots.pop(key, None)
+                if slot is None:
+                    slot = self._allocate_slot()
+                self._vectors[slot] = vector
+                self._slots[key] = slot
+            self._vectors.flush()
+            self._write_index()
+
+    def _allocate_slot(self) -> int:
+        # Slots 0..len-1 are always in use: a full store reuses the least recently used slot
+        used = len(self._slots)
+        if used >= self.max_entries:
+            _, slot = self._slots.popitem(last=False)
+            return slot
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if used >= capacity:
+            self._grow(min(self.max_entries, capacity + _GROW_BY))
+        return used
+
+    def _grow(self, capacity: int) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, VECTORS_FILE)
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(path, "ab") as f:
+            f.truncate(capacity * self.dim * np.dtype(np.float32).itemsize)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _write_index(self) -> None:
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "slots": list(self._slots.items())}, f)
+        os.replace(tmp_path, path)
+        self._stamp = self._index_stamp()
+        self._touched.clear()
+
+    def flush(self) -> None:
+        with self._mutex:
+            if not self._touched:
+                return
+            with self._file_lock(exclusive=True):
+                self._sync()
+                if self._vectors is not None:
+                    self._write_index()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that looks every text up in a persistent content-addressed store before calling
+    the wrapped model. Documents and queries share the store, so rebuilding an index from unchanged
+    texts and repeating a query cost no API calls.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, store: EmbeddingStore):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._mutex = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = self.store.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.store.put_many(computed)
+            found.update(computed)
+        with self._mutex:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.store), "hits": self.hits, "misses": self.misses}
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_cached: Dict[str, CachedEmbeddings] = {}
+_lock = threading.Lock()
+
+
+def _store_for(model: str) -> EmbeddingStore:
+    # One store per model: all its vectors have the same dimension
+    if model not in _stores:
+        _stores[model] = EmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, re.sub(r"[^\w.-]", "_", model)))
+    return _stores[model]
+
+
+def cached_embeddings(embeddings: Embeddings, model: str) -> CachedEmbeddings:
+    """Wraps `embeddings` with the process-wide store of `model`."""
+    with _lock:
+        return CachedEmbeddings(embeddings, model, _store_for(model))
+
+
+def get_embeddings(model: Optional[str] = None) -> CachedEmbeddings:
+    """Shared cached OpenAI embeddings (the langchain-openai default model unless `model` is given)."""
+    from langchain_openai import OpenAIEmbeddings
+
+    key = model or ""
+    if key not in _cached:
+        kwargs = {"model": model} if model else {}
+        embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("GPT_API_KEY") or os.getenv("OPENAI_API_KEY"),
+                                      **kwargs)
+        cached = cached_embeddings(embeddings, embeddings.model)
+        with _lock:
+            _cached.setdefault(key, cached)
+    return _cached[key]
+
+
+@atexit.register
+def _flush_stores() -> None:
+    for store in list(_stores.values()):
+        store.flush()
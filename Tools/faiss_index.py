@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from Tools.index_versions import IndexVersions
+
+logger = logging.getLogger(__name__)
+
+# Per-document hashes of the indexed documents: {document key: {"hash": ..., "id": docstore id}}
+MANIFEST_FILE = "document_hashes.json"
+
+# Files of a saved store (FAISS.save_local) plus the manifest
+STORE_FILES = ("index.faiss", "index.pkl", MANIFEST_FILE)
+
+
+class SyncReport(NamedTuple):
+    # "up to date", "updated" or "outdated" (the update failed and the saved index is served)
+    status: str
+    documents: int
+    embedded: int
+    reused: int
+    deleted: int
+
+    @property
+    def embeddings_saved(self) -> int:
+        return self.reused
+
+
+def document_hash(document: Document) -> str:
+    """Hash of everything stored for a document: its text and its metadata."""
+    payload = json.dumps([document.page_content, document.metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _recover(index_dir: str) -> None:
+    """Finishes a swap interrupted after the old index was moved aside but before the new one took its place."""
+    backup_dir = f"{index_dir}.bak"
+    if not os.path.exists(index_dir) and os.path.exists(backup_dir):
+        logger.warning("Restoring %s from the backup of an interrupted save", index_dir)
+        os.replace(backup_dir, index_dir)
+
+
+def save_atomically(vectorstore: FAISS, manifest: Dict[str, dict], index_dir: str) -> None:
+    """
+    Writes the index into a temporary directory and swaps it with the current one. A crash at any
+    point leaves either the old or the new index complete on disk, never a half-written one.
+    """
+    tmp_dir, backup_dir = f"{index_dir}.tmp", f"{index_dir}.bak"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    vectorstore.save_local(tmp_dir)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, backup_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(backup_dir, ignore_errors=True)
+
+
+def _load(index_dir: str, embeddings: Embeddings) -> Optional[FAISS]:
+    if not is_faiss_store(index_dir):
+        return None
+    try:
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    except Exception as e:
+        logger.warning("Could not load the FAISS index from %s, rebuilding it: %s", index_dir, e)
+        return None
+
+
+def _load_manifest(index_dir: str, vectorstore: FAISS, key: Callable[[Document], str]) -> Dict[str, dict]:
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    # Index saved before per-document hashes were tracked: hash what its docstore holds
+    manifest = {}
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        document = vectorstore.docstore.search(doc_id)
+        if isinstance(document, Document):
+            manifest[key(document)] = {"hash": document_hash(document), "id": doc_id}
+    return manifest
+
+
+def sync_faiss_index(index_dir: str, documents: List[Document], embeddings: Embeddings,
+                     key: Callable[[Document], str]) -> Tuple[FAISS, SyncReport]:
+    """
+    Loads the FAISS store from index_dir and brings it in line with `documents`: only new and
+    changed documents are embedded and added, removed and changed ones are deleted by docstore id.
+    `key` names a document (e.g. the holiday) so a changed document replaces its previous version.
+
+    If embedding fails (e.g. no network), the index on disk is served as it is. Returns the store and
+    a report of how many documents were embedded and how many embeddings were reused.
+    """
+    _recover(index_dir)
+    vectorstore = _load(index_dir, embeddings)
+    manifest = _load_manifest(index_dir, vectorstore, key) if vectorstore is not None else {}
+
+    current = {key(document): (document, document_hash(document)) for document in documents}
+    stale = [name for name, entry in manifest.items()
+             if name not in current or current[name][1] != entry["hash"]]
+    fresh = [name for name, (_, doc_hash) in current.items()
+             if name not in manifest or manifest[name]["hash"] != doc_hash]
+    report = SyncReport(status="updated", documents=len(current), embedded=len(fresh),
+                        reused=len(current) - len(fresh), deleted=len(stale))
+
+    if vectorstore is not None and not stale and not fresh:
+        return vectorstore, report._replace(status="up to date", embedded=0, deleted=0)
+
+    try:
+        new_documents = [current[name][0] for name in fresh]
+        new_ids = [current[name][1] for name in fresh]
+        if vectorstore is None:
+            vectorstore = FAISS.from_documents(new_documents, embeddings, ids=new_ids)
+        else:
+            if stale:
+                vectorstore.delete([manifest[name]["id"] for name in stale])
+            if new_documents:
+                vectorstore.add_documents(new_documents, ids=new_ids)
+    except Exception as e:
+        reloaded = _load(index_dir, embeddings)
+        if reloaded is None:
+            raise ValueError(f"Cannot create FAISS index in {index_dir} and no existing index found. "
+                             f"Please check your API key. Error: {e}")
+        logger.warning("Could not update FAISS index %s, serving the saved one (may be outdated): %s",
+                       index_dir, e)
+        return reloaded, report._replace(status="outdated", embedded=0, reused=0, deleted=0)
+
+    manifest = {name: {"hash": doc_hash, "id": manifest[name]["id"] if name not in fresh else doc_hash}
+                for name, (_, doc_hash) in current.items()}
+    save_atomically(vectorstore, manifest, index_dir)
+    return vectorstore, report
+
+
+def is_faiss_store(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, "index.faiss")) and os.path.exists(os.path.join(directory, "index.pkl"))
+
+
+def load_faiss_store(directory: str, embeddings: Embeddings) -> FAISS:
+    return FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+
+
+def build_index_version(versions: IndexVersions, documents: List[Document], embeddings: Embeddings,
+                        key: Callable[[Document], str], force: bool = False) -> Tuple[Optional[str], SyncReport]:
+    """
+    Builds a new version of a versioned FAISS store: copies the live version, applies the document
+    changes incrementally (see sync_faiss_index) and publishes the result. Nothing is published when
+    the live version is already up to date (unless `force`) or when embedding failed.
+    Returns the published version (or None) and the sync report.
+    """
+    current = versions.current()
+    version = versions.new_version()
+    build_dir = f"{versions.path(version)}.tmp"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    try:
+        if current is not None:
+            for name in STORE_FILES:
+                source = os.path.join(versions.path(current), name)
+                if os.path.exists(source):
+                    shutil.copy2(source, build_dir)
+        _, report = sync_faiss_index(build_dir, documents, embeddings, key)
+        if report.status == "outdated" or (report.status == "up to date" and not force):
+            shutil.rmtree(build_dir)
+            return None, report
+        os.replace(build_dir, versions.path(version))
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    versions.publish(version)
+    versions.prune()
+    return version, report
@@ -1,63 +1,32 @@
+import logging
 import os
+import threading
+
 import openai
 import yaml
-import hashlib
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 
-# Set your OpenAI API key.
-OPENAI_API_KEY = os.getenv("GPT_API_KEY") or os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("GPT_API_KEY or OPENAI_API_KEY environment variable must be set")
-
-openai.api_key = OPENAI_API_KEY
-
-# Paths to the YAML data, FAISS index directory, and the YAML file that stores hashes.
-yaml_file_path = 'Data/recommendations.yaml'
-INDEX_DIR = 'Data/faiss_holidays_index'
-hash_yaml_path = os.path.join(INDEX_DIR, "file_hashes.yaml")
-
-
-def compute_file_hash(file_path, algorithm='md5'):
-    """Compute a hash of a file to detect changes."""
-    hash_algo = hashlib.new(algorithm)
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            hash_algo.update(chunk)
-    return hash_algo.hexdigest()
-
-
-# Compute the current hash for our recommendations YAML file.
-current_yaml_hash = compute_file_hash(yaml_file_path)
-
-# Load hash data from the YAML file if it exists; otherwise, initialize an empty dictionary.
-if os.path.exists(hash_yaml_path):
-    with open(hash_yaml_path, 'r', encoding='utf-8') as f:
-        hash_data = yaml.safe_load(f) or {}
-else:
-    hash_data = {}
+from config import BASE_DIR
+from metrics import span
+from Tools.embedding_cache import get_embeddings
+from Tools.faiss_index import build_index_version, is_faiss_store, load_faiss_store
+from Tools.index_versions import HotIndex, IndexVersions
 
-# Use the base name of the YAML file as the key in the hash dictionary.
-yaml_key = os.path.basename(yaml_file_path)
-stored_hash = hash_data.get(yaml_key)
+# Paths to the YAML data and the FAISS index directory.
+yaml_file_path = os.path.join(BASE_DIR, 'Data', 'recommendations.yaml')
+INDEX_DIR = os.path.join(BASE_DIR, 'Data', 'faiss_holidays_index')
 
-# Determine whether to rebuild the FAISS index.
-rebuild_index = (stored_hash != current_yaml_hash)
+logger = logging.getLogger(__name__)
 
-# Initialize the embeddings instance.
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# The index is built offline (python -m Tools.index_builder holiday) and swapped in without a restart
+# when a new version is published; queries already running finish with the version they started with.
+holiday_index = HotIndex("holiday", IndexVersions(INDEX_DIR, is_faiss_store),
+                         lambda path: load_faiss_store(path, get_embeddings()))
+_init_lock = threading.Lock()
 
-if not rebuild_index and os.path.exists(INDEX_DIR):
-    # Load the FAISS index from disk.
-    try:
-        vectorstore = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-        print("Loaded FAISS index from disk.")
-    except Exception as e:
-        print(f"Error loading index from disk: {e}. Rebuilding index...")
-        rebuild_index = True
 
-if rebuild_index or not os.path.exists(INDEX_DIR):
+def load_documents():
     # Load holiday recommendation data from the YAML file.
     with open(yaml_file_path, 'r', encoding='utf-8') as file:
         holiday_data = yaml.safe_load(file)
@@ -72,34 +41,45 @@ if rebuild_index or not os.path.exists(INDEX_DIR):
             recommendation_text = str(recommendation)
         doc = Document(page_content=recommendation_text, metadata={"holiday": holiday})
         documents.append(doc)
+    return documents
 
-    print("Creating FAISS index for holiday recommendations...")
-    try:
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        vectorstore.save_local(INDEX_DIR)
-
-        # Ensure the index directory exists and update the hash in the YAML hash file.
-        os.makedirs(INDEX_DIR, exist_ok=True)
-        hash_data[yaml_key] = current_yaml_hash
-        with open(hash_yaml_path, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(hash_data, f)
-        print("FAISS index created and saved.")
-    except Exception as e:
-        print(f"Error creating FAISS index (API key may be invalid): {e}")
-        # Try to load existing index even if it's outdated
-        if os.path.exists(INDEX_DIR):
-            try:
-                vectorstore = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-                print("Loaded existing FAISS index from disk (may be outdated).")
-            except Exception as load_error:
-                print(f"Failed to load existing index: {load_error}")
-                raise ValueError(f"Cannot create or load FAISS index. Please check your API key. Error: {e}")
-        else:
-            raise ValueError(f"Cannot create FAISS index and no existing index found. Please check your API key. Error: {e}")
+
+def holiday_key(doc: Document) -> str:
+    return doc.metadata["holiday"]
+
+
+def build_index(force: bool = False):
+    """Publishes a new index version if the recommendations changed. Only changed holidays are re-embedded."""
+    # Set your OpenAI API key.
+    OPENAI_API_KEY = os.getenv("GPT_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not OPENAI_API_KEY:
+        raise ValueError("GPT_API_KEY or OPENAI_API_KEY environment variable must be set")
+    openai.api_key = OPENAI_API_KEY
+
+    # Shared embeddings with a persistent cache: repeated holiday keys and rebuilds make no API calls.
+    version, report = build_index_version(holiday_index.versions, load_documents(), get_embeddings(), holiday_key,
+                                          force=force)
+    logger.info("Holiday FAISS index %s: %d holidays, %d embedded, %d embeddings saved, %d deleted%s",
+                report.status, report.documents, report.embedded, report.embeddings_saved, report.deleted,
+                f", published version {version}." if version else ".")
+    return version, report
+
+
+def get_vectorstore() -> FAISS:
+    vectorstore = holiday_index.get()
+    if vectorstore is None:
+        # First start without any built index
+        with _init_lock:
+            if holiday_index.get() is None:
+                build_index(force=True)
+        vectorstore = holiday_index.get()
+    return vectorstore
 
 
 def holiday_info(key: str) -> str:
-    results = vectorstore.similarity_search(key, k=1)
+    vectorstore = get_vectorstore()
+    with span("vector", "holiday"):
+        results = vectorstore.similarity_search(key, k=1)
     if results:
         best_match = results[0]
         holiday_name = best_match.metadata.get("holiday", "Unknown Holiday")
@@ -0,0 +1,88 @@
+"""
+Offline builder of the knowledge indexes. Each build is written to a new version directory and
+published by moving the CURRENT pointer; running servers pick the new version up without a restart
+(within INDEX_RELOAD_CHECK_SECONDS, or immediately through POST /admin/reload_indexes).
+
+    python -m Tools.index_builder                  # shop and holiday indexes
+    python -m Tools.index_builder holiday --force  # publish a version even if nothing changed
+    python -m Tools.index_builder product          # product vector index (embeds the whole catalog)
+"""
+import logging
+from typing import Dict, Tuple
+
+from Tools import holiday_info_tool, shop_info_tool
+from Tools.index_versions import HotIndex
+from Tools.product_vector_index import build_product_index_version, make_embedder, product_vector_index
+from Tools.tool_cache import tool_call_cache
+
+logger = logging.getLogger(__name__)
+
+HOT_INDEXES: Dict[str, HotIndex] = {
+    "shop": shop_info_tool.shop_index,
+    "holiday": holiday_info_tool.holiday_index,
+    "product": product_vector_index,
+}
+
+# Tools whose shared cached results come from each index
+INDEX_TOOLS: Dict[str, Tuple[str, ...]] = {
+    "shop": ("shop_info_tool",),
+    "holiday": ("holiday_info_tool",),
+    "product": (),
+}
+
+DEFAULT_INDEXES = ("shop", "holiday")
+
+
+def _invalidate_cached_results(name: str):
+    def invalidate(version: str) -> None:
+        dropped = tool_call_cache.invalidate(INDEX_TOOLS[name])
+        logger.info("Index %s: version %s is live, dropped %d cached results", name, version, dropped)
+    return invalidate
+
+
+# Results cached from the previous version are never served after a swap, whether it came from the
+# background check or from reload_all
+for _name, _index in HOT_INDEXES.items():
+    _index.on_swap(_invalidate_cached_results(_name))
+
+
+def build(name: str, force: bool = False):
+    """Builds and publishes one index; returns the published version or None when nothing changed."""
+    if name == "shop":
+        return shop_info_tool.build_index(force=force)[0]
+    if name == "holiday":
+        return holiday_info_tool.build_index(force=force)[0]
+    if name == "product":
+        version, meta = build_product_index_version(make_embedder())
+        logger.info("Product vector index: %d products in %s s, published version %s.",
+                    meta["count"], meta["build_seconds"], version)
+        return version
+    raise ValueError(f"Unknown index: {name}")
+
+
+def reload_all() -> Dict[str, dict]:
+    """Swaps every index that is already in use to its published version (used by the admin endpoint)."""
+    status = {}
+    for name, index in HOT_INDEXES.items():
+        # An index nobody has used yet is loaded on first use anyway
+        reloaded = index.reload() if index.version is not None else False
+        status[name] = {"version": index.version, "reloaded": reloaded}
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=".env")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("indexes", nargs="*", default=list(DEFAULT_INDEXES),
+                        help=f"Any of {', '.join(HOT_INDEXES)} (default: {' '.join(DEFAULT_INDEXES)})")
+    parser.add_argument("--force", action="store_true", help="Publish a new version even if nothing changed")
+    args = parser.parse_args()
+
+    # Build reports are logged
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for index_name in args.indexes:
+        build(index_name, force=args.force)
@@ -0,0 +1,158 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Generic, List, Optional, TypeVar
+
+from config import INDEX_RELOAD_CHECK_SECONDS, INDEX_KEEP_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+T = TypeVar("T")
+
+
+class IndexVersions:
+    """
+    Versioned layout of an index directory:
+
+        <root>/versions/<version>/   complete, never modified after publishing
+        <root>/CURRENT               name of the live version
+
+    Builders write a new version directory and then replace CURRENT atomically (os.replace), so readers
+    see either the old or the new version. An index saved directly in <root> by older code is served
+    as the "legacy" version until the first version is published.
+    """
+
+    def __init__(self, root: str, is_index: Callable[[str], bool]):
+        self.root = root
+        self.is_index = is_index
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.root, CURRENT_FILE)
+
+    def current(self) -> Optional[str]:
+        """Name of the live version, "legacy" for an unversioned index in root, or None."""
+        try:
+            with open(self.pointer_path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return "legacy" if self.is_index(self.root) else None
+
+    def path(self, version: str) -> str:
+        return self.root if version == "legacy" else os.path.join(self.root, VERSIONS_DIR, version)
+
+    def pointer_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.pointer_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def new_version(self) -> str:
+        """Name for a new version; names sort by creation time."""
+        now = time.time_ns()
+        return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10 ** 9))}-{now % 10 ** 9:09d}"
+
+    def publish(self, version: str) -> None:
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+
+    def versions(self) -> List[str]:
+        versions_dir = os.path.join(self.root, VERSIONS_DIR)
+        if not os.path.isdir(versions_dir):
+            return []
+        return sorted(name for name in os.listdir(versions_dir) if not name.endswith(".tmp"))
+
+    def prune(self, keep: int = INDEX_KEEP_VERSIONS) -> List[str]:
+        """
+        Deletes all but the `keep` newest versions (the live one is always kept). Processes that loaded an
+        older version keep serving it from memory until they reload.
+        """
+        current = self.current()
+        removable = [version for version in self.versions() if version != current]
+        removed = removable[:max(0, len(removable) - (keep - 1))]
+        for version in removed:
+            shutil.rmtree(self.path(version), ignore_errors=True)
+        return removed
+
+
+class HotIndex(Generic[T]):
+    """
+    Index loaded from the live version of an IndexVersions directory and swapped without a restart.
+
+    `get()` returns the loaded object; every `check_interval` seconds it also looks at the CURRENT
+    pointer and, when it moved, loads the new version on a background thread. The swap is a single
+    reference assignment: a query that already took the old object finishes with it, later queries get
+    the new one. Callbacks added with `on_swap` run after every swap, whichever path triggered it.
+    """
+
+    def __init__(self, name: str, versions: IndexVersions, load: Callable[[str], T],
+                 check_interval: float = INDEX_RELOAD_CHECK_SECONDS):
+        self.name = name
+        self.versions = versions
+        self._load_version = load
+        self.check_interval = check_interval
+        self.version: Optional[str] = None
+        self._value: Optional[T] = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._swap_callbacks: List[Callable[[str], None]] = []
+
+    def on_swap(self, callback: Callable[[str], None]) -> None:
+        """Calls `callback(version)` after each swap, e.g. to drop results cached from the old version."""
+        self._swap_callbacks.append(callback)
+
+    def get(self) -> Optional[T]:
+        """The live index, or None when nothing has been built yet."""
+        if self._value is None:
+            self.reload()
+        elif time.monotonic() - self._checked_at >= self.check_interval:
+            self._check_in_background()
+        return self._value
+
+    def reload(self) -> bool:
+        """Loads the live version if it differs from the loaded one. Returns True when it swapped."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stamp = self.versions.pointer_stamp()
+            version = self.versions.current()
+            if version is None or (version == self.version and self._value is not None):
+                self._stamp = stamp
+                return False
+            started = time.perf_counter()
+            value = self._load_version(self.versions.path(version))
+            previous, self._value, self.version, self._stamp = self.version, value, version, stamp
+        logger.info("Index %s: loaded version %s in %.0f ms (was %s)", self.name, version,
+                    (time.perf_counter() - started) * 1000, previous)
+        for callback in self._swap_callbacks:
+            try:
+                callback(version)
+            except Exception as e:
+                logger.warning("Index %s: swap callback failed: %s", self.name, e)
+        return True
+
+    def _check_in_background(self) -> None:
+        self._checked_at = time.monotonic()
+        if self.versions.pointer_stamp() == self._stamp or self._reloading:
+            return
+        self._reloading = True
+
+        def reload():
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning("Index %s: could not load the new version, keeping %s: %s", self.name, self.version, e)
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=reload, name=f"reload-{self.name}", daemon=True).start()
@@ -0,0 +1,147 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config import PRODUCT_DB_PATH, PRODUCT_CATALOG_IN_MEMORY, PRODUCT_CATALOG_REFRESH_SECONDS
+from metrics import span
+from Tools.db_pool import ConnectionPool, connect_read_only
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogEntry(NamedTuple):
+    title: str
+    url: Optional[str]
+    image: Optional[str]
+
+
+_SELECT_ALL = "SELECT ProductID, ProductTitle, ProductURL, ProductImage FROM StockTable"
+
+# sqlite allows at most 999 bound parameters per statement in older builds
+_MAX_PARAMS = 900
+
+
+def normalize_product_ids(product_ids: Iterable) -> List[int]:
+    """
+    ProductIDs as ints, in request order and without duplicates. The LLM passes ids as strings
+    ("95832", " 95832 "); values that are not integers cannot match any product and are dropped.
+    """
+    ids, seen = [], set()
+    for product_id in product_ids:
+        try:
+            pid = int(str(product_id).strip())
+        except ValueError:
+            continue
+        if pid not in seen:
+            seen.add(pid)
+            ids.append(pid)
+    return ids
+
+
+class ProductCatalog:
+    """
+    Display fields of all products (title, page and image links) keyed by ProductID.
+
+    The whole catalog is loaded into a dict on first use and reloaded when PRAGMA data_version
+    reports that another connection committed changes (checked at most every `refresh_interval`
+    seconds). Ids missing from the snapshot — e.g. products added since the last check — and every
+    lookup when `in_memory` is off are read from the database through a pool of read-only connections.
+
+    `generation` grows on every reload, so caches built on top of the database can use it as a version.
+    """
+
+    def __init__(self, db_path: str = PRODUCT_DB_PATH, in_memory: bool = PRODUCT_CATALOG_IN_MEMORY,
+                 refresh_interval: float = PRODUCT_CATALOG_REFRESH_SECONDS):
+        self.db_path = db_path
+        self.in_memory = in_memory
+        self.refresh_interval = refresh_interval
+        self.pool = ConnectionPool(db_path)
+        self.generation = 0
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._loaded = False
+        # data_version is only comparable between calls on the same connection, so one is kept for it
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._db_version: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def _database_version(self) -> Tuple[int, int]:
+        """(inode, data_version): changes when the data is committed or the file is replaced."""
+        inode = os.stat(self.db_path).st_ino
+        if self._watch_conn is None or (self._db_version is not None and self._db_version[0] != inode):
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self.pool.close()
+            self._watch_conn = connect_read_only(self.db_path)
+        return inode, self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self, version: Tuple[int, int]) -> None:
+        started = time.perf_counter()
+        with span("db", "catalog_load"), self.pool.connection() as conn:
+            entries = {pid: CatalogEntry(title, url, image) for pid, title, url, image in conn.execute(_SELECT_ALL)}
+        # Readers keep using the previous dict until this single assignment replaces it
+        self._entries = entries
+        self._db_version = version
+        self._loaded = True
+        self.generation += 1
+        logger.info("Product catalog loaded: %d products in %.1f ms (generation %d)",
+                    len(entries), (time.perf_counter() - started) * 1000, self.generation)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reloads the catalog if the database changed. Checks at most every `refresh_interval` seconds
+        unless `force`; a thread that finds another one refreshing keeps serving the current snapshot,
+        while a forced check waits for that refresh and sees its generation. Returns True when a new
+        snapshot was loaded.
+        """
+        now = time.monotonic()
+        if not force and self._loaded and now - self._checked_at < self.refresh_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=force or not self._loaded):
+            return False
+        try:
+            self._checked_at = now
+            version = self._database_version()
+            if self._loaded and version == self._db_version:
+                return False
+            if self.in_memory:
+                self._load(version)
+            else:
+                self._db_version = version
+                self._loaded = True
+                self.generation += 1
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def lookup(self, product_ids: Iterable) -> Dict[int, CatalogEntry]:
+        """Entries of the found products in request order; unknown ids are left out."""
+        ids = normalize_product_ids(product_ids)
+        self.refresh()
+        entries = self._entries if self.in_memory else {}
+        found = {pid: entries[pid] for pid in ids if pid in entries}
+        missing = [pid for pid in ids if pid not in found]
+        if missing:
+            from_db = self._fetch(missing)
+            found = {pid: found.get(pid) or from_db[pid] for pid in ids if pid in found or pid in from_db}
+        return found
+
+    def _fetch(self, product_ids: List[int]) -> Dict[int, CatalogEntry]:
+        fetched = {}
+        with span("db", "catalog_fetch"), self.pool.connection() as conn:
+            for start in range(0, len(product_ids), _MAX_PARAMS):
+                chunk = product_ids[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                query = f"{_SELECT_ALL} WHERE ProductID IN ({placeholders})"
+                for pid, title, url, image in conn.execute(query, chunk):
+                    fetched[pid] = CatalogEntry(title, url, image)
+        return fetched
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+product_catalog = ProductCatalog()
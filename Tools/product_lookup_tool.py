@@ -1,37 +1,23 @@
-import sqlite3
-import json
+from Tools.product_catalog import product_catalog
+from Tools.tool_results import ProductItem, ProductItems
 
 
-def lookup_products_by_ids(product_ids):
-    conn = sqlite3.connect('Data/database.db')
-    cursor = conn.cursor()
-    # Формуємо рядок з плейсхолдерами, рівний кількості ідентифікаторів
-    placeholders = ','.join('?' for _ in product_ids)
-    query = f"""
-        SELECT ProductID, ProductTitle, ProductURL, ProductImage
-        FROM StockTable
-        WHERE ProductID IN ({placeholders})
-    """
-    cursor.execute(query, product_ids)
-    rows = cursor.fetchall()
-    conn.close()
+def lookup_products_by_ids(product_ids) -> ProductItems:
+    # Каталог тримає поля товарів у пам'яті й сам перечитує їх, коли база змінюється
+    entries = product_catalog.lookup(product_ids)
 
     results = {}
     # Записуємо знайдені товари у словник
-    for row in rows:
-        pid, title, url, image = row
-        results[pid] = {
-            "id": pid,
-            "row_index": title,
-            "website_link": url,
-            "image_link": image
-        }
+    for pid, (title, url, image) in entries.items():
+        # Ключі-рядки: фронтенд завжди отримував ID у вигляді рядків JSON
+        results[str(pid)] = ProductItem(id=pid, row_index=title, website_link=url, image_link=image)
     # # Для кожного ID, який не знайдено, додаємо повідомлення про помилку
     # for pid in product_ids:
     #     if pid not in results:
     #         results[pid] = {"error": "Товар не знайдено"}
 
-    return json.dumps(results, ensure_ascii=False, indent=2)
+    # Серіалізується лише на межі HTTP (api.py), граф передає словник як є
+    return results
 
 
 # Приклад використання:
@@ -39,4 +25,5 @@ if __name__ == "__main__":
     input_ids = input("Введіть ID товарів через кому: ")
     # Розділяємо вхідний рядок на список ID та обрізаємо зайві пробіли
     id_list = [i.strip() for i in input_ids.split(",") if i.strip()]
-    print(lookup_products_by_ids(id_list))
+    for item in lookup_products_by_ids(id_list).values():
+        print(item)
@@ -0,0 +1,212 @@
+import logging
+import re
+import sqlite3
+import unicodedata
+from typing import List, Optional, Tuple
+
+from config import PRODUCT_DB_PATH, SQL_DB_TOOL_TOP_K
+from metrics import span
+from Tools.db_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Full-text index over StockTable. The indexed text is normalized in SQL (apostrophe variants mapped to
+# "'"), while case folding and diacritics are handled by the unicode61 tokenizer, which knows Cyrillic.
+# Stemming happens at query time: every query word is reduced to its stem and searched as a prefix.
+SEARCH_TABLE = "StockSearch"
+
+APOSTROPHES = ("’", "ʼ", "‘", "`", "´", "′")
+
+
+def _sql_normalize(column: str) -> str:
+    expression = column
+    for apostrophe in APOSTROPHES:
+        expression = f"replace({expression}, '{apostrophe}', '''')"
+    return f"coalesce({expression}, '')"
+
+
+_INDEXED_COLUMNS = ("ProductTitle", "Category", "SubCategory")
+
+_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    ProductID UNINDEXED, ProductTitle, Category, SubCategory,
+    tokenize = "unicode61 remove_diacritics 2 tokenchars ''''"
+);
+
+CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON StockTable BEGIN
+    INSERT INTO {SEARCH_TABLE}(rowid, ProductID, {", ".join(_INDEXED_COLUMNS)})
+    VALUES (new.rowid, new.ProductID, {", ".join(_sql_normalize("new." + c) for c in _INDEXED_COLUMNS)});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON StockTable BEGIN
+    DELETE FROM {SEARCH_TABLE} WHERE rowid = old.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF ProductID, {", ".join(_INDEXED_COLUMNS)} ON StockTable
+BEGIN
+    DELETE FROM {SEARCH_TABLE} WHERE rowid = old.rowid;
+    INSERT INTO {SEARCH_TABLE}(rowid, ProductID, {", ".join(_INDEXED_COLUMNS)})
+    VALUES (new.rowid, new.ProductID, {", ".join(_sql_normalize("new." + c) for c in _INDEXED_COLUMNS)});
+END;
+"""
+
+_POPULATE = f"""
+INSERT INTO {SEARCH_TABLE}(rowid, ProductID, {", ".join(_INDEXED_COLUMNS)})
+SELECT rowid, ProductID, {", ".join(_sql_normalize(c) for c in _INDEXED_COLUMNS)} FROM StockTable
+"""
+
+# Title matches matter most, then subcategory, then category (ProductID is unindexed)
+_RANK = f"bm25({SEARCH_TABLE}, 0.0, 10.0, 1.0, 2.0)"
+
+_SEARCH = f"""
+SELECT s.ProductID, s.ProductTitle, s.ProductPrice, s.StockProduct
+FROM {SEARCH_TABLE}
+JOIN StockTable AS s ON s.rowid = {SEARCH_TABLE}.rowid
+WHERE {SEARCH_TABLE} MATCH ? {{stock_filter}}
+ORDER BY {_RANK}
+LIMIT ?
+"""
+
+STOPWORDS = frozenset("""
+і й та в у на з із зі до для є чи які який яка яке що це цей ця ці мені мене ми ви вас вам
+покажіть покажи показати хочу хотів хотіла шукаю знайди знайдіть потрібен потрібна потрібно потрібні
+а але або про по від при як щось щоб будь ласка наявності маєте є
+грн гривень гривні гривня uah шт штук
+a the an for of and or to with show me do you have is are any some i want need please find
+""".split())
+
+_UK_SUFFIXES = sorted((
+    "ами", "ями", "ові", "еві", "ого", "ому", "ими", "іми", "ість",
+    "ий", "ій", "ої", "ою", "ею", "ам", "ям", "ах", "ях", "ів", "їв", "ов", "ем", "ом", "ім",
+    "их", "іх", "і", "а", "я", "о", "е", "и", "ї", "у", "ю", "ь", "й",
+), key=len, reverse=True)
+
+_EN_SUFFIXES = ("ies", "ing", "es", "ed", "ly", "s")
+
+_MIN_STEM = 3
+
+_UK_VOWELS = "аеєиіїоуюя"
+
+_WORD = re.compile(r"[\w']+")
+_CYRILLIC = re.compile(r"[Ѐ-ӿ]")
+
+
+def normalize_text(text: str) -> str:
+    """Case-folds text and maps apostrophe variants to a plain "'"."""
+    text = unicodedata.normalize("NFC", text)
+    for apostrophe in APOSTROPHES:
+        text = text.replace(apostrophe, "'")
+    return text.casefold()
+
+
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer for Ukrainian and English words."""
+    suffixes = _UK_SUFFIXES if _CYRILLIC.search(word) else _EN_SUFFIXES
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def word_stems(word: str) -> List[str]:
+    """
+    Stems to search for a word. Short Ukrainian stems ending in "й" change it in inflected forms
+    (чай - чаї - чаю), which the suffix stripper cannot undo, so the "й" form is searched as well.
+    """
+    stems = [stem(word)]
+    if len(word) in (3, 4) and word[-1] in "їюяє" and word[-2] in _UK_VOWELS:
+        stems.append(word[:-1] + "й")
+    return stems
+
+
+def build_match_query(text: str, match_all: bool = False) -> Optional[str]:
+    """
+    FTS5 MATCH expression for free text: stemmed prefix terms, ranked by bm25. With `match_all` every
+    word must match ("зелений чай" finds green tea only), otherwise any word does.
+    """
+    groups: List[List[str]] = []
+    for word in _WORD.findall(normalize_text(text)):
+        word = word.strip("'")
+        if not word or word in STOPWORDS or word.isdigit():
+            continue
+        terms = [f'"{word_stem}"*' for word_stem in word_stems(word)]
+        if terms not in groups:
+            groups.append(terms)
+    if not groups:
+        return None
+    if match_all:
+        return " AND ".join(group[0] if len(group) == 1 else f"({' OR '.join(group)})" for group in groups)
+    return " OR ".join(dict.fromkeys(term for group in groups for term in group))
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> None:
+    """Creates the FTS table and its sync triggers and fills it on first use."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)).fetchone()
+    if exists:
+        return
+    with conn:
+        conn.executescript(_DDL)
+        conn.execute(_POPULATE)
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> None:
+    """Refills the FTS table from StockTable (e.g. after bulk changes made with triggers disabled)."""
+    with conn:
+        conn.executescript(_DDL)
+        conn.execute(f"DELETE FROM {SEARCH_TABLE}")
+        conn.execute(_POPULATE)
+
+
+class ProductSearch:
+    """
+    Ranked full-text product search over pooled read-only connections. The FTS table is created by the
+    schema migrations (Tools.db_migrations); without it the search finds nothing.
+    """
+
+    def __init__(self, db_path: str = PRODUCT_DB_PATH):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path)
+        self._missing_logged = False
+
+    def search(self, text: str, limit: int = SQL_DB_TOOL_TOP_K, in_stock_only: bool = True,
+               match_all: bool = False) -> List[Tuple[int, str, float, int]]:
+        """(ProductID, ProductTitle, ProductPrice, StockProduct) rows, best match first."""
+        match = build_match_query(text, match_all)
+        if match is None:
+            return []
+        stock_filter = "AND s.StockProduct > 0" if in_stock_only else ""
+        with span("db", "fts"), self.pool.connection() as conn:
+            try:
+                return conn.execute(_SEARCH.format(stock_filter=stock_filter), (match, limit)).fetchall()
+            except sqlite3.OperationalError as e:
+                if f"no such table: {SEARCH_TABLE}" not in str(e):
+                    raise
+                if not self._missing_logged:
+                    self._missing_logged = True
+                    logger.warning("%s does not exist, full-text search is off until the database is migrated "
+                                   "(python -m Tools.db_migrations)", SEARCH_TABLE)
+                return []
+
+
+product_search = ProductSearch()
+
+
+def search_products(text: str, limit: int = SQL_DB_TOOL_TOP_K, in_stock_only: bool = True, match_all: bool = False):
+    return product_search.search(text, limit=limit, in_stock_only=in_stock_only, match_all=match_all)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Full-text product search over StockTable.")
+    parser.add_argument("query", nargs="?", help="Search text, e.g. 'зелений чай'")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the FTS index from StockTable")
+    parser.add_argument("--limit", type=int, default=SQL_DB_TOOL_TOP_K)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_search_index(sqlite3.connect(PRODUCT_DB_PATH))
+        print("FTS index rebuilt.")
+    if args.query:
+        for row in search_products(args.query, limit=args.limit):
+            print(row)
@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from typing import List, Optional, Protocol, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from config import PRODUCT_DB_PATH, PRODUCT_VECTOR_INDEX_DIR, PRODUCT_VECTOR_INDEX_TYPE, PRODUCT_VECTOR_EMBEDDER, \
+    PRODUCT_VECTOR_HASHING_DIM, PRODUCT_VECTOR_HNSW_M, PRODUCT_VECTOR_HNSW_EF_SEARCH, PRODUCT_VECTOR_IVF_NPROBE, \
+    PRODUCT_VECTOR_MIN_SCORE, SQL_DB_TOOL_TOP_K
+from metrics import span
+from Tools.index_versions import HotIndex, IndexVersions
+from Tools.product_catalog import ProductCatalog, product_catalog
+from Tools.product_search import normalize_text
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+IDS_FILE = "product_ids.npy"
+META_FILE = "meta.json"
+
+EMBED_BATCH_SIZE = 512
+HNSW_EF_CONSTRUCTION = 64
+
+# "1.1 текстиль домашній" -> "текстиль домашній"
+_CATEGORY_NUMBER = re.compile(r"^\s*[\d.]+\s*")
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into vectors. Vectors are compared by inner product after L2 normalization."""
+    name: str
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]: ...
+
+    def embed_query(self, text: str) -> List[float]: ...
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: signed feature hashing of character 3/4-grams and whole words.
+    It needs no network and gives identical vectors on every run, which makes it suitable for tests and
+    benchmarks; it matches spelling variants, not synonyms.
+    """
+
+    def __init__(self, dim: int = PRODUCT_VECTOR_HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = normalize_text(text)
+        padded = f" {text} "
+        features = [padded[i:i + n] for n in (3, 4) for i in range(len(padded) - n + 1)]
+        features += [f"w:{word}" for word in text.split()] * 2
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class LangChainEmbedder:
+    """Adapter for LangChain embeddings (e.g. OpenAIEmbeddings)."""
+
+    def __init__(self, embeddings, name: str):
+        self.embeddings = embeddings
+        self.name = name
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def make_embedder(name: str = PRODUCT_VECTOR_EMBEDDER) -> Embedder:
+    """"openai" or "openai:<model>" for OpenAI embeddings, "hashing" or "hashing-<dim>" for the local embedder."""
+    if name.startswith("hashing"):
+        _, _, dim = name.partition("-")
+        return HashingEmbedder(int(dim) if dim else PRODUCT_VECTOR_HASHING_DIM)
+    if name.startswith("openai"):
+        from Tools.embedding_cache import get_embeddings
+
+        _, _, model = name.partition(":")
+        # Cached, so rebuilding the index only embeds new or renamed products
+        embeddings = get_embeddings(model or "text-embedding-3-small")
+        return LangChainEmbedder(embeddings, name=f"openai:{embeddings.model}")
+    raise ValueError(f"Unknown product embedder: {name}")
+
+
+def product_text(title: str, category: Optional[str], subcategory: Optional[str]) -> str:
+    """Text embedded for one product: title plus its subcategory and category without numbering."""
+    parts = [title] + [_CATEGORY_NUMBER.sub("", part) for part in (subcategory, category) if part]
+    return ". ".join(parts)
+
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def create_index(dim: int, count: int, index_type: str = PRODUCT_VECTOR_INDEX_TYPE):
+    """Empty inner-product index: HNSW (no training) or IVF with about sqrt(count) lists."""
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, PRODUCT_VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    if index_type == "ivf":
+        nlist = max(1, int(np.sqrt(count)))
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown product index type: {index_type}")
+
+
+def build_vector_index(vectors: np.ndarray, index_type: str = PRODUCT_VECTOR_INDEX_TYPE):
+    index = create_index(vectors.shape[1], len(vectors), index_type)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def build_product_index(embedder: Embedder, db_path: str = PRODUCT_DB_PATH, index_dir: str = PRODUCT_VECTOR_INDEX_DIR,
+                        index_type: str = PRODUCT_VECTOR_INDEX_TYPE) -> dict:
+    """Embeds every product of StockTable and writes the index, the ProductID array and metadata to index_dir."""
+    started = time.perf_counter()
+    with closing(sqlite3.connect(db_path)) as conn:
+        rows = conn.execute("SELECT ProductID, ProductTitle, Category, SubCategory FROM StockTable").fetchall()
+
+    texts = [product_text(title or "", category, subcategory) for _, title, category, subcategory in rows]
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(embedder.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+    vectors = _normalized(vectors)
+    index = build_vector_index(vectors, index_type)
+
+    os.makedirs(index_dir, exist_ok=True)
+    faiss.write_index(index, os.path.join(index_dir, INDEX_FILE))
+    np.save(os.path.join(index_dir, IDS_FILE), np.asarray([row[0] for row in rows], dtype=np.int64))
+    meta = {
+        "embedder": embedder.name,
+        "index_type": index_type,
+        "dim": int(vectors.shape[1]),
+        "count": len(rows),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "build_seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(index_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+class ProductVectorIndex:
+    """
+    Read side of the product vector index. Out-of-stock products are filtered inside the FAISS search
+    with a bitmap selector; the bitmap is reloaded when the product catalog generation changes (any
+    committed write, WAL included), over the catalog's read-only connection pool.
+    """
+
+    def __init__(self, index, product_ids: np.ndarray, embedder: Embedder, meta: dict,
+                 catalog: ProductCatalog = product_catalog):
+        self.index = index
+        self.product_ids = product_ids
+        self.embedder = embedder
+        self.meta = meta
+        self.catalog = catalog
+        self._positions = {int(pid): position for position, pid in enumerate(product_ids)}
+        self._in_stock = None
+        self._stock_version_seen = None
+        self._mutex = threading.Lock()
+
+    @classmethod
+    def load(cls, index_dir: str = PRODUCT_VECTOR_INDEX_DIR, embedder: Optional[Embedder] = None,
+             catalog: ProductCatalog = product_catalog) -> "ProductVectorIndex":
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        embedder = embedder or make_embedder(meta["embedder"])
+        if embedder.name != meta["embedder"]:
+            raise ValueError(f"Index was built with {meta['embedder']}, not {embedder.name}")
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+        product_ids = np.load(os.path.join(index_dir, IDS_FILE))
+        return cls(index, product_ids, embedder, meta, catalog=catalog)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: serialized index plus the ProductID array."""
+        return int(faiss.serialize_index(self.index).nbytes + self.product_ids.nbytes)
+
+    def _stock_version(self) -> int:
+        # The data_version check costs microseconds, so stock changes are seen on the next search
+        self.catalog.refresh(force=True)
+        return self.catalog.generation
+
+    def _load_stock_mask(self) -> np.ndarray:
+        """Boolean array over index positions: True for products with StockProduct > 0."""
+        mask = np.zeros(len(self.product_ids), dtype=bool)
+        with span("db", "vector_stock"), self.catalog.pool.connection() as conn:
+            for pid, stock in conn.execute("SELECT ProductID, StockProduct FROM StockTable"):
+                position = self._positions.get(pid)
+                if position is not None and stock and stock > 0:
+                    mask[position] = True
+        return mask
+
+    def _stock_selector(self):
+        version = self._stock_version()
+        with self._mutex:
+            if version != self._stock_version_seen:
+                self._in_stock = np.packbits(self._load_stock_mask(), bitorder="little")
+                self._stock_version_seen = version
+            return faiss.IDSelectorBitmap(len(self.product_ids), faiss.swig_ptr(self._in_stock)), self._in_stock
+
+    def _search_params(self, selector):
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=PRODUCT_VECTOR_HNSW_EF_SEARCH)
+        if isinstance(self.index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=PRODUCT_VECTOR_IVF_NPROBE)
+        return faiss.SearchParameters(sel=selector)
+
+    def search_vector(self, vector: np.ndarray, k: int = SQL_DB_TOOL_TOP_K,
+                      in_stock_only: bool = True) -> List[Tuple[int, float]]:
+        """(ProductID, cosine similarity) pairs, best first."""
+        params = None
+        if in_stock_only:
+            # The bitmap array must stay alive while FAISS reads it through the selector
+            selector, bitmap = self._stock_selector()
+            params = self._search_params(selector)
+        elif isinstance(self.index, (faiss.IndexHNSW, faiss.IndexIVF)):
+            params = self._search_params(None)
+        scores, positions = self.index.search(vector.reshape(1, -1), k, params=params)
+        return [(int(self.product_ids[position]), float(score))
+                for position, score in zip(positions[0], scores[0]) if position >= 0]
+
+    def search(self, text: str, k: int = SQL_DB_TOOL_TOP_K, in_stock_only: bool = True) -> List[Tuple[int, float]]:
+        return self.search_vector(_normalized([self.embedder.embed_query(text)])[0], k, in_stock_only)
+
+
+def is_product_index(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+
+# Versions are published by the offline build and picked up by running processes without a restart
+product_vector_index = HotIndex("product_vectors", IndexVersions(PRODUCT_VECTOR_INDEX_DIR, is_product_index),
+                                lambda path: ProductVectorIndex.load(path))
+_index_missing_logged = False
+
+
+def build_product_index_version(embedder: Embedder, db_path: str = PRODUCT_DB_PATH,
+                                index_type: str = PRODUCT_VECTOR_INDEX_TYPE,
+                                versions: Optional[IndexVersions] = None) -> Tuple[str, dict]:
+    """Builds the index into a new version directory and publishes it. Returns the version and its metadata."""
+    versions = versions or product_vector_index.versions
+    version = versions.new_version()
+    build_dir = f"{versions.path(version)}.tmp"
+    try:
+        meta = build_product_index(embedder, db_path, build_dir, index_type)
+        os.replace(build_dir, versions.path(version))
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    versions.publish(version)
+    versions.prune()
+    return version, meta
+
+
+def get_product_vector_index() -> Optional[ProductVectorIndex]:
+    """The live offline-built index from PRODUCT_VECTOR_INDEX_DIR, or None when it has not been built."""
+    global _index_missing_logged
+    index = product_vector_index.get()
+    if index is None and not _index_missing_logged:
+        logger.info("Product vector index not found in %s; build it with "
+                    "'python -m Tools.index_builder product'", PRODUCT_VECTOR_INDEX_DIR)
+        _index_missing_logged = True
+    return index
+
+
+def search_similar_products(text: str, k: int = SQL_DB_TOOL_TOP_K, in_stock_only: bool = True,
+                            min_score: float = PRODUCT_VECTOR_MIN_SCORE) -> List[Tuple[int, str, float, int]]:
+    """
+    Semantic product search for sql_db_tool: (ProductID, ProductTitle, ProductPrice, StockProduct) rows
+    of the closest products with similarity of at least min_score. Empty when the index is not built.
+    """
+    index = get_product_vector_index()
+    if index is None:
+        return []
+    with span("vector", "product"):
+        matches = [(pid, score) for pid, score in index.search(text, k, in_stock_only) if score >= min_score]
+    if not matches:
+        return []
+    placeholders = ",".join("?" for _ in matches)
+    with span("db", "vector_rows"), index.catalog.pool.connection() as conn:
+        rows = conn.execute(
+            f"SELECT ProductID, ProductTitle, ProductPrice, StockProduct FROM StockTable "
+            f"WHERE ProductID IN ({placeholders})", [pid for pid, _ in matches]
+        ).fetchall()
+    by_id = {row[0]: row for row in rows}
+    return [by_id[pid] for pid, _ in matches if pid in by_id]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline product vector index over StockTable.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Embed all products and write the index")
+    build.add_argument("--embedder", default=PRODUCT_VECTOR_EMBEDDER, help="openai[:model] or hashing[-dim]")
+    build.add_argument("--type", default=PRODUCT_VECTOR_INDEX_TYPE, choices=["hnsw", "ivf"])
+    build.add_argument("--db", default=PRODUCT_DB_PATH)
+    build.add_argument("--out", default=PRODUCT_VECTOR_INDEX_DIR, help="Index root; the build is published there "
+                                                                        "as a new version")
+    search = commands.add_parser("search", help="Query the built index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=SQL_DB_TOOL_TOP_K)
+    search.add_argument("--all", action="store_true", help="Include out-of-stock products")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        version, meta = build_product_index_version(make_embedder(args.embedder), args.db, args.type,
+                                                    IndexVersions(args.out, is_product_index))
+        print(f"Published version {version}")
+        print(json.dumps(meta, ensure_ascii=False, indent=2))
+    else:
+        for row in search_similar_products(args.query, k=args.k, in_stock_only=not args.all, min_score=-1.0):
+            print(row)
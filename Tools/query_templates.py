@@ -0,0 +1,283 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config import SQL_QUERY_LOG_PATH, SQL_QUERY_LOG_MAX_ENTRIES, SQL_DB_TOOL_TEMPLATE_MIN_SIMILARITY
+from Tools.sql_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# LIKE '<pattern>' in generated SQL; '' is an escaped quote inside the literal
+_LIKE_LITERAL = re.compile(r"\bLIKE\s+'((?:[^']|'')*)'", re.IGNORECASE)
+# Marks a slot in the template SQL; private-use characters never occur in generated SQL
+_SLOT = "\ue000{}\ue000"
+_SLOT_PATTERN = re.compile("\ue000(\\d+)\ue000")
+# A shorter substituted term would match too many products
+_MIN_TERM_LENGTH = 3
+_CASES = {"lower": str.lower, "upper": str.upper, "title": str.title}
+
+
+class SlotRule(NamedTuple):
+    """How a LIKE literal is derived from the product word of the question."""
+    prefix: str    # wildcards before the term, e.g. "%"
+    suffix: str    # wildcards after the term
+    cut: int       # characters dropped from the end of the word ("подушки" -> "подушк")
+    case: str      # "lower", "upper" or "title"
+
+
+class QueryTemplate(NamedTuple):
+    shape: str                  # normalized question with the product word replaced by "{}"
+    context: frozenset          # the other words of the question
+    sql: str                    # SQL with _SLOT markers in place of the LIKE literals
+    rules: Tuple[SlotRule, ...]
+    question: str               # the question the template was learned from
+    llm_calls: int              # LLM calls it took to find the SQL
+    seconds: float              # time it took
+
+
+class TemplateMatch(NamedTuple):
+    sql: str
+    term: str
+    similarity: float
+    template: QueryTemplate
+
+
+def _words(question: str) -> List[str]:
+    return normalize_question(question).split()
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _case_of(term: str) -> Optional[str]:
+    for case, convert in _CASES.items():
+        if term == convert(term):
+            return case
+    return None
+
+
+def _shape(words: List[str], slot: int) -> str:
+    return " ".join("{}" if i == slot else word for i, word in enumerate(words))
+
+
+def extract_template(question: str, sql: str, llm_calls: int = 1, seconds: float = 0.0) -> Optional[QueryTemplate]:
+    """
+    Template of a successful (question, SQL) pair, or None when the SQL does not follow from a single
+    product word. Every LIKE literal that is a prefix of one question word (e.g. '%Чай%' for "чай")
+    becomes a slot; literals unrelated to the question stay constant. Pairs whose literals come from
+    several words, or from nothing in the question, are not generalized.
+    """
+    words = _words(question)
+    slot_word = None
+    rules: List[SlotRule] = []
+    parts: List[str] = []
+    position = 0
+    for literal in _LIKE_LITERAL.finditer(sql):
+        value = literal.group(1)
+        core = value.strip("%")
+        if not core or "%" in core or "_" in core or " " in core:
+            continue
+        folded = core.replace("''", "'").casefold()
+        matches = [i for i, word in enumerate(words) if word.startswith(folded) and not word.isdigit()]
+        if not matches or len(folded) < _MIN_TERM_LENGTH:
+            continue
+        index = matches[0]
+        case = _case_of(core)
+        if case is None or (slot_word is not None and index != slot_word):
+            return None
+        slot_word = index
+        rules.append(SlotRule(value[:len(value) - len(value.lstrip("%"))], value[len(value.rstrip("%")):],
+                              len(words[index]) - len(folded), case))
+        parts.append(sql[position:literal.start(1)])
+        parts.append(_SLOT.format(len(rules) - 1))
+        position = literal.end(1)
+    if slot_word is None:
+        return None
+    parts.append(sql[position:])
+    context = frozenset(word for i, word in enumerate(words) if i != slot_word)
+    return QueryTemplate(_shape(words, slot_word), context, "".join(parts), tuple(rules), question,
+                         llm_calls, round(seconds, 3))
+
+
+def render_sql(template: QueryTemplate, word: str) -> Optional[str]:
+    """The template SQL with the LIKE literals derived from `word`, or None if the word is too short."""
+    literals = []
+    for rule in template.rules:
+        term = word[:len(word) - rule.cut] if rule.cut else word
+        if len(term) < _MIN_TERM_LENGTH:
+            return None
+        literals.append(rule.prefix + _CASES[rule.case](term).replace("'", "''") + rule.suffix)
+    return _SLOT_PATTERN.sub(lambda slot: literals[int(slot.group(1))], template.sql)
+
+
+class QueryTemplateLibrary:
+    """
+    SQL proven by earlier questions, reused for similar questions about another product.
+
+    Every SQL that returned rows is appended to a JSONL log (question, SQL, LLM calls, seconds). Pairs
+    that generalize (see extract_template) become templates keyed by the question shape: "які є {}"
+    learned from "які є рушники" answers "які є пледи" with the LIKE terms rebuilt from "пледи", without
+    the query-writing call and the rephrasing retries.
+
+    A new question matches a template when all of its words but one are words of the template question
+    and the character-trigram cosine similarity of the shapes reaches `min_similarity`. Numbers are
+    ordinary words, so "до 200 грн" never reuses the SQL of "до 300 грн".
+
+    The log is read once per process, by the startup warm-up (or the first lookup). Past `max_entries`
+    it is compacted to the entries the templates were learned from plus the newest ones, up to half
+    of the limit, so it neither grows without bound nor forgets templates that are still in use.
+    """
+
+    def __init__(self, log_path: Optional[str] = SQL_QUERY_LOG_PATH,
+                 min_similarity: float = SQL_DB_TOOL_TEMPLATE_MIN_SIMILARITY,
+                 max_entries: int = SQL_QUERY_LOG_MAX_ENTRIES):
+        self.log_path = log_path
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self.templates: Dict[str, QueryTemplate] = {}
+        # Log entry each template was learned from, kept when the log is compacted
+        self._sources: Dict[str, dict] = {}
+        self._log_entries = 0
+        self._vectors: Dict[str, Counter] = {}
+        self._by_word: Dict[str, set] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    def load(self) -> None:
+        """Learns the templates from the log; later calls do nothing."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            for entry in read_log(self.log_path):
+                self.learn(entry)
+                self._log_entries += 1
+            if self._log_too_long():
+                self._compact_log()
+            self._loaded = True
+        logger.info("SQL query templates: %d learned from the log in %.1f ms", len(self.templates),
+                    (time.perf_counter() - started) * 1000)
+
+    def learn(self, entry: dict) -> Optional[QueryTemplate]:
+        """Adds the template of a log entry, if it generalizes."""
+        # Only SQL written by the LLM teaches; template hits would just confirm themselves
+        if entry.get("source") != "llm":
+            return None
+        template = extract_template(entry["question"], entry["sql"], entry.get("llm_calls", 1),
+                                   entry.get("seconds", 0.0))
+        if template is None:
+            return None
+        # The latest SQL for a shape wins: the schema or the prompt may have changed since
+        self.templates[template.shape] = template
+        self._sources[template.shape] = entry
+        self._vectors[template.shape] = _trigrams(template.shape)
+        for word in template.context:
+            self._by_word.setdefault(word, set()).add(template.shape)
+        return template
+
+    def record(self, question: str, sql: str, rows: int, source: str, llm_calls: int, seconds: float) -> None:
+        """Logs a SQL run that returned rows and learns from it."""
+        entry = {"ts": round(time.time(), 3), "question": question, "sql": sql, "rows": rows,
+                 "source": source, "llm_calls": llm_calls, "seconds": round(seconds, 3)}
+        self.load()
+        with self._lock:
+            self.learn(entry)
+            if self.log_path:
+                try:
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    self._log_entries += 1
+                except OSError as e:
+                    logger.warning("Could not append to the SQL query log: %s", e)
+            if self._log_too_long():
+                self._compact_log()
+
+    def _log_too_long(self) -> bool:
+        # Template sources are always kept, so with very many templates the limit grows with them
+        return self._log_entries > max(self.max_entries, 2 * len(self._sources))
+
+    def _compact_log(self) -> None:
+        """Rewrites the log with the template sources and the newest entries; called under the lock."""
+        started = time.perf_counter()
+        newest = deque(read_log(self.log_path), maxlen=max(1, self.max_entries // 2 - len(self._sources)))
+        lines = {json.dumps(entry, ensure_ascii=False) for entry in self._sources.values()}
+        lines.update(json.dumps(entry, ensure_ascii=False) for entry in newest)
+        kept = sorted(lines, key=lambda line: json.loads(line).get("ts", 0))
+        tmp_path = f"{self.log_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in kept)
+            os.replace(tmp_path, self.log_path)
+        except OSError as e:
+            logger.warning("Could not compact the SQL query log: %s", e)
+            return
+        logger.info("SQL query log compacted from %d to %d entries in %.1f ms", self._log_entries, len(kept),
+                    (time.perf_counter() - started) * 1000)
+        self._log_entries = len(kept)
+
+    def match(self, question: str, min_similarity: Optional[float] = None) -> Optional[TemplateMatch]:
+        """The most similar template with its SQL rendered for this question, if confident enough."""
+        self.load()
+        threshold = self.min_similarity if min_similarity is None else min_similarity
+        words = _words(question)
+        # record() learns templates from other request threads; the candidates are copied under the lock
+        # and scored outside of it
+        with self._lock:
+            shapes = set().union(*(self._by_word.get(word, ()) for word in words)) if words else set()
+            candidates = [(self.templates[shape], self._vectors[shape]) for shape in shapes]
+        best: Optional[TemplateMatch] = None
+        for template, vector in candidates:
+            extra = [i for i, word in enumerate(words) if word not in template.context]
+            if len(extra) != 1 or words[extra[0]].isdigit():
+                continue
+            similarity = _cosine(_trigrams(_shape(words, extra[0])), vector)
+            if similarity < threshold or (best is not None and similarity <= best.similarity):
+                continue
+            sql = render_sql(template, words[extra[0]])
+            if sql is not None:
+                best = TemplateMatch(sql, words[extra[0]], round(similarity, 3), template)
+        return best
+
+    def count(self, outcome: str, match: Optional[TemplateMatch] = None, seconds: float = 0.0) -> None:
+        """Outcome of using a match: "hit" (rows found) or "fallback" (no rows, the LLM writes the SQL)."""
+        with self._lock:
+            self.counters[outcome] += 1
+            if outcome == "hit" and match is not None:
+                self.counters["llm_calls_saved"] += match.template.llm_calls
+                self.counters["ms_saved"] += max(0, round((match.template.seconds - seconds) * 1000))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"templates": len(self.templates), **self.counters}
+
+
+def read_log(path: Optional[str]) -> Iterable[dict]:
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the rest of the log is still usable
+                continue
+
+
+query_templates = QueryTemplateLibrary()
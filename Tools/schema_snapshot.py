@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from langchain_community.utilities import SQLDatabase
+
+from config import SQL_DB_TOOL_SUBCATEGORY_HINTS
+from Tools.product_catalog import ProductCatalog, product_catalog
+
+logger = logging.getLogger(__name__)
+
+# Numeric prefix first, so "2. ..." comes before "10. ..."
+_CATEGORIES = """
+SELECT Category, COUNT(*) FROM StockTable WHERE Category IS NOT NULL
+GROUP BY Category ORDER BY CAST(Category AS INTEGER), Category
+"""
+_SUBCATEGORIES = """
+SELECT Category, SubCategory FROM StockTable WHERE Category IS NOT NULL AND SubCategory IS NOT NULL
+GROUP BY Category, SubCategory ORDER BY CAST(SubCategory AS INTEGER), CAST(substr(SubCategory, instr(SubCategory, '.') + 1) AS INTEGER)
+"""
+_RANGES = """
+SELECT MIN(ProductPrice), MAX(ProductPrice), MIN(StockProduct), MAX(StockProduct), SUM(StockProduct > 0), COUNT(*)
+FROM StockTable
+"""
+
+
+class SchemaSnapshot:
+    """
+    Table description for the SQL-writing prompt, computed once per database version.
+
+    SQLDatabase.get_table_info() reflects the schema and queries sample rows on every call; the snapshot
+    keeps its text together with value hints (the existing categories, price and stock ranges), so the
+    LLM writes filters with real values. It is rebuilt when the product catalog generation changes,
+    i.e. when PRAGMA data_version or the database file changed.
+    """
+
+    def __init__(self, get_db: Callable[[], SQLDatabase], catalog: ProductCatalog = product_catalog,
+                 subcategory_hints: bool = SQL_DB_TOOL_SUBCATEGORY_HINTS):
+        self.get_db = get_db
+        self.catalog = catalog
+        self.subcategory_hints = subcategory_hints
+        self.generation: Optional[int] = None
+        self._table_info = ""
+        self._lock = threading.Lock()
+
+    def table_info(self) -> str:
+        self.catalog.refresh()
+        generation = self.catalog.generation
+        if generation != self.generation:
+            with self._lock:
+                if generation != self.generation:
+                    started = time.perf_counter()
+                    self._table_info = self.get_db().get_table_info() + "\n\n" + self.value_hints()
+                    self.generation = generation
+                    logger.info("Schema snapshot rebuilt in %.1f ms (generation %d)",
+                                (time.perf_counter() - started) * 1000, generation)
+        return self._table_info
+
+    def value_hints(self) -> str:
+        with self.catalog.pool.connection() as conn:
+            categories = conn.execute(_CATEGORIES).fetchall()
+            subcategories = conn.execute(_SUBCATEGORIES).fetchall() if self.subcategory_hints else []
+            min_price, max_price, min_stock, max_stock, in_stock, total = conn.execute(_RANGES).fetchone()
+
+        lines = ["/*", "Column value hints:", "Category values (product count):"]
+        for category, count in categories:
+            lines.append(f"  {category} ({count})")
+            lines.extend(f"    {subcategory}" for parent, subcategory in subcategories if parent == category)
+        if min_price is not None:
+            lines.append(f"ProductPrice: from {min_price:.2f} to {max_price:.2f} (UAH)")
+        if min_stock is not None:
+            lines.append(f"StockProduct: from {min_stock} to {max_stock}; {in_stock} of {total} products are in stock "
+                         f"(StockProduct > 0)")
+        lines.append("*/")
+        return "\n".join(lines)
@@ -1,104 +1,113 @@
+import logging
 import os
+import threading
+from typing import List, Optional, Tuple
+
 import yaml
-import hashlib
 from dotenv import load_dotenv
-from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+
+from config import BASE_DIR
+from Tools.embedding_cache import get_embeddings
+from Tools.faiss_index import build_index_version, is_faiss_store, load_faiss_store
+from Tools.index_versions import HotIndex, IndexVersions
+
+DATA_FILE = os.path.join(BASE_DIR, "Data", "shop_info.yaml")
+INDEX_DIR = os.path.join(BASE_DIR, "Data", "faiss_shop_info_index")
 
-DATA_FILE = "Data/shop_info.yaml"
-INDEX_DIR = "Data/faiss_shop_info_index"
-hash_yaml_path = os.path.join(INDEX_DIR, "file_hashes.yaml")
+logger = logging.getLogger(__name__)
 
 load_dotenv(dotenv_path=".env")
 
-def compute_file_hash(file_path, algorithm='md5'):
-    hash_algo = hashlib.new(algorithm)
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            hash_algo.update(chunk)
-    return hash_algo.hexdigest()
-
-# Compute the current hash of the YAML data file.
-current_yaml_hash = compute_file_hash(DATA_FILE)
-
-# Load hash data from file if it exists; otherwise, initialize an empty dictionary.
-if os.path.exists(hash_yaml_path):
-    with open(hash_yaml_path, 'r', encoding='utf-8') as f:
-        hash_data = yaml.safe_load(f) or {}
-else:
-    hash_data = {}
-
-# Use the YAML file name as the key in the hash dictionary.
-yaml_key = os.path.basename(DATA_FILE)
-stored_hash = hash_data.get(yaml_key)
-
-# Determine if the FAISS index needs to be rebuilt.
-rebuild_index = (stored_hash != current_yaml_hash)
-
-# Initialize embeddings.
-OPENAI_API_KEY = os.getenv("GPT_API_KEY") or os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("GPT_API_KEY or OPENAI_API_KEY environment variable must be set")
-
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-
-if not rebuild_index and os.path.exists(INDEX_DIR):
-    # Load FAISS index from disk.
-    try:
-        vectorstore = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-        print("Loaded FAISS index from disk.")
-    except Exception as e:
-        print(f"Error loading index from disk: {e}. Rebuilding index...")
-        rebuild_index = True
-
-if rebuild_index or not os.path.exists(INDEX_DIR):
+# The index is built offline (python -m Tools.index_builder shop) and swapped in without a restart when a
+# new version is published. The tool serves the sections stored in the live version:
+# (loaded index version, its sections in the order of the YAML file)
+_documents: Optional[Tuple[Optional[str], List[Document]]] = None
+_init_lock = threading.Lock()
+
+shop_index = HotIndex("shop_info", IndexVersions(INDEX_DIR, is_faiss_store),
+                      lambda path: load_faiss_store(path, get_embeddings()))
+
+
+def load_documents() -> List[Document]:
     # Load data from the YAML file.
     with open(DATA_FILE, 'r', encoding='utf-8') as file:
         shop_data = yaml.safe_load(file)
 
     # Create Document objects for each section.
     documents = []
-    for section, content in shop_data.items():
+    for order, (section, content) in enumerate(shop_data.items()):
         # If the content is a list (e.g., for "Values"), join the items.
         if isinstance(content, list):
             content_text = "\n".join(content)
         else:
             content_text = str(content)
         doc_content = f"**{section}**\n{content_text}"
-        doc = Document(page_content=doc_content, metadata={"section": section})
+        doc = Document(page_content=doc_content, metadata={"section": section, "order": order})
         documents.append(doc)
+    return documents
+
+
+def _indexed_documents(vectorstore: FAISS) -> List[Document]:
+    documents = [vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()]
+    documents = [document for document in documents if isinstance(document, Document)]
+    # Changed sections are appended to the docstore; versions built before "order" was stored keep theirs
+    return sorted(documents, key=lambda document: document.metadata.get("order", len(documents)))
+
+
+def get_shop_documents() -> List[Document]:
+    """Sections of the live index version; the YAML file while no index has been built."""
+    global _documents
+    vectorstore = shop_index.get()
+    version = shop_index.version if vectorstore is not None else None
+    cached = _documents
+    if cached is None or cached[0] != version:
+        with _init_lock:
+            if _documents is None or _documents[0] != version:
+                documents = _indexed_documents(vectorstore) if vectorstore is not None else load_documents()
+                _documents = (version, documents)
+            cached = _documents
+    return cached[1]
+
+
+def section_key(doc: Document) -> str:
+    return doc.metadata["section"]
+
+
+def build_index(force: bool = False):
+    """Publishes a new index version if the sections changed. Only changed sections are re-embedded."""
+    OPENAI_API_KEY = os.getenv("GPT_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not OPENAI_API_KEY:
+        raise ValueError("GPT_API_KEY or OPENAI_API_KEY environment variable must be set")
+
+    # Shared embeddings with a persistent cache: a rebuild from unchanged sections makes no API calls.
+    version, report = build_index_version(shop_index.versions, load_documents(), get_embeddings(), section_key,
+                                          force=force)
+    logger.info("Shop info FAISS index %s: %d sections, %d embedded, %d embeddings saved, %d deleted%s",
+                report.status, report.documents, report.embedded, report.embeddings_saved, report.deleted,
+                f", published version {version}." if version else ".")
+    return version, report
+
+
+def get_vectorstore() -> FAISS:
+    vectorstore = shop_index.get()
+    if vectorstore is None:
+        # First start without any built index
+        with _init_lock:
+            if shop_index.get() is None:
+                build_index(force=True)
+        vectorstore = shop_index.get()
+    return vectorstore
 
-    print("Creating FAISS index for shop information...")
-    try:
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        vectorstore.save_local(INDEX_DIR)
-
-        # Create the index directory if it doesn't exist, and update the hash in the YAML file.
-        os.makedirs(INDEX_DIR, exist_ok=True)
-        hash_data[yaml_key] = current_yaml_hash
-        with open(hash_yaml_path, 'w', encoding='utf-8') as f:
-            yaml.safe_dump(hash_data, f)
-        print("FAISS index created and saved.")
-    except Exception as e:
-        print(f"Error creating FAISS index (API key may be invalid): {e}")
-        # Try to load existing index even if it's outdated
-        if os.path.exists(INDEX_DIR):
-            try:
-                vectorstore = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
-                print("Loaded existing FAISS index from disk (may be outdated).")
-            except Exception as load_error:
-                print(f"Failed to load existing index: {load_error}")
-                raise ValueError(f"Cannot create or load FAISS index. Please check your API key. Error: {e}")
-        else:
-            raise ValueError(f"Cannot create FAISS index and no existing index found. Please check your API key. Error: {e}")
 
 def shop_info() -> str:
     """
     Tool returns all information about the company.
     """
-    results = vectorstore.similarity_search("", k=100)
-    if results:
-        return "\n\n".join([doc.page_content for doc in results])
+    # The tool always returns every section, in the order of the YAML file, so no similarity search is needed
+    documents = get_shop_documents()
+    if documents:
+        return "\n\n".join([doc.page_content for doc in documents])
     else:
-        return "No shop information available."
\ No newline at end of file
+        return "No shop information available."
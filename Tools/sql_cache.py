@@ -0,0 +1,98 @@
+import re
+import threading
+from typing import Any, Dict
+
+from config import SQL_DB_TOOL_QUERY_CACHE_TTL_SECONDS, SQL_DB_TOOL_QUERY_CACHE_MAX_ENTRIES, \
+    SQL_DB_TOOL_RESULT_CACHE_TTL_SECONDS, SQL_DB_TOOL_RESULT_CACHE_MAX_ENTRIES
+from Tools.product_catalog import ProductCatalog, product_catalog
+from Tools.tool_cache import TTLCache
+
+_APOSTROPHES = re.compile("[’ʼ`]")
+_SEPARATORS = re.compile(r"[^\w']+")
+# SQLite functions whose value differs between runs of the same SQL (ORDER BY RANDOM() for recommendations,
+# 'now' in date functions)
+_NON_DETERMINISTIC = re.compile(r"\b(RANDOM|RANDOMBLOB|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|UNIXEPOCH)\b"
+                                r"|'now'", re.IGNORECASE)
+
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and whitespace do not change the SQL: "Які є чаї?" and "які є  чаї" share a key."""
+    question = _APOSTROPHES.sub("'", question.casefold())
+    return _SEPARATORS.sub(" ", question).strip()
+
+
+def is_deterministic(query: str) -> bool:
+    """False when running the same SQL again may return other rows, so its result must not be cached."""
+    return _NON_DETERMINISTIC.search(query) is None
+
+
+class SqlCache:
+    """
+    Two-level cache of sql_db_tool:
+
+    - queries: normalized question -> SQL that answered it (saves the query-writing LLM call);
+    - results: SQL text -> result rows (saves the database round trip); queries using RANDOM() or
+      the current time are not cached, so every user gets their own random recommendation.
+
+    Both levels are keyed by the product catalog generation and cleared when it changes. Result lookups
+    check PRAGMA data_version on every call (microseconds on the catalog's watch connection), so stock and
+    prices are never served from before a committed update. Query lookups only use the catalog's periodic
+    check (every PRODUCT_CATALOG_REFRESH_SECONDS): an SQL text stays valid when the data changes.
+    """
+
+    def __init__(self, catalog: ProductCatalog = product_catalog,
+                 query_ttl: float = SQL_DB_TOOL_QUERY_CACHE_TTL_SECONDS,
+                 query_maxsize: int = SQL_DB_TOOL_QUERY_CACHE_MAX_ENTRIES,
+                 result_ttl: float = SQL_DB_TOOL_RESULT_CACHE_TTL_SECONDS,
+                 result_maxsize: int = SQL_DB_TOOL_RESULT_CACHE_MAX_ENTRIES):
+        self.catalog = catalog
+        self.queries = TTLCache(maxsize=query_maxsize, ttl=query_ttl)
+        self.results = TTLCache(maxsize=result_maxsize, ttl=result_ttl)
+        self.generation = None
+        self.invalidations = 0
+        self._mutex = threading.Lock()
+
+    def _generation(self, force: bool = False) -> int:
+        self.catalog.refresh(force)
+        generation = self.catalog.generation
+        if generation != self.generation:
+            with self._mutex:
+                if generation != self.generation:
+                    if self.generation is not None:
+                        self.invalidations += 1
+                    self.queries.clear()
+                    self.results.clear()
+                    self.generation = generation
+        return generation
+
+    def get_query(self, question: str) -> Any:
+        """Cached SQL for the question or MISS."""
+        return self.queries.get((self._generation(), normalize_question(question)))
+
+    def set_query(self, question: str, query: str, generation: int) -> None:
+        self.queries.set((generation, normalize_question(question)), query)
+
+    def get_result(self, query: str) -> Any:
+        """Cached rows of the query or MISS."""
+        return self.results.get((self._generation(force=True), query))
+
+    def set_result(self, query: str, result: str, generation: int) -> None:
+        if is_deterministic(query):
+            self.results.set((generation, query), result)
+
+    def current_generation(self) -> int:
+        """
+        Generation to store results under. Take it before computing: a result that raced with a catalog
+        update is then filed under the old generation and never served.
+        """
+        return self._generation(force=True)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"generation": self.generation, "invalidations": self.invalidations}
+        for name, cache in (("queries", self.queries), ("results", self.results)):
+            level = cache.stats()
+            lookups = level["hits"] + level["misses"]
+            level["hit_rate"] = round(level["hits"] / lookups, 3) if lookups else None
+            stats[name] = level
+        return stats
+
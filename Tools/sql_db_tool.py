@@ -1,20 +1,66 @@
+import logging
 import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Optional, Union
+
 from dotenv import load_dotenv
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from typing_extensions import Annotated, TypedDict
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
 
 from config import SQL_DB_TOOL_PRODUCT_DB_URI, SQL_DB_TOOL_LLM_MODEL_NAME, SQL_DB_TOOL_LLM_MODEL_TEMPERATURE, \
     SQL_DB_TOOL_TOP_K, \
-    SQL_DB_TOOL_MAX_ATTEMPTS
+    SQL_DB_TOOL_MAX_ATTEMPTS, SQL_DB_TOOL_RETRY_MODE, SQL_DB_TOOL_SPECULATIVE_CANDIDATES, \
+    SQL_DB_TOOL_SPECULATIVE_MERGE, SQL_DB_TOOL_FTS_MODE, SQL_DB_TOOL_VECTOR_MODE, SQL_DB_TOOL_TEMPLATES_ENABLED
+from metrics import SPECULATIVE_WINS
+from Tools.product_search import search_products
+from Tools.query_templates import query_templates
+from Tools.schema_snapshot import SchemaSnapshot
+from Tools.sql_cache import SqlCache
+from Tools.sql_guard import select_list_span, sql_guard, strip_statement
+from Tools.tool_results import PRODUCT_COLUMNS, SqlRows, render_for_llm
+from Tools.tool_cache import MISS
+from Tools.product_vector_index import search_similar_products
 
 load_dotenv()
 
-db = SQLDatabase.from_uri(SQL_DB_TOOL_PRODUCT_DB_URI)
-
-tool_prompt = PromptTemplate.from_template("""
+logger = logging.getLogger(__name__)
+
+# The database and the LLM client are created on first use (or by the startup warm-up), so importing
+# the tool neither reflects the schema nor needs the API key
+_db: Optional[SQLDatabase] = None
+_llm: Optional[ChatOpenAI] = None
+_init_lock = threading.Lock()
+
+
+def get_db() -> SQLDatabase:
+    global _db
+    if _db is None:
+        with _init_lock:
+            if _db is None:
+                # Only StockTable is shown to the LLM; the FTS index and its shadow tables are internal
+                _db = SQLDatabase.from_uri(SQL_DB_TOOL_PRODUCT_DB_URI, include_tables=["StockTable"])
+    return _db
+
+
+def get_llm() -> ChatOpenAI:
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                _llm = ChatOpenAI(model=SQL_DB_TOOL_LLM_MODEL_NAME, temperature=SQL_DB_TOOL_LLM_MODEL_TEMPERATURE,
+                                  openai_api_key=os.getenv("GPT_API_KEY"))
+    return _llm
+
+# Everything before the question is static for a given database version. It is rendered once per schema
+# snapshot and is byte-identical across calls, so the provider-side prompt cache can reuse it.
+tool_prompt_prefix = PromptTemplate.from_template("""
 Given an input question, create a syntactically correct {dialect} query to run to help find the answer. 
 Unless the user specifies in his question a specific number of examples they wish to obtain, always limit your query to at most {top_k} results. 
 Never query for all the columns from a specific table, only ask for the few relevant columns given the question.
@@ -34,15 +80,27 @@ Dont use Category and SubCategory when searching for specific product name.
 Only use the following tables:
 {table_info}
 
-Question: {input}
 """)
 
+# Schema text with value hints, rebuilt only when the database changes
+schema_snapshot = SchemaSnapshot(get_db)
+
+
+@lru_cache(maxsize=4)
+def _render_prompt_prefix(table_info: str) -> str:
+    return tool_prompt_prefix.format(dialect=get_db().dialect, top_k=SQL_DB_TOOL_TOP_K, table_info=table_info)
+
+
+def build_tool_prompt(question: str) -> str:
+    """The SQL-writing prompt: the cached static prefix followed by the question."""
+    return _render_prompt_prefix(schema_snapshot.table_info()) + f"Question: {question}\n"
+
 
 # Define the State object structure
 class State(TypedDict):
     question: str
     query: str
-    result: str
+    result: Union[SqlRows, str]
     answer: str
     history: list
     empty_queries: list
@@ -54,35 +112,58 @@ class QueryOutput(TypedDict):
     query: Annotated[str, ..., "Syntactically valid SQL query."]
 
 
-llm = ChatOpenAI(model=SQL_DB_TOOL_LLM_MODEL_NAME, temperature=SQL_DB_TOOL_LLM_MODEL_TEMPERATURE,
-                 openai_api_key=os.getenv("GPT_API_KEY"))
+# Define the QueryCandidates structure
+class QueryCandidates(TypedDict):
+    """Alternative SQL queries."""
+    queries: Annotated[List[str], ..., "Syntactically valid alternative SQL queries, most promising first."]
+
+
+# Speculative candidates run concurrently on this pool; losers are not waited for
+speculative_executor = ThreadPoolExecutor(max_workers=2 * SQL_DB_TOOL_SPECULATIVE_CANDIDATES,
+                                          thread_name_prefix="sql-speculative")
+
+# Question -> SQL and SQL -> rows, both dropped when the product database changes
+sql_cache = SqlCache()
 
 
 # Function to write the query
 def write_query(state: State):
-    prompt = tool_prompt.invoke(
-        {
-            "dialect": db.dialect,
-            "top_k": SQL_DB_TOOL_TOP_K,
-            "table_info": db.get_table_info(),
-            "input": state["question"],
-            "history": state["history"]
-        }
-    )
-    structured_llm = llm.with_structured_output(QueryOutput)
+    prompt = build_tool_prompt(state["question"])
+    structured_llm = get_llm().with_structured_output(QueryOutput)
     result = structured_llm.invoke(prompt)
 
-    query = result["query"]
-    if "SELECT ProductID" not in query.upper():
-        query = query.replace("SELECT", "SELECT ProductID,", 1)
+    return {"query": ensure_product_id(result["query"])}
 
-    return {"query": query}
+
+def ensure_product_id(query: str) -> str:
+    """The agent needs ProductID for product_lookup_tool, so add it to the selected columns when missing."""
+    query = strip_statement(query)
+    span = select_list_span(query)
+    # WITH queries and statements that are not SELECTs are left for the guard to judge
+    if span is None:
+        return query
+    columns = query[span[0]:span[1]]
+    if re.search(r"\bProductID\b", columns, re.IGNORECASE) or re.search(r"(^|[\s,.])\*(\s*,|\s*$)", columns):
+        return query
+    # An id next to an aggregate without GROUP BY would be an arbitrary row's id
+    if re.search(r"\b(COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(", columns, re.IGNORECASE) \
+            and not re.search(r"\bGROUP\s+BY\b", query, re.IGNORECASE):
+        return query
+    return f"{query[:span[0]]}ProductID, {query[span[0]:]}"
 
 
 # Function to execute the query
 def execute_query(state: State):
-    execute_query_tool = QuerySQLDatabaseTool(db=db)
-    return {"result": execute_query_tool.invoke(state["query"])}
+    result = sql_cache.get_result(state["query"])
+    if result is not MISS:
+        return {"result": result}
+    generation = sql_cache.current_generation()
+    # Read-only, single SELECT, capped rows and time; rejected queries come back as structured errors
+    result = sql_guard.execute(state["query"])
+    # Errors may be transient (e.g. a timeout under load), so only real results are kept
+    if isinstance(result, SqlRows):
+        sql_cache.set_result(state["query"], result, generation)
+    return {"result": result}
 
 
 # Function to generate the answer
@@ -93,48 +174,216 @@ def generate_answer(state: State):
         "and SQL result, answer the user question.\n\n"
         f'Question: {state["question"]}\n'
         f'SQL Query: {state["query"]}\n'
-        f'SQL Result: {state["result"]}\n'
+        f'SQL Result: {render_for_llm(state["result"])}\n'
         f'History: {state["history"]}'
     )
-    response = llm.invoke(prompt)
+    response = get_llm().invoke(prompt)
     return {"answer": response.content}
 
 
 def rephrase_query(state: State) -> str:
+    # A query rejected by the guard comes back as its error, which tells the LLM what to fix
+    outcome = f"failed with {state['result']}" if isinstance(state.get("result"), str) else "returned no results"
     synonyms_prompt = (f"""
 The previous SQL query :
 "{state['query']}" 
-returned no results for the product search based on the question: '{state['question']}'. 
+{outcome} for the product search based on the question: '{state['question']}'. 
 Please provide an alternative syntactically correct SQL query using synonyms, 
 different phrasing of the product name, or try searching in english and in ukrainian.
 """)
 
-    prompt = tool_prompt.invoke(
-        {
-            "dialect": db.dialect,
-            "top_k": SQL_DB_TOOL_TOP_K,
-            "table_info": db.get_table_info(),
-            "input": synonyms_prompt,
-            "history": state["history"]
-        }
-    )
+    prompt = build_tool_prompt(synonyms_prompt)
 
-    response = llm.invoke(prompt)
-    new_query = response.content.strip()
-    if "SELECT PRODUCT_ID" not in new_query.upper():
-        new_query = new_query.replace("SELECT", "SELECT ProductID,", 1)
-    return new_query
+    response = get_llm().invoke(prompt)
+    return ensure_product_id(response.content)
 
 
-def find_data_in_db(question: str, history: list) -> str:
+def rephrase_queries(state: State, count: int) -> List[str]:
+    """Asks for `count` alternative queries in a single structured-output call."""
+    synonyms_prompt = (f"""
+The previous SQL queries :
+{state['empty_queries'] or [state['query']]}
+returned no results for the product search based on the question: '{state['question']}'. 
+Please provide {count} different alternative syntactically correct SQL queries, most promising first. 
+Use synonyms, different phrasing of the product name, broader terms, or search in english and in ukrainian. 
+Every query must differ from the previous ones and from each other.
+""")
+
+    prompt = build_tool_prompt(synonyms_prompt)
+    result = get_llm().with_structured_output(QueryCandidates).invoke(prompt)
+
+    candidates = []
+    for query in result["queries"][:count]:
+        query = ensure_product_id(query)
+        if query not in candidates and query not in state["empty_queries"]:
+            candidates.append(query)
+    return candidates
+
+
+def _is_empty_result(result: Union[SqlRows, str]) -> bool:
+    # The guard returns errors as text; for a retry they are as useless as no rows
+    return not result or isinstance(result, str)
+
+
+def _merge_results(results: List[SqlRows]) -> SqlRows:
+    """Union of the rows of several results with the same columns, in candidate order, without duplicates."""
+    merged = []
+    for result in results:
+        if result.columns == results[0].columns:
+            merged.extend(row for row in result.rows if row not in merged)
+    return SqlRows(results[0].columns, tuple(merged[:SQL_DB_TOOL_TOP_K]))
+
+
+def run_speculative_round(state: State, count: int = SQL_DB_TOOL_SPECULATIVE_CANDIDATES,
+                          merge: bool = SQL_DB_TOOL_SPECULATIVE_MERGE) -> State:
+    """
+    One speculative retry: gets `count` alternative queries from one LLM call and runs them
+    concurrently. Takes the first non-empty result (or, with merge, the union of all non-empty ones)
+    and counts which candidate won in sql_speculative_wins_total{candidate} (for tuning the number of
+    candidates).
+    """
+    candidates = rephrase_queries(state, count)
+    if not candidates:
+        return state
+
+    results = {}
+    futures = {speculative_executor.submit(execute_query, {"query": query}): index
+               for index, query in enumerate(candidates)}
+    for future in as_completed(futures):
+        index = futures[future]
+        results[index] = future.result()["result"]
+        if not merge and not _is_empty_result(results[index]):
+            # Remaining candidates finish in the background; their results are not needed
+            for pending in futures:
+                pending.cancel()
+            break
+
+    winners = sorted(index for index, result in results.items() if not _is_empty_result(result))
+    state["empty_queries"].extend(candidates[index] for index in results if index not in winners)
+
+    if not winners:
+        SPECULATIVE_WINS.labels("none").inc()
+        logger.info("Speculative SQL: none of %d candidates returned rows", len(candidates))
+        return state
+
+    winner = winners[0] if merge else next(index for index in results if index in winners)
+    SPECULATIVE_WINS.labels(str(winner + 1)).inc()
+    logger.info("Speculative SQL: candidate %d of %d won", winner + 1, len(candidates))
+    state["query"] = candidates[winner]
+    state["result"] = _merge_results([results[index] for index in winners]) if merge else results[winner]
+    return state
+
+
+def run_template(state: State) -> bool:
+    """Runs the SQL of a learned template matching the question. True when it found rows."""
+    started = time.perf_counter()
+    match = query_templates.match(state["question"])
+    if match is None:
+        return False
+    state["query"] = match.sql
+    state.update(execute_query(state))
+    found = not _is_empty_result(state["result"])
+    query_templates.count("hit" if found else "fallback", match, time.perf_counter() - started)
+    if not found:
+        # The LLM writes the query as usual and must not suggest this one again
+        state["empty_queries"].append(match.sql)
+        state["result"] = SqlRows(PRODUCT_COLUMNS, ())
+    return found
+
+
+# Shown to the agent with search rows that may not meet the question's conditions
+APPROXIMATE_NOTE = ("Approximate matches. No product was found that meets every condition of the question "
+                    "(name, price, quantity); these are the closest products. Say so instead of presenting "
+                    "them as exact matches.")
+
+
+def _has_conditions(question: str) -> bool:
+    # Numbers in a product question are prices, sizes or quantities, which text and vector search ignore
+    return any(char.isdigit() for char in question)
+
+
+def full_text_search(question: str) -> SqlRows:
+    """
+    Ranked FTS5 search over product titles and categories; no LLM call involved. Products matching
+    every word come first; if there are none, any word matches and the rows are marked approximate.
+    """
+    try:
+        rows = search_products(question, match_all=True)
+        exact = bool(rows)
+        if not rows:
+            rows = search_products(question)
+    except sqlite3.Error as e:
+        logger.warning("Full-text product search failed: %s", e)
+        rows, exact = [], False
+    note = "" if not rows or (exact and not _has_conditions(question)) else APPROXIMATE_NOTE
+    return SqlRows(PRODUCT_COLUMNS, tuple(rows), note)
+
+
+def vector_search(question: str) -> SqlRows:
+    """Semantic search in the offline product vector index; catches synonyms that text search misses."""
+    try:
+        rows = search_similar_products(question)
+    except Exception as e:
+        logger.warning("Product vector search failed: %s", e)
+        rows = []
+    note = APPROXIMATE_NOTE if rows and _has_conditions(question) else ""
+    return SqlRows(PRODUCT_COLUMNS, tuple(rows), note)
+
+
+def find_data_in_db(question: str, history: list) -> Union[SqlRows, str]:
+    """Product rows answering the question, or an error message for the agent."""
     try:
+        # Approximate search rows are only returned when no SQL query, including the retries, finds rows
+        approximate = None
+        if SQL_DB_TOOL_FTS_MODE == "first":
+            result = full_text_search(question)
+            if result and not result.note:
+                return result
+            approximate = approximate or result or None
+        if SQL_DB_TOOL_VECTOR_MODE == "first":
+            result = vector_search(question)
+            if result and not result.note:
+                return result
+            approximate = approximate or result or None
+
         state = {"question": question, "history": history, "empty_queries": []}
-        state.update(write_query(state))
-        state.update(execute_query(state))
+        started = time.perf_counter()
+        generation = sql_cache.current_generation()
+        cached_query = sql_cache.get_query(question)
+        source = "llm"
+        if cached_query is not MISS:
+            state["query"], source = cached_query, "cache"
+            state.update(execute_query(state))
+        elif SQL_DB_TOOL_TEMPLATES_ENABLED and run_template(state):
+            source = "template"
+        else:
+            state.update(write_query(state))
+            state.update(execute_query(state))
+        answered_by_sql = not _is_empty_result(state["result"])
+
+        # A query the guard rejected (timeout, not allowed, unknown column) gets the same fallbacks and
+        # retries as one that found nothing
+        if _is_empty_result(state["result"]) and SQL_DB_TOOL_FTS_MODE == "fallback":
+            # Cheap full-text search before paying for LLM rephrasing rounds
+            result = full_text_search(question)
+            if result and not result.note:
+                state["result"] = result
+            approximate = approximate or result or None
+        if _is_empty_result(state["result"]) and SQL_DB_TOOL_VECTOR_MODE == "fallback":
+            result = vector_search(question)
+            if result and not result.note:
+                state["result"] = result
+            approximate = approximate or result or None
 
         # Retry generating and executing alternative SQL queries until a non-empty result is obtained or the maximum attempts are reached.
         attempt = 0
-        while (not state["result"] or state["result"] == "") and attempt < SQL_DB_TOOL_MAX_ATTEMPTS:
+        if SQL_DB_TOOL_RETRY_MODE == "speculative" and _is_empty_result(state["result"]):
+            # Each attempt asks for several alternatives at once and runs them concurrently
+            state["empty_queries"].append(state["query"])
+            while _is_empty_result(state["result"]) and attempt < SQL_DB_TOOL_MAX_ATTEMPTS:
+                state = run_speculative_round(state)
+                attempt += 1
+        while _is_empty_result(state["result"]) and attempt < SQL_DB_TOOL_MAX_ATTEMPTS:
             new_query = rephrase_query(state)
             if new_query in state["empty_queries"]:
                 attempt += 1
@@ -144,6 +393,18 @@ def find_data_in_db(question: str, history: list) -> str:
             state.update(execute_query(state))
             attempt += 1
 
+        # Remember the query that found the rows (a retry result always comes from SQL), so the same
+        # question skips both the query-writing call and the retries
+        if (answered_by_sql or attempt) and not _is_empty_result(state["result"]):
+            sql_cache.set_query(question, state["query"], generation)
+            if source != "cache":
+                # Successful runs are logged for the template library and its offline evaluation
+                query_templates.record(question, state["query"], len(state["result"]), source,
+                                       (source == "llm") + attempt, time.perf_counter() - started)
+
+        if _is_empty_result(state["result"]) and approximate is not None:
+            return approximate
+
         # Optionally, generate an answer:
         # state.update(generate_answer(state))
         return state["result"]
@@ -0,0 +1,173 @@
+import json
+import re
+import sqlite3
+import time
+from typing import Callable, Iterable, Optional, Set, Tuple, Union
+
+from langchain_community.utilities.sql_database import truncate_word
+
+from config import PRODUCT_DB_PATH, SQL_DB_TOOL_ALLOWED_TABLES, SQL_DB_TOOL_QUERY_TIMEOUT_SECONDS, \
+    SQL_DB_TOOL_MAX_ROWS
+from metrics import span
+from Tools.db_pool import ConnectionPool
+from Tools.tool_results import SqlRows
+
+# Read-only actions a SELECT needs; everything else (writes, PRAGMA, ATTACH, transactions) is denied
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                    getattr(sqlite3, "SQLITE_RECURSIVE", 33)}
+_LEADING_COMMENTS = re.compile(r"^(\s+|--[^\n]*(\n|$)|/\*.*?\*/)*", re.DOTALL)
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+# Names defined by a WITH clause: "WITH [RECURSIVE] name[(columns)] AS (" and ", name AS (" after it
+_CTE_NAME = re.compile(r"(?:\bWITH\s+(?:RECURSIVE\s+)?|,\s*)(\"[^\"]+\"|\[[^\]]+\]|`[^`]+`|\w+)\s*(?:\([^)]*\))?"
+                       r"\s*AS\s*(?:NOT\s+)?(?:MATERIALIZED\s+)?\(", re.IGNORECASE)
+# Number of sqlite VM instructions between two checks of the time budget
+_PROGRESS_STEPS = 10_000
+# Same cut-off for long values as SQLDatabase.run
+_MAX_STRING_LENGTH = 300
+
+
+class SqlGuardError(Exception):
+    """
+    A statement that was rejected or aborted. `code` says what happened and `hint` what to change, so
+    the agent (or the retry loop) can write a better query instead of failing the whole answer.
+    """
+
+    def __init__(self, code: str, message: str, hint: str = ""):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.hint = hint
+
+    def to_result(self) -> str:
+        # The "Error:" prefix is what the retry logic of sql_db_tool looks for
+        return "Error: " + json.dumps({"code": self.code, "message": self.message, "hint": self.hint},
+                                      ensure_ascii=False)
+
+
+def strip_statement(sql: str) -> str:
+    """The statement without leading comments, surrounding whitespace and trailing semicolons."""
+    return _LEADING_COMMENTS.sub("", sql).strip().rstrip(";").strip()
+
+
+def cte_names(sql: str) -> Set[str]:
+    """Lower-case names of the common table expressions a statement defines."""
+    return {match.group(1).strip('"[]`').lower() for match in _CTE_NAME.finditer(sql)}
+
+
+def select_list_span(sql: str) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of the column list of a statement starting with SELECT, i.e. the text between
+    SELECT [DISTINCT] and the top-level FROM; None for other statements or when there is no FROM.
+    """
+    head = re.match(r"\s*SELECT\s+(DISTINCT\s+|ALL\s+)?", sql, re.IGNORECASE)
+    if head is None:
+        return None
+    depth, quote, i = 0, None, head.end()
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`[":
+            quote = "]" if char == "[" else char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and sql[i:i + 4].upper() == "FROM" and not (sql[i - 1].isalnum() or sql[i - 1] == "_") \
+                and not (sql[i + 4:i + 5].isalnum() or sql[i + 4:i + 5] == "_"):
+            return head.end(), i
+        i += 1
+    return None
+
+
+class SqlGuard:
+    """
+    Executes LLM-written SQL without trusting it.
+
+    - The statement must be a single SELECT (or WITH ... SELECT) over the allowed tables. A sqlite
+      authorizer checks this while the statement is compiled, so no parser of our own has to be right.
+      Reads of the statement's own CTEs (including recursive ones) are allowed: their rows can only
+      come from the allowed tables. A CTE named like a table of the database does not unlock that table.
+    - Connections are opened with mode=ro and PRAGMA query_only, so even an authorizer gap cannot write.
+    - A statement without LIMIT gets one, and at most `max_rows` rows are fetched.
+    - A progress handler aborts the statement once it ran longer than `timeout` seconds, so a runaway
+      scan or cross join cannot stall a worker thread.
+    """
+
+    def __init__(self, db_path: str = PRODUCT_DB_PATH, allowed_tables: Iterable[str] = SQL_DB_TOOL_ALLOWED_TABLES,
+                 timeout: float = SQL_DB_TOOL_QUERY_TIMEOUT_SECONDS, max_rows: int = SQL_DB_TOOL_MAX_ROWS):
+        self.pool = ConnectionPool(db_path)
+        self.allowed_tables = {table.lower() for table in allowed_tables}
+        self.timeout = timeout
+        self.max_rows = max_rows
+
+    def _authorizer(self, statement: str, schema_names: Set[str]) -> Callable[..., int]:
+        ctes = {name for name in cte_names(statement) if name not in schema_names and not name.startswith("sqlite_")}
+        readable = self.allowed_tables | ctes if self.allowed_tables else set()
+
+        def authorize(action, arg1, arg2, db_name, trigger) -> int:
+            if action not in _ALLOWED_ACTIONS:
+                return sqlite3.SQLITE_DENY
+            if action == sqlite3.SQLITE_READ and readable and arg1 and arg1.lower() not in readable:
+                return sqlite3.SQLITE_DENY
+            return sqlite3.SQLITE_OK
+        return authorize
+
+    def prepare(self, sql: str) -> str:
+        """The statement to run: validated and with a LIMIT. Raises SqlGuardError."""
+        statement = strip_statement(sql)
+        if not statement:
+            raise SqlGuardError("empty", "The query is empty.", "Write one SELECT statement.")
+        if not re.match(r"(SELECT|WITH)\b", statement, re.IGNORECASE):
+            raise SqlGuardError("not_select", "Only SELECT queries are allowed.",
+                                "Write one SELECT statement that reads StockTable.")
+        # A ";" that ends a complete statement (not one inside a string or a comment) starts another one
+        if any(sqlite3.complete_statement(statement[:i + 1]) for i, char in enumerate(statement) if char == ";"):
+            raise SqlGuardError("multiple_statements", "Only one statement can be executed at a time.",
+                                "Send exactly one SELECT statement.")
+        if not _LIMIT.search(statement):
+            statement = f"SELECT * FROM (\n{statement}\n) LIMIT {self.max_rows}"
+        return statement
+
+    def run(self, sql: str) -> SqlRows:
+        """Rows of the query, at most `max_rows`. Raises SqlGuardError."""
+        statement = self.prepare(sql)
+        with span("db", "sql_guard"), self.pool.connection() as conn:
+            conn.execute("PRAGMA query_only = ON")
+            deadline = time.monotonic() + self.timeout
+            schema_names = {name.lower() for name, in conn.execute("SELECT name FROM sqlite_master")}
+            conn.set_authorizer(self._authorizer(statement, schema_names))
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, _PROGRESS_STEPS)
+            try:
+                cursor = conn.execute(statement)
+                rows = cursor.fetchmany(self.max_rows)
+                return SqlRows(tuple(column[0] for column in cursor.description),
+                               tuple(tuple(truncate_word(value, length=_MAX_STRING_LENGTH) for value in row)
+                                     for row in rows))
+            except sqlite3.DatabaseError as e:
+                if str(e) == "interrupted":
+                    raise SqlGuardError("timeout", f"The query ran longer than {self.timeout:g} s and was stopped.",
+                                        "Filter with a narrower WHERE clause, avoid joins and subqueries, "
+                                        "and add a LIMIT.") from e
+                # Denied by the authorizer, e.g. load_extension(): "not authorized" or "access to
+                # <table>.<column> is prohibited". Checked first, since these come as OperationalError too
+                if "not authorized" in str(e) or "prohibited" in str(e):
+                    raise SqlGuardError("not_allowed", "The query uses a table or an operation that is not allowed.",
+                                        "Only read StockTable with a SELECT statement.") from e
+                if isinstance(e, sqlite3.OperationalError):
+                    raise SqlGuardError("invalid_sql", str(e), "Fix the SQL syntax or the column names.") from e
+                raise SqlGuardError("database_error", str(e)) from e
+            finally:
+                conn.set_progress_handler(None, _PROGRESS_STEPS)
+                conn.set_authorizer(None)
+
+    def execute(self, sql: str) -> Union[SqlRows, str]:
+        """Rows of the query (falsy when there are none) or a structured error as text."""
+        try:
+            return self.run(sql)
+        except SqlGuardError as e:
+            return e.to_result()
+
+
+sql_guard = SqlGuard()
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable
+
+from config import TOOL_CACHE_SHARED_TOOLS, TOOL_CACHE_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES, \
+    TOOL_CACHE_IGNORED_ARGS
+
+# Marker for "nothing cached", since a tool may legitimately return None or an empty string
+MISS = object()
+
+
+def tool_call_key(tool_name: str, tool_input: Any) -> str:
+    """
+    Canonical key of a tool call: tool name plus its arguments as JSON with sorted keys.
+    Arguments that do not change the result (TOOL_CACHE_IGNORED_ARGS) are left out.
+    """
+    ignored = TOOL_CACHE_IGNORED_ARGS.get(tool_name)
+    if ignored and isinstance(tool_input, dict):
+        tool_input = {name: value for name, value in tool_input.items() if name not in ignored}
+    args = json.dumps(tool_input, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"{tool_name}:{args}"
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._mutex = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        with self._mutex:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._mutex:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._mutex:
+            self._data.clear()
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Removes the entries whose key matches `predicate`; returns how many were removed."""
+        with self._mutex:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._mutex:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class ToolCallCache:
+    """
+    Memoizes tool calls on two levels:
+
+    - per turn: a dict living in the graph state (`tool_memo`), so an identical call within one
+      user message returns the first result instead of running the tool again;
+    - shared: a TTL cache across users, only for side-effect-free tools whose output does not
+      depend on the user (`shared_tools`).
+
+    Hit and miss counters are kept per tool.
+    """
+
+    def __init__(self, shared_tools: Iterable[str] = TOOL_CACHE_SHARED_TOOLS,
+                 ttl: float = TOOL_CACHE_TTL_SECONDS, maxsize: int = TOOL_CACHE_MAX_ENTRIES):
+        self.shared_tools = frozenset(shared_tools)
+        self.shared = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counters: Counter = Counter()
+        self._mutex = threading.Lock()
+
+    def lookup(self, memo: Dict[str, Any], tool_name: str, tool_input: Any) -> Any:
+        """Cached result of the call or MISS."""
+        key = tool_call_key(tool_name, tool_input)
+        result = memo.get(key, MISS)
+        if result is not MISS:
+            self._count(tool_name, "turn_hit")
+            return result
+        if tool_name in self.shared_tools:
+            result = self.shared.get(key)
+            if result is not MISS:
+                memo[key] = result
+                self._count(tool_name, "shared_hit")
+                return result
+        self._count(tool_name, "miss")
+        return MISS
+
+    def store(self, memo: Dict[str, Any], tool_name: str, tool_input: Any, result: Any) -> None:
+        key = tool_call_key(tool_name, tool_input)
+        memo[key] = result
+        if tool_name in self.shared_tools:
+            self.shared.set(key, result)
+
+    def invalidate(self, tool_names: Iterable[str]) -> int:
+        """Drops the shared results of these tools, e.g. after the index they read was swapped."""
+        prefixes = tuple(f"{tool_name}:" for tool_name in tool_names)
+        return self.shared.discard(lambda key: key.startswith(prefixes)) if prefixes else 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Counters per tool: {"sql_db_tool": {"turn_hit": 2, "miss": 5}, ...}."""
+        with self._mutex:
+            stats: Dict[str, Dict[str, int]] = {}
+            for (tool_name, outcome), count in self._counters.items():
+                stats.setdefault(tool_name, {})[outcome] = count
+            return stats
+
+    def _count(self, tool_name: str, outcome: str) -> None:
+        with self._mutex:
+            self._counters[(tool_name, outcome)] += 1
+
+
+tool_call_cache = ToolCallCache()
+
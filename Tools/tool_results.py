@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple, Union
+
+from langchain_core.agents import AgentAction
+from typing_extensions import TypedDict
+
+# Columns of the product rows returned by full-text and vector search
+PRODUCT_COLUMNS = ("ProductID", "ProductTitle", "ProductPrice", "StockProduct")
+
+
+@dataclass(frozen=True)
+class SqlRows:
+    """
+    Rows of a product query with their column names. Empty rows are falsy, like the "" they replace.
+    `note` tells the agent how to read the rows, e.g. that they only approximately match the question.
+    """
+    columns: Tuple[str, ...]
+    rows: Tuple[tuple, ...]
+    note: str = ""
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def to_text(self) -> str:
+        """Compact table for the LLM: a header line and one " | "-separated line per row."""
+        if not self.rows:
+            return "(no rows)"
+        lines = [f"Note: {self.note}"] if self.note else []
+        lines.append(" | ".join(self.columns))
+        lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in self.rows)
+        return "\n".join(lines)
+
+    def to_json(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"columns": list(self.columns), "rows": [list(row) for row in self.rows]}
+        if self.note:
+            data["note"] = self.note
+        return data
+
+
+class ProductItem(TypedDict):
+    """One product card for the frontend, as returned by product_lookup_tool."""
+    id: int
+    row_index: str
+    website_link: str
+    image_link: str
+
+
+# Product cards keyed by ProductID (as a string, the way the frontend has always received them)
+ProductItems = Dict[str, ProductItem]
+
+ToolResult = Union[SqlRows, ProductItems, str]
+
+
+class ToolStep(AgentAction):
+    """
+    An executed tool call. `result` is the tool's typed output, carried through the graph state and
+    serialized only by the HTTP layer; `log` is its text rendering for the main agent's scratchpad.
+    """
+    result: Any = None
+
+
+def render_for_llm(result: ToolResult) -> str:
+    """Text the main agent reads for a tool result."""
+    if isinstance(result, SqlRows):
+        return result.to_text()
+    if isinstance(result, dict):
+        lines = ["id | title | website_link"]
+        lines.extend(f"{item['id']} | {item['row_index']} | {item['website_link']}" for item in result.values())
+        return "\n".join(lines)
+    return str(result)
@@ -1,10 +1,19 @@
-from typing import List
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
 
 from langchain_core.tools import tool
+from config import TOOL_EXECUTOR_MAX_WORKERS
+from metrics import span
+# Registers the swap callbacks that drop cached results of the knowledge indexes
+from Tools import index_builder  # noqa: F401
 from Tools.product_lookup_tool import lookup_products_by_ids
 from Tools.shop_info_tool import shop_info
 from Tools.holiday_info_tool import holiday_info
 from Tools.sql_db_tool import find_data_in_db
+from Tools.tool_results import ProductItems, SqlRows
 
 
 @tool("holiday_info_tool")
@@ -18,7 +27,7 @@ def holiday_info_tool(key: str) -> str:
 
 
 @tool("product_lookup_tool")
-def product_lookup_tool(product_ids: List[str]):
+def product_lookup_tool(product_ids: List[str]) -> ProductItems:
     """
     This tool accepts product IDs and generates a JSON for the frontend with images and product names. The output from this tool is sent directly to the frontend, so it does not return anything.
     """
@@ -34,7 +43,7 @@ def shop_info_tool() -> str:
 
 
 @tool("sql_db_tool")
-def sql_db_tool(question: str, history: list) -> str:
+def sql_db_tool(question: str, history: list) -> Union[SqlRows, str]:
     """Tool for searching the store's database. The database contains the following data about products"""
     return find_data_in_db(question, history)
 
@@ -47,3 +56,22 @@ tool_str_to_func = {
     "holiday_info_tool": holiday_info_tool,
     "product_lookup_tool": product_lookup_tool,
 }
+
+# Bounded pool for the blocking tool bodies (sqlite, FAISS, sync OpenAI clients),
+# so the event loop never runs them and a burst of requests cannot spawn unbounded threads.
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_EXECUTOR_MAX_WORKERS, thread_name_prefix="tool")
+
+
+def invoke_tool(tool_name: str, tool_input: dict):
+    """Runs one tool inside a timing span."""
+    with span("tool", tool_name):
+        return tool_str_to_func[tool_name].invoke(input=tool_input)
+
+
+async def ainvoke_tool(tool_name: str, tool_input: dict):
+    """Async entry point for tools: runs the tool in the bounded executor without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    # copy_context keeps the request's LangChain callbacks (tracing, streaming events) and the request's
+    # metrics context inside the worker thread
+    call = functools.partial(contextvars.copy_context().run, invoke_tool, tool_name, tool_input)
+    return await loop.run_in_executor(tool_executor, call)
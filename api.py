@@ -1,9 +1,57 @@
-from fastapi import FastAPI, BackgroundTasks
+import time
+
+# Import-time instrumentation: everything below is the cost of loading the application code
+_import_started = time.perf_counter()
+
+import json
+import logging
+import os
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, BackgroundTasks, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
-from chat import run_user_query, user_states
+from starlette.concurrency import run_in_threadpool
+from chat import arun_user_query, astream_user_query, session_store
+from config import WARMUP_ON_STARTUP, API_GZIP_MIN_SIZE
+from logging_setup import setup_logging
+from Tools.index_builder import reload_all
+from Tools.query_templates import query_templates
+from Tools.sql_db_tool import sql_cache
+from Tools.tool_cache import tool_call_cache
+from warmup import warmup
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:  # orjson is in requirements.txt, but the standard encoder works too
+    orjson = None
+    DefaultResponse = JSONResponse
+
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+logger.info("Application modules imported in %.3f s", IMPORT_SECONDS)
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No-op when main.py already set it up (e.g. when started with `uvicorn api:app`)
+    setup_logging()
+    # Indexes, the database schema and LLM clients load in the background; the server accepts
+    # connections immediately and /readyz reports when everything is loaded
+    if WARMUP_ON_STARTUP:
+        warmup.start()
+    yield
+
+# Tool results travel through the graph as objects and are serialized once, here
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultResponse)
 
 # Configure allowed origins – add your front-end domain(s) here.
 origins = [
@@ -19,6 +67,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if API_GZIP_MIN_SIZE:
+    # Starlette leaves text/event-stream uncompressed, so streamed tokens are not held back
+    app.add_middleware(GZipMiddleware, minimum_size=API_GZIP_MIN_SIZE)
+
 class ChatRequest(BaseModel):
     user_id: str
     input: str
@@ -28,12 +80,70 @@ class ClearHistoryRequest(BaseModel):
 
 @app.post("/chat")
 async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
-    response_message = run_user_query(request.user_id, request.input)
+    response_message = await arun_user_query(request.user_id, request.input)
     return response_message
 
+def format_sse(event: dict) -> str:
+    """Serialize one chat event as a Server-Sent Events frame."""
+    data = orjson.dumps(event).decode() if orjson else json.dumps(event, ensure_ascii=False)
+    return f"event: {event['event']}\ndata: {data}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    async def event_source():
+        async for event in astream_user_query(request.user_id, request.input):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the client as soon as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/clear_history")
 async def clear_history(request: ClearHistoryRequest, background_tasks: BackgroundTasks):
-    user_id = request.user_id
-    if user_id in user_states:
-        user_states[user_id]["chat_history"] = []
+    session_store.clear_history(request.user_id)
     return {"message": "Chat history cleared."}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: all required components are warmed up. Returns 503 while loading or after a failure."""
+    body = {
+        "ready": warmup.ready,
+        "import_seconds": IMPORT_SECONDS,
+        "warmup_seconds": warmup.seconds,
+        "components": warmup.report(),
+    }
+    return DefaultResponse(body, status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request, graph node, tool, LLM, DB and vector search latencies and LLM tokens."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def require_admin(x_admin_token: str) -> None:
+    if not ADMIN_API_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.post("/admin/reload_indexes")
+async def reload_indexes(x_admin_token: str = Header(default="")):
+    """Swaps the knowledge indexes to their latest published versions without a restart."""
+    require_admin(x_admin_token)
+    # Loading an index reads it from disk; queries keep using the previous version meanwhile
+    return await run_in_threadpool(reload_all)
+
+@app.get("/admin/cache_stats")
+async def cache_stats(x_admin_token: str = Header(default="")):
+    """
+    Hit rates of the tool call cache, of the sql_db_tool question/result cache and of its query templates,
+    and the size, hits and evictions of the chat session store.
+    """
+    require_admin(x_admin_token)
+    return {"tool_calls": tool_call_cache.stats(), "sql": sql_cache.stats(), "sql_templates": query_templates.stats(),
+            "sessions": session_store.stats()}
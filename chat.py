@@ -1,77 +1,154 @@
-import json
-from typing import Dict, Any
+from typing import Any, AsyncIterator, List, Optional
 
-from langchain_core.messages import HumanMessage, AIMessage
-from graph import graph
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
 
-# Глобальний словник для зберігання стану кожного користувача
-user_states = {}
+from config import GRAPH_RECURSION_LIMIT
+from graph import compiled_graph
+from metrics import llm_metrics_handler, register_stats, request_context
+from session_store import Session, SessionStore
 
+# Обмежене сховище сесій: історія кожного користувача, LRU/TTL витіснення та локи
+session_store = SessionStore()
+# session_store_sessions/bytes (gauge), session_store_hits/misses/evicted_*_total (counters) у /metrics
+register_stats("session_store", session_store.stats,
+               counters=("hits", "misses", "evicted_lru", "evicted_ttl", "evicted_memory"))
 
-def get_user_state(user_id: str) -> dict:
+
+def build_graph_state(session: Session, user_input: str) -> dict:
     """
-    Повертає стан для користувача з user_id. Якщо стану немає, ініціалізуємо його.
+    Формує стан графа для одного повідомлення з компактної історії сесії.
     """
-    if user_id not in user_states:
-        user_states[user_id] = {
-            "chat_history": [],
-            "intermediate_steps": [],
-            "input": ""
-        }
-    return user_states[user_id]
+    return {
+        "input": user_input,
+        "chat_history": session.to_messages(),
+        "intermediate_steps": [],
+        "tool_memo": {}
+    }
 
 
 def extract_final_answer(state: dict) -> dict[str, Any]:
     """
     Пошук останньої відповіді final_answer або product_lookup_tool у intermediate_steps.
     """
-    for step in reversed(state.get("intermediate_steps", [])):
+    steps = state.get("intermediate_steps", [])
+    # Словник товарів передається як є; у JSON його перетворює лише api.py
+    items = next((getattr(step, "result", None) or {} for step in reversed(steps)
+                  if step.tool == "product_lookup_tool"), None)
+    for step in reversed(steps):
         if step.tool == "final":
-            return {"response": step.tool_input.get("answer", "No answer found")}
+            response = {"response": step.tool_input.get("answer", "No answer found")}
+            # product_lookup_tool, викликаний разом з іншими інструментами, не завершує граф:
+            # агент ще пише текстову відповідь, а знайдені товари додаються до неї
+            if items is not None:
+                response["items"] = items
+            return response
         if step.tool == "product_lookup_tool":
-            items = step.log or "{}"  # Якщо step.log порожній, повертаємо порожній JSON
-            try:
-                items = json.loads(items)  # Розпарсити JSON
-            except json.JSONDecodeError:
-                items = "No answer found"  # Якщо розпарсити не вдалося
             return {"response": "", "items": items}
 
     return {"response": "I don't have a response for that."}
 
 
-def run_user_query(user_id: str, user_input: str) -> str:
+def graph_config(callbacks: Optional[List[BaseCallbackHandler]] = None) -> RunnableConfig:
     """
-    Обробляє запит користувача з урахуванням його унікального id.
+    Налаштування одного виклику графа: ліміт кроків та callbacks конкретного запиту.
+    Обробник метрик LLM додається завжди й успадковується вкладеними викликами LLM в інструментах.
     """
-    # Отримуємо або ініціалізуємо стан для даного користувача
-    state = get_user_state(user_id)
+    config: RunnableConfig = {"recursion_limit": GRAPH_RECURSION_LIMIT,
+                              "callbacks": [llm_metrics_handler, *(callbacks or [])]}
+    return config
 
-    # Додаємо запит користувача до стану
-    state["input"] = user_input
-
-    # Компіляція та виклик графа з поточним станом
-    compiled_graph = graph.compile()
-    state = compiled_graph.invoke(state)
 
+def _finalize_turn(user_id: str, session: Session, user_input: str, state: dict) -> dict:
+    """
+    Формує відповідь та оновлює історію чату користувача після виконання графа.
+    """
     # Отримуємо відповідь від системи
     response = extract_final_answer(state)
 
-    # Оновлюємо історію чату користувача
-    state["chat_history"].append(HumanMessage(content=user_input))
-    state["chat_history"].append(AIMessage(content=response["response"]))
+    # Оновлюємо історію чату користувача; проміжні кроки графа в сесії не зберігаються
+    session_store.append_turn(user_id, session, user_input, response["response"])
 
-    # Очищаємо "input" та накопичені кроки для наступного запиту
-    state["input"] = ""
-    state["intermediate_steps"] = []
+    return response
 
-    # Зберігаємо оновлений стан користувача
-    user_states[user_id] = state
 
-    return response
+def run_user_query(user_id: str, user_input: str,
+                   callbacks: Optional[List[BaseCallbackHandler]] = None) -> str:
+    """
+    Обробляє запит користувача з урахуванням його унікального id.
+    """
+    with request_context(user_id, "console"):
+        # Отримуємо або ініціалізуємо сесію та формуємо стан для даного користувача
+        session = session_store.get(user_id)
+        state = build_graph_state(session, user_input)
+
+        # Виклик скомпільованого графа з поточним станом
+        state = compiled_graph.invoke(state, config=graph_config(callbacks))
+
+        return _finalize_turn(user_id, session, user_input, state)
+
+
+async def arun_user_query(user_id: str, user_input: str,
+                          callbacks: Optional[List[BaseCallbackHandler]] = None) -> dict:
+    """
+    Асинхронна версія run_user_query для FastAPI: граф виконується через ainvoke,
+    а запити одного користувача серіалізуються його локом.
+    """
+    session = session_store.get(user_id)
+    # Час очікування на лок сесії теж входить у час відповіді
+    with request_context(user_id, "chat"):
+        async with session.lock:
+            state = build_graph_state(session, user_input)
+
+            state = await compiled_graph.ainvoke(state, config=graph_config(callbacks))
+
+            return _finalize_turn(user_id, session, user_input, state)
+
+
+# Інструменти, для яких у стрімі надсилаються події tool_start / tool_end
+TOOL_NODES = ("holiday_info_tool", "product_lookup_tool", "shop_info_tool", "sql_db_tool")
+
+
+async def astream_user_query(user_id: str, user_input: str,
+                             callbacks: Optional[List[BaseCallbackHandler]] = None) -> AsyncIterator[dict]:
+    """
+    Стрімінгова версія arun_user_query: повертає події прогресу графа (tool_start / tool_end),
+    токени фінальної відповіді основного агента (token) і підсумкову відповідь (done).
+    """
+    session = session_store.get(user_id)
+    with request_context(user_id, "stream"):
+        async with session.lock:
+            state = build_graph_state(session, user_input)
+
+            final_state = state
+            async for event in compiled_graph.astream_events(state, config=graph_config(callbacks), version="v2"):
+                kind = event["event"]
+                name = event["name"]
+                # Події інструментів (а не вузлів), бо один вузол може виконати кілька інструментів паралельно
+                if kind == "on_tool_start" and name in TOOL_NODES:
+                    yield {"event": "tool_start", "tool": name}
+                elif kind == "on_tool_end" and name in TOOL_NODES:
+                    yield {"event": "tool_end", "tool": name}
+                elif kind == "on_chat_model_stream":
+                    # Стрімимо лише токени основного агента, а не внутрішніх LLM інструментів
+                    if event["metadata"].get("langgraph_node") != "main_agent":
+                        continue
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield {"event": "token", "content": content}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # Подія завершення самого графа містить фінальний стан
+                    final_state = event["data"]["output"]
+
+            response = _finalize_turn(user_id, session, user_input, final_state)
+            yield {"event": "done", **response}
 
 
 # Для тестування з консолі
 if __name__ == "__main__":
+    from logging_setup import setup_logging
+
+    setup_logging()
     test_user_id = "test_user"
     print("Ласкаво просимо до чату. Напишіть ваше повідомлення.")
     while True:
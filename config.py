@@ -1,10 +1,153 @@
+import os
+
+# Корінь репозиторію: шляхи до даних не залежать від робочого каталогу процесу
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # LLM settings
 BASE_LLM_MODEL_NAME = 'gpt-4o'
 TEMPERATURE = 0.3
 
+# Product database
+PRODUCT_DB_PATH = os.path.join(BASE_DIR, "Data", "database.db")
+# Кількість read-only з'єднань з базою товарів у пулі
+PRODUCT_DB_POOL_SIZE = 4
+
+# Product catalog settings (поля товарів для product_lookup_tool)
+# True - каталог завантажується в пам'ять, False - кожен запит читає товари з бази через пул з'єднань
+PRODUCT_CATALOG_IN_MEMORY = True
+# Як часто (секунди) перевіряти PRAGMA data_version і перечитувати каталог, якщо база змінилась
+PRODUCT_CATALOG_REFRESH_SECONDS = 5
+
+# Product vector index settings (будується офлайн: python -m Tools.product_vector_index build)
+PRODUCT_VECTOR_INDEX_DIR = os.path.join(BASE_DIR, "Data", "faiss_products_index")
+# "openai[:model]" або "hashing[-dim]" (детермінований локальний ембедер для тестів і бенчмарків)
+PRODUCT_VECTOR_EMBEDDER = "openai"
+PRODUCT_VECTOR_HASHING_DIM = 256
+# "hnsw" або "ivf"
+PRODUCT_VECTOR_INDEX_TYPE = "hnsw"
+PRODUCT_VECTOR_HNSW_M = 32
+PRODUCT_VECTOR_HNSW_EF_SEARCH = 64
+PRODUCT_VECTOR_IVF_NPROBE = 16
+# Мінімальна косинусна схожість, щоб товар вважався знайденим
+PRODUCT_VECTOR_MIN_SCORE = 0.35
+
+# Embedding cache settings (спільний для всіх FAISS-інструментів кеш ембедингів на диску)
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "Data", "embedding_cache")
+# Максимальна кількість векторів однієї моделі в кеші (LRU витіснення)
+EMBEDDING_CACHE_MAX_ENTRIES = 50000
+
+# Knowledge index settings (версійовані індекси, збираються командою python -m Tools.index_builder)
+# Як часто (секунди) перевіряти, чи з'явилась нова версія індексу, щоб підхопити її без перезапуску
+INDEX_RELOAD_CHECK_SECONDS = 10
+# Кількість версій кожного індексу, що зберігаються на диску (разом з поточною)
+INDEX_KEEP_VERSIONS = 3
+
 #SQL DB Tool settings
-SQL_DB_TOOL_PRODUCT_DB_URI = "sqlite:///Data/database.db"
+SQL_DB_TOOL_PRODUCT_DB_URI = f"sqlite:///{PRODUCT_DB_PATH}"
 SQL_DB_TOOL_LLM_MODEL_NAME = "gpt-4o"
 SQL_DB_TOOL_LLM_MODEL_TEMPERATURE = 0.5
 SQL_DB_TOOL_TOP_K = 10
-SQL_DB_TOOL_MAX_ATTEMPTS = 3
\ No newline at end of file
+SQL_DB_TOOL_MAX_ATTEMPTS = 3
+# "speculative" - кожна повторна спроба просить у LLM кілька альтернативних запитів і виконує їх паралельно,
+# "sequential" - по одному переформульованому запиту за спробу
+SQL_DB_TOOL_RETRY_MODE = "speculative"
+# Кількість альтернативних запитів (K) в одній спекулятивній спробі
+SQL_DB_TOOL_SPECULATIVE_CANDIDATES = 3
+# False - повертаємо перший непорожній результат, True - об'єднуємо рядки всіх непорожніх результатів
+SQL_DB_TOOL_SPECULATIVE_MERGE = False
+# Повнотекстовий пошук товарів (FTS5): "first" - до генерації SQL, "fallback" - коли SQL від LLM
+# нічого не знайшов (перед переформулюванням), "off" - не використовувати
+SQL_DB_TOOL_FTS_MODE = "fallback"
+# Семантичний пошук за векторним індексом товарів (якщо індекс побудовано): "first", "fallback" або "off"
+SQL_DB_TOOL_VECTOR_MODE = "fallback"
+# Додавати до схеми в промпті також список підкатегорій (категорії, ціни й залишки додаються завжди)
+SQL_DB_TOOL_SUBCATEGORY_HINTS = False
+# Кеш "питання -> SQL" та "SQL -> рядки результату": час життя (секунди) і максимальна кількість записів.
+# Обидва рівні очищуються при кожній зміні бази товарів, тож залишки й ціни не застарівають
+SQL_DB_TOOL_QUERY_CACHE_TTL_SECONDS = 60 * 60
+SQL_DB_TOOL_QUERY_CACHE_MAX_ENTRIES = 2048
+SQL_DB_TOOL_RESULT_CACHE_TTL_SECONDS = 10 * 60
+SQL_DB_TOOL_RESULT_CACHE_MAX_ENTRIES = 1024
+# Бібліотека шаблонів запитів: SQL, що вже знайшов товари, повторно використовується для схожих питань
+# з іншою назвою товару (без виклику LLM). Мінімальна схожість форми питання (0..1) та журнал успішних запитів
+SQL_DB_TOOL_TEMPLATES_ENABLED = True
+SQL_DB_TOOL_TEMPLATE_MIN_SIMILARITY = 0.9
+SQL_QUERY_LOG_PATH = os.path.join(BASE_DIR, "Data", "sql_query_log.jsonl")
+# Коли журнал перевищує цей розмір (записів), він стискається: лишаються записи, з яких вивчено шаблони,
+# та найновіші записи до половини ліміту
+SQL_QUERY_LOG_MAX_ENTRIES = 10000
+# Виконання SQL від LLM: лише SELECT з дозволених таблиць, з'єднання тільки для читання,
+# ліміт часу на запит (секунди) та максимальна кількість рядків результату (LIMIT додається, якщо його немає)
+SQL_DB_TOOL_ALLOWED_TABLES = ("StockTable",)
+SQL_DB_TOOL_QUERY_TIMEOUT_SECONDS = 2
+SQL_DB_TOOL_MAX_ROWS = 50
+
+# Graph settings
+# Максимальна кількість кроків графа (main_agent + інструменти) на одне повідомлення
+GRAPH_RECURSION_LIMIT = 25
+
+# Session store settings
+# Максимальна кількість сесій користувачів у пам'яті (LRU витіснення)
+SESSION_STORE_MAX_SESSIONS = 10000
+# Сесія без активності довше за цей час (секунди) видаляється
+SESSION_STORE_IDLE_TTL_SECONDS = 60 * 60
+# Ліміт приблизного обсягу пам'яті всіх історій чату (байти)
+SESSION_STORE_MAX_BYTES = 256 * 1024 * 1024
+
+# Chat history settings
+# Бюджет токенів для історії чату в промпті основного агента (разом з підсумком старих повідомлень)
+CHAT_HISTORY_MAX_TOKENS = 3000
+# Кількість останніх обмінів (користувач + асистент), які передаються дослівно
+CHAT_HISTORY_KEEP_TURNS = 6
+# Максимальна довжина підсумку старих повідомлень
+CHAT_HISTORY_SUMMARY_MAX_TOKENS = 400
+CHAT_HISTORY_SUMMARY_LLM_MODEL_NAME = "gpt-4o-mini"
+# Кількість підсумків, що зберігаються в кеші
+CHAT_HISTORY_SUMMARY_CACHE_SIZE = 2048
+
+# Scratchpad settings
+# Максимальна кількість токенів результату одного інструмента в scratchpad
+SCRATCHPAD_STEP_MAX_TOKENS = 1500
+# Кількість відрендерених кроків, що зберігаються в кеші
+SCRATCHPAD_CACHE_SIZE = 1024
+
+# Tool cache settings
+# Інструменти без побічних ефектів, результати яких кешуються спільно для всіх користувачів
+TOOL_CACHE_SHARED_TOOLS = ("shop_info_tool", "holiday_info_tool")
+# Час життя запису спільного кешу (секунди) та максимальна кількість записів
+TOOL_CACHE_TTL_SECONDS = 10 * 60
+TOOL_CACHE_MAX_ENTRIES = 1024
+# Аргументи, що не впливають на результат інструмента і не входять у ключ кешу
+TOOL_CACHE_IGNORED_ARGS = {"sql_db_tool": ("history",)}
+
+# Async execution settings
+# Максимальна кількість потоків для блокуючих викликів інструментів (sqlite, FAISS, sync LLM)
+TOOL_EXECUTOR_MAX_WORKERS = 8
+# Максимальна кількість інструментів однієї відповіді LLM, що виконуються одночасно в межах запиту
+TOOL_CALLS_MAX_CONCURRENCY = 4
+
+# Startup settings
+# Прогрівати ліниві ресурси (індекси, схему бази, LLM-клієнти) у фоні одразу після старту API
+WARMUP_ON_STARTUP = True
+# Кількість ресурсів, що прогріваються паралельно
+WARMUP_MAX_WORKERS = 4
+
+# API settings
+# Стискати (gzip) відповіді API, більші за цей розмір у байтах; 0 - не стискати. SSE-стрім не стискається
+API_GZIP_MIN_SIZE = 1000
+
+# Metrics settings
+# Збирати час вузлів графа, інструментів, LLM, запитів до бази й токени (GET /metrics у форматі Prometheus)
+METRICS_ENABLED = True
+
+# Logging settings
+# Рівень кореневого логера застосунку
+LOG_LEVEL = "INFO"
+# Писати лог JSON-рядками (False - звичайний текст)
+LOG_JSON = True
+# Частка запитів, чиї INFO/DEBUG записи потрапляють у лог; попередження й помилки пишуться завжди
+LOG_SAMPLE_RATE = 1.0
+# Максимальна довжина одного поля запису (результати інструментів, аргументи) у символах
+LOG_MAX_FIELD_CHARS = 2000
+# Розмір черги записів; коли фоновий потік не встигає, нові записи відкидаються, а не гальмують запит
+LOG_QUEUE_SIZE = 10000
@@ -1,18 +1,36 @@
 import gradio as gr
 import random
 import string
-from chat import run_user_query
+from chat import astream_user_query
+from warmup import warmup
 
-def handle_chat(user_input, chat_history, user_id):
+
+def format_response(response):
+    """Текст для чату: відповідь агента та/або назви знайдених товарів від product_lookup_tool."""
+    items = response.get("items")
+    lines = [response["response"]] if response["response"] else []
+    if isinstance(items, dict):
+        lines.extend(item["row_index"] for item in items.values())
+    return "\n".join(lines)
+
+
+async def handle_chat(user_input, chat_history, user_id):
     if not user_id:
         user_id = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
 
-    response = run_user_query(user_id, user_input)
-
     chat_history.append({"role": "user", "content": user_input})
-    chat_history.append({"role": "assistant", "content": response})
+    chat_history.append({"role": "assistant", "content": ""})
+    yield chat_history, "", user_id
 
-    return chat_history, "", user_id
+    # Оновлюємо повідомлення асистента по мірі надходження токенів
+    async for event in astream_user_query(user_id, user_input):
+        if event["event"] == "token":
+            chat_history[-1]["content"] += event["content"]
+        elif event["event"] == "done":
+            chat_history[-1]["content"] = format_response(event)
+        else:
+            continue
+        yield chat_history, "", user_id
 
 
 def launch_gradio_interface():
@@ -50,4 +68,6 @@ def launch_gradio_interface():
             outputs=[chatbot, input_txt, user_id]
         )
 
+    # Завантажуємо індекси та клієнти у фоні, поки запускається інтерфейс
+    warmup.start()
     interface.launch()
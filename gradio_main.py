@@ -1,9 +1,15 @@
 from dotenv import load_dotenv
 from langsmith import utils
+from logging_setup import setup_logging
+
+setup_logging()
 from gradio_interface import launch_gradio_interface
+from Tools.db_migrations import migrate_database
 
 load_dotenv(dotenv_path=".env")
 utils.tracing_is_enabled()
 
 if __name__ == "__main__":
+    # The API migrates the database during its warm-up; the Gradio app has none
+    migrate_database()
     launch_gradio_interface()
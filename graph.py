@@ -1,26 +1,35 @@
-from typing import TypedDict, List
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, List, Dict, Any
 from langgraph.graph import StateGraph, END
 from langchain_core.agents import AgentAction
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 
-from Agent.main_agent import main_agent_pipeline
-from Tools.tools_innit import tool_str_to_func
+from Agent.main_agent import get_main_agent_pipeline
+from Tools.tools_innit import invoke_tool, ainvoke_tool
+from Tools.tool_cache import tool_call_cache, tool_call_key, MISS
+from Tools.tool_results import ToolStep, render_for_llm
+from config import TOOL_CALLS_MAX_CONCURRENCY
+from metrics import traced
+
+logger = logging.getLogger(__name__)
 
 
 class AgentState(TypedDict):
     input: str
     chat_history: List[BaseMessage]
     intermediate_steps: List[AgentAction]
+    # Результати інструментів поточного повідомлення за ключем (інструмент, аргументи)
+    tool_memo: Dict[str, Any]
 
 
-def execute_step(state: AgentState) -> AgentState:
+def _record_agent_output(state: AgentState, out) -> AgentState:
     """
-    Крок виклику LLM (основний агент).
-    Отримуємо від LLM інструкцію, який інструмент викликати (або final_answer).
+    Записуємо відповідь LLM у intermediate_steps: або фінальну відповідь, або всі інструменти до виклику.
     """
-    # Викликаємо пайплайн
-    out = main_agent_pipeline.invoke(state)
-
     # Якщо LLM не вказав жодного інструмента — завершуємо (final)
     if not out.tool_calls:
         answer = out.content
@@ -32,50 +41,135 @@ def execute_step(state: AgentState) -> AgentState:
         state["intermediate_steps"].append(new_action)
         return state
 
-    # Якщо є виклики інструментів - беремо перший
-    call = out.tool_calls[0]
-    tool_name = call["name"]
-    tool_args = call["args"]
+    # Записуємо всі виклики інструментів з відповіді — вони виконаються паралельно за один крок
+    for call in out.tool_calls:
+        new_action = AgentAction(
+            tool=call["name"],
+            tool_input=call["args"],
+            log="TBD"
+        )
+        state["intermediate_steps"].append(new_action)
+
+    return state
+
+
+def execute_step(state: AgentState) -> AgentState:
+    """
+    Крок виклику LLM (основний агент).
+    Отримуємо від LLM інструкцію, який інструмент викликати (або final_answer).
+    """
+    # Викликаємо пайплайн
+    out = get_main_agent_pipeline().invoke(state)
+    return _record_agent_output(state, out)
+
+
+async def aexecute_step(state: AgentState) -> AgentState:
+    """
+    Асинхронна версія execute_step: запит до LLM не блокує event loop.
+    """
+    out = await get_main_agent_pipeline().ainvoke(state)
+    return _record_agent_output(state, out)
+
 
-    new_action = AgentAction(
-        tool=tool_name,
-        tool_input=tool_args,
-        log="TBD"
+def _record_tool_result(state: AgentState, index: int, result) -> AgentState:
+    """
+    Замінюємо крок з log = "TBD" на позиції index на крок з результатом інструмента.
+    Типізований результат зберігається як є, а в log — його компактне текстове подання для LLM.
+    """
+    action = state["intermediate_steps"][index]
+    updated_action = ToolStep(
+        tool=action.tool,
+        tool_input=action.tool_input,
+        log=render_for_llm(result),
+        result=result
     )
-    state["intermediate_steps"].append(new_action)
+    state["intermediate_steps"][index] = updated_action
+
+    # Результат іде в лог окремим полем: форматування та обрізання виконуються у фоновому потоці
+    logger.info("Tool executed: %s", action.tool, extra={"tool": action.tool, "result": updated_action.log})
 
     return state
 
 
+def _plan_pending_calls(state: AgentState):
+    """
+    Збирає всі кроки з log = "TBD". Повертає їхні позиції, вже відомі результати (з кешу)
+    та унікальні виклики, які треба виконати: {ключ: (інструмент, аргументи)}.
+    """
+    memo = state.setdefault("tool_memo", {})
+    pending = [i for i, action in enumerate(state["intermediate_steps"]) if action.log == "TBD"]
+    results, calls = {}, {}
+    for index in pending:
+        action = state["intermediate_steps"][index]
+        logger.info("Executing tool: %s", action.tool, extra={"tool": action.tool, "tool_input": action.tool_input})
+
+        key = tool_call_key(action.tool, action.tool_input)
+        if key in results or key in calls:
+            continue
+        # Повторний виклик з тими самими аргументами повертає збережений результат
+        result = tool_call_cache.lookup(memo, action.tool, action.tool_input)
+        if result is MISS:
+            calls[key] = (action.tool, action.tool_input)
+        else:
+            results[key] = result
+    return pending, results, calls
+
+
+def _record_pending_results(state: AgentState, pending: List[int], results: Dict[str, Any],
+                            calls: Dict[str, tuple]) -> AgentState:
+    memo = state["tool_memo"]
+    for key, (tool_name, tool_input) in calls.items():
+        tool_call_cache.store(memo, tool_name, tool_input, results[key])
+    for index in pending:
+        action = state["intermediate_steps"][index]
+        _record_tool_result(state, index, results[tool_call_key(action.tool, action.tool_input)])
+    return state
+
+
 def execute_tool_step(state: AgentState) -> AgentState:
     """
-    Крок для виклику конкретного інструмента (останній у списку intermediate_steps).
-    Викликаємо реальний тул, логуємо його виконання та результат.
+    Крок для виклику інструментів (усі кроки з log = "TBD" у intermediate_steps).
+    Незалежні виклики виконуються паралельно в пулі потоків, не більше TOOL_CALLS_MAX_CONCURRENCY одночасно.
     """
-    last_action = state["intermediate_steps"][-1]
-    tool_name = last_action.tool
-    tool_input = last_action.tool_input
+    pending, results, calls = _plan_pending_calls(state)
 
-    # Виводимо лог про виклик
-    print(f"Executing tool '{tool_name}' with args: {tool_input}")
+    def run(tool_name, tool_input):
+        # Запускаємо тул (з вимірюванням часу)
+        return invoke_tool(tool_name, tool_input)
 
-    # Запускаємо тул
-    result = tool_str_to_func[tool_name].invoke(input=tool_input)
+    if len(calls) == 1:
+        (key, (tool_name, tool_input)), = calls.items()
+        results[key] = run(tool_name, tool_input)
+    elif calls:
+        with ThreadPoolExecutor(max_workers=min(TOOL_CALLS_MAX_CONCURRENCY, len(calls))) as pool:
+            # copy_context зберігає callbacks LangChain поточного запиту в потоках пулу
+            futures = {
+                key: pool.submit(contextvars.copy_context().run, run, tool_name, tool_input)
+                for key, (tool_name, tool_input) in calls.items()
+            }
+            for key, future in futures.items():
+                results[key] = future.result()
 
-    # Записуємо результат
-    updated_action = AgentAction(
-        tool=tool_name,
-        tool_input=tool_input,
-        log=str(result)
-    )
-    state["intermediate_steps"][-1] = updated_action
+    return _record_pending_results(state, pending, results, calls)
 
-    # Виводимо лог про результат
-    print(f"Tool executed '{tool_name}' result: {result}")
-    # Відокремлюємо рискою
-    print("-" * 200)
 
-    return state
+async def aexecute_tool_step(state: AgentState) -> AgentState:
+    """
+    Асинхронна версія execute_tool_step: блокуючі інструменти (sqlite, FAISS, sync LLM)
+    виконуються одночасно в обмеженому пулі потоків.
+    """
+    pending, results, calls = _plan_pending_calls(state)
+
+    semaphore = asyncio.Semaphore(TOOL_CALLS_MAX_CONCURRENCY)
+
+    async def run(tool_name, tool_input):
+        async with semaphore:
+            return await ainvoke_tool(tool_name, tool_input)
+
+    outputs = await asyncio.gather(*(run(tool_name, tool_input) for tool_name, tool_input in calls.values()))
+    results.update(zip(calls.keys(), outputs))
+
+    return _record_pending_results(state, pending, results, calls)
 
 
 def decide_next_node(state: AgentState) -> str:
@@ -84,6 +178,12 @@ def decide_next_node(state: AgentState) -> str:
     last_tool = state["intermediate_steps"][-1].tool
 
     if last_tool in ["holiday_info_tool", "product_lookup_tool", "shop_info_tool", "sql_db_tool"]:
+        # Вузол виконує всі очікувані виклики; product_lookup_tool завершує граф,
+        # тому обираємо його лише тоді, коли інших інструментів у черзі немає
+        pending = [action.tool for action in state["intermediate_steps"] if action.log == "TBD"]
+        for tool_name in pending:
+            if tool_name != "product_lookup_tool":
+                return tool_name
         return last_tool
 
     if last_tool == "final":
@@ -96,11 +196,17 @@ def decide_next_node(state: AgentState) -> str:
 # ----------------------
 graph = StateGraph(AgentState)
 
-graph.add_node("main_agent", execute_step)
-graph.add_node("holiday_info_tool", execute_tool_step)
-graph.add_node("product_lookup_tool", execute_tool_step)
-graph.add_node("shop_info_tool", execute_tool_step)
-graph.add_node("sql_db_tool", execute_tool_step)
+def traced_node(name: str, func, afunc) -> RunnableLambda:
+    """Вузол графа з sync і async реалізацією; час кожного проходу потрапляє в span_seconds{kind="node"}."""
+    return RunnableLambda(traced("node", name)(func), afunc=traced("node", name)(afunc))
+
+
+# Кожен вузол має sync і async реалізацію: invoke() для консолі, ainvoke() для FastAPI
+graph.add_node("main_agent", traced_node("main_agent", execute_step, aexecute_step))
+graph.add_node("holiday_info_tool", traced_node("holiday_info_tool", execute_tool_step, aexecute_tool_step))
+graph.add_node("product_lookup_tool", traced_node("product_lookup_tool", execute_tool_step, aexecute_tool_step))
+graph.add_node("shop_info_tool", traced_node("shop_info_tool", execute_tool_step, aexecute_tool_step))
+graph.add_node("sql_db_tool", traced_node("sql_db_tool", execute_tool_step, aexecute_tool_step))
 
 graph.set_entry_point("main_agent")
 graph.add_conditional_edges(source="main_agent", path=decide_next_node)
@@ -110,14 +216,16 @@ for node in ["holiday_info_tool", "shop_info_tool", "sql_db_tool"]:
 
 graph.add_edge("product_lookup_tool", END)
 
+# Граф компілюється один раз при імпорті і спільно використовується FastAPI, Gradio та консоллю.
+# Налаштування виклику (recursion_limit, callbacks) передаються в кожен invoke окремо.
+compiled_graph = graph.compile()
+
 if __name__ == "__main__":
     from IPython.display import Image, display
     from langchain_core.runnables.graph import MermaidDrawMethod
 
-    app = graph.compile()
-
     # Get the graph image as a PNG
-    graph_png = app.get_graph().draw_mermaid_png(draw_method=MermaidDrawMethod.API)
+    graph_png = compiled_graph.get_graph().draw_mermaid_png(draw_method=MermaidDrawMethod.API)
 
     # Display the image
     display(Image(graph_png))
@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from config import LOG_LEVEL, LOG_JSON, LOG_SAMPLE_RATE, LOG_MAX_FIELD_CHARS, LOG_QUEUE_SIZE
+from metrics import request_id_var, user_id_var
+
+try:
+    import orjson
+except ImportError:  # orjson is in requirements.txt, but the standard encoder works too
+    orjson = None
+
+# Стандартні атрибути LogRecord; усе інше прийшло через extra={...} і потрапляє в JSON окремими полями
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_init_lock = threading.Lock()
+
+
+def _dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode()
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> Any:
+    """Рядок (або серіалізоване значення), обрізаний до limit символів з приміткою, скільки відкинуто."""
+    text = value if isinstance(value, str) else None
+    if text is None:
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        text = _dumps(value)
+        if len(text) <= limit:
+            return value
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Один JSON-рядок на запис: час, рівень, логер, повідомлення, request_id/user_id запиту та поля з extra.
+    Великі значення (результати інструментів, аргументи) обрізаються до LOG_MAX_FIELD_CHARS.
+    """
+
+    def __init__(self, max_field_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage(), self.max_field_chars),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = truncate(value, self.max_field_chars)
+        if record.exc_info:
+            entry["exception"] = truncate(self.formatException(record.exc_info), self.max_field_chars * 4)
+        return _dumps(entry)
+
+
+class RequestFilter(logging.Filter):
+    """
+    Додає до запису request_id і user_id поточного запиту (у фоновому потоці контексту запиту вже немає)
+    та відбирає частку sample_rate записів рівня нижче WARNING. Рішення приймається за request_id,
+    тож запит або логується повністю, або не логується зовсім; попередження й помилки не відкидаються.
+    """
+
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        record.user_id = user_id_var.get()
+        if self.sample_rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        if request_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(request_id.encode()) % 10_000 < self.sample_rate * 10_000
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler, який ніколи не блокує запит: форматування та запис виконує QueueListener у фоновому
+    потоці, а коли черга переповнена, запис відкидається й рахується в `dropped`.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Черга в тому ж процесі, тож запис не треба серіалізувати: лише фіксуємо текст повідомлення
+        # (аргументи можуть змінитися після повернення з logger.info), а JSON і обрізання - у фоні
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = LOG_LEVEL, sample_rate: float = LOG_SAMPLE_RATE, stream=None) -> QueueListener:
+    """
+    Налаштовує кореневий логер: записи кладуться в чергу (на шляху запиту лише фільтр і put_nowait),
+    а фоновий QueueListener пише їх у stderr у форматі JSON (LOG_JSON) або звичайним текстом.
+    Повторний виклик нічого не змінює; при завершенні процесу черга дописується до кінця.
+    """
+    global _listener
+    if _listener is None:
+        with _init_lock:
+            if _listener is None:
+                output = logging.StreamHandler(stream or sys.stderr)
+                output.setFormatter(JsonFormatter() if LOG_JSON else
+                                    logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+                log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+                handler = NonBlockingQueueHandler(log_queue)
+                handler.addFilter(RequestFilter(sample_rate))
+                root = logging.getLogger()
+                root.setLevel(level)
+                root.addHandler(handler)
+                listener = QueueListener(log_queue, output)
+                listener.start()
+                atexit.register(stop_logging)
+                _listener = listener
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописує записи, що лишилися в черзі, і знімає обробник з кореневого логера."""
+    global _listener
+    with _init_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, NonBlockingQueueHandler) and handler.queue is _listener.queue:
+                root.removeHandler(handler)
+        _listener = None
@@ -1,10 +1,15 @@
 import uvicorn
 from dotenv import load_dotenv
 from langsmith import utils
+from config import LOG_LEVEL
+from logging_setup import setup_logging
+
+# Before the app is imported, so that import-time messages go through the log queue too
+setup_logging()
 from api import app
 
 load_dotenv(dotenv_path=".env")
 utils.tracing_is_enabled()
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level=LOG_LEVEL.lower())
@@ -0,0 +1,196 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Межі гістограм (секунди): від швидких sqlite-запитів до довгих відповідей LLM
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram("chat_request_seconds", "Time to answer one chat message", ["endpoint"],
+                            buckets=_BUCKETS)
+SPAN_SECONDS = Histogram("span_seconds", "Time spent in graph nodes, tools, DB queries and vector searches",
+                         ["kind", "name"], buckets=_BUCKETS)
+LLM_SECONDS = Histogram("llm_call_seconds", "Duration of one LLM call", ["model", "component"], buckets=_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens", "LLM tokens used", ["model", "component", "kind"])
+SPAN_ERRORS = Counter("span_errors", "Spans that ended with an exception", ["kind", "name"])
+# Розмір scratchpad у токенах на кожному проході main_agent
+SCRATCHPAD_TOKENS = Histogram("scratchpad_tokens", "Tokens of the main agent scratchpad per pass",
+                              buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+# Позиція кандидата (1..SQL_DB_TOOL_SPECULATIVE_CANDIDATES), що першим знайшов рядки; "none" — жоден
+SPECULATIVE_WINS = Counter("sql_speculative_wins", "Winning candidate of speculative SQL retry rounds", ["candidate"])
+
+# Кореляція: id запиту та користувача, а також список спанів поточного запиту.
+# copy_context() у графі та пулах потоків переносить їх у потоки інструментів.
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+user_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("user_id", default=None)
+_trace_var: contextvars.ContextVar[Optional[List[Tuple[str, str, float]]]] = contextvars.ContextVar(
+    "trace", default=None)
+
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    """Вимірює ділянку коду: гістограма span_seconds{kind, name} та запис у трасу запиту."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        SPAN_ERRORS.labels(kind, name).inc()
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        SPAN_SECONDS.labels(kind, name).observe(seconds)
+        trace = _trace_var.get()
+        if trace is not None:
+            trace.append((kind, name, seconds))
+
+
+def traced(kind: str, name: str):
+    """Декоратор span() для звичайних і async функцій."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def request_context(user_id: str, endpoint: str) -> Iterator[str]:
+    """
+    Контекст одного повідомлення користувача: новий request_id, траса спанів і підсумок у лозі,
+    де видно, скільки часу пішло на main_agent, інструменти, LLM, sqlite та FAISS.
+    """
+    request_id = uuid.uuid4().hex[:12]
+    tokens = (request_id_var.set(request_id), user_id_var.set(user_id), _trace_var.set([]))
+    started = time.perf_counter()
+    try:
+        yield request_id
+    finally:
+        seconds = time.perf_counter() - started
+        trace = _trace_var.get() or []
+        if METRICS_ENABLED:
+            REQUEST_SECONDS.labels(endpoint).observe(seconds)
+        totals: Dict[str, float] = {}
+        for kind, name, span_seconds in trace:
+            totals[f"{kind}:{name}"] = totals.get(f"{kind}:{name}", 0.0) + span_seconds
+        logger.info("request=%s user=%s endpoint=%s total=%.0fms %s", request_id, user_id, endpoint,
+                    seconds * 1000, " ".join(f"{key}={value * 1000:.0f}ms" for key, value in totals.items()))
+        try:
+            for var, token in zip((request_id_var, user_id_var, _trace_var), tokens):
+                var.reset(token)
+        except ValueError:
+            # Стрім, закритий клієнтом, завершується в іншому контексті; там змінні й так не видно
+            pass
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Час кожного виклику LLM і токени prompt/completion. Передається в callbacks графа й успадковується
+    вкладеними викликами, тому враховує і main_agent, і внутрішні LLM-виклики sql_db_tool.
+    Компонент — вузол графа, в якому зроблено виклик (metadata langgraph_node).
+    """
+
+    # Обробник дешевий, тож викликається одразу, а не в пулі потоків (і бачить контекст запиту)
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[float, str, str]] = {}
+
+    def _start(self, run_id: UUID, serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]],
+               invocation_params: Optional[Dict[str, Any]]) -> None:
+        params = invocation_params or {}
+        model = params.get("model_name") or params.get("model") or ((serialized or {}).get("name") or "unknown")
+        component = (metadata or {}).get("langgraph_node") or "other"
+        self._started[run_id] = (time.perf_counter(), str(model), str(component))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None,
+                            **kwargs) -> None:
+        if METRICS_ENABLED:
+            self._start(run_id, serialized, metadata, invocation_params)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, invocation_params=None, **kwargs) -> None:
+        if METRICS_ENABLED:
+            self._start(run_id, serialized, metadata, invocation_params)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        started_at, model, component = started
+        seconds = time.perf_counter() - started_at
+        LLM_SECONDS.labels(model, component).observe(seconds)
+        trace = _trace_var.get()
+        if trace is not None:
+            trace.append(("llm", component, seconds))
+        prompt_tokens, completion_tokens = _token_usage(response)
+        LLM_TOKENS.labels(model, component, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, component, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            SPAN_ERRORS.labels("llm", started[2]).inc()
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    # Стрімінг і нові моделі повертають usage_metadata у повідомленні
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+llm_metrics_handler = LLMMetricsHandler()
+
+
+class StatsCollector:
+    """
+    Експортує словник stats() компонента (напр. SessionStore) як метрики <prefix>_<ключ>: ключі з
+    `counters` — лічильники, решта — gauge. Значення читаються лише під час запиту /metrics.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], Dict[str, float]], counters: Iterable[str] = ()):
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = frozenset(counters)
+
+    def collect(self):
+        for key, value in self.stats().items():
+            name = f"{self.prefix}_{key}"
+            family = CounterMetricFamily if key in self.counters else GaugeMetricFamily
+            yield family(name, f"{self.prefix} {key}", value=value)
+
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, float]], counters: Iterable[str] = ()) -> None:
+    REGISTRY.register(StatsCollector(prefix, stats, counters))
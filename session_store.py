@@ -0,0 +1,159 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from config import SESSION_STORE_MAX_SESSIONS, SESSION_STORE_IDLE_TTL_SECONDS, SESSION_STORE_MAX_BYTES
+
+# Ролі компактної історії та відповідні класи повідомлень LangChain
+ROLE_TO_MESSAGE = {"user": HumanMessage, "assistant": AIMessage}
+
+# Приблизний розмір порожнього запису (tuple + рядок ролі) без урахування тексту повідомлення
+_ENTRY_OVERHEAD_BYTES = sys.getsizeof(("user", "")) + sys.getsizeof("assistant")
+
+
+def _entry_size(content: str) -> int:
+    return _ENTRY_OVERHEAD_BYTES + sys.getsizeof(content)
+
+
+@dataclass
+class Session:
+    """
+    Сесія одного користувача: історія у вигляді кортежів (role, content) замість об'єктів
+    HumanMessage/AIMessage, час останнього звернення та лок для послідовної обробки повідомлень.
+    """
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    last_access: float = 0.0
+    size_bytes: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def to_messages(self) -> List[BaseMessage]:
+        """Перетворює компактну історію на повідомлення LangChain для графа."""
+        return [ROLE_TO_MESSAGE[role](content=content) for role, content in self.history]
+
+
+class SessionStore:
+    """
+    Обмежене сховище сесій користувачів з LRU та TTL витісненням.
+
+    - max_sessions: максимальна кількість сесій (найдавніше використані витісняються першими);
+    - idle_ttl: сесія, до якої не зверталися idle_ttl секунд, видаляється;
+    - max_bytes: ліміт приблизного обсягу пам'яті всіх історій.
+
+    Сесії, які зараз обробляють повідомлення (лок захоплено), не витісняються. Порядок сесій завжди
+    збігається з порядком last_access: витіснення пропускає зайняті сесії, не переставляючи їх.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_STORE_MAX_SESSIONS,
+                 idle_ttl: float = SESSION_STORE_IDLE_TTL_SECONDS,
+                 max_bytes: int = SESSION_STORE_MAX_BYTES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._mutex = threading.Lock()
+        self._total_bytes = 0
+        self._metrics: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "evicted_memory": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._sessions
+
+    def get(self, user_id: str) -> Session:
+        """
+        Повертає сесію користувача (створює нову, якщо її немає) та позначає її як останню використану.
+        """
+        with self._mutex:
+            now = self._clock()
+            self._evict_expired(now)
+            session = self._sessions.get(user_id)
+            if session is None:
+                self._metrics["misses"] += 1
+                session = Session(last_access=now)
+                self._sessions[user_id] = session
+                self._evict_overflow()
+            else:
+                self._metrics["hits"] += 1
+                session.last_access = now
+                self._sessions.move_to_end(user_id)
+            return session
+
+    def append_turn(self, user_id: str, session: Session, user_input: str, answer: str) -> None:
+        """
+        Додає пару повідомлень (користувач, асистент) до історії сесії, отриманої через get().
+        """
+        with self._mutex:
+            current = self._sessions.get(user_id)
+            if current is not session:
+                # Сесію витіснили або очистили під час обробки повідомлення — повертаємо ту саму сесію
+                # з її історією та локом, щоб наступні повідомлення чекали на той самий лок
+                if current is not None:
+                    self._total_bytes -= current.size_bytes
+                self._sessions[user_id] = session
+                self._total_bytes += session.size_bytes
+            added = _entry_size(user_input) + _entry_size(answer)
+            session.history.append(("user", user_input))
+            session.history.append(("assistant", answer))
+            session.size_bytes += added
+            self._total_bytes += added
+            session.last_access = self._clock()
+            self._sessions.move_to_end(user_id)
+            self._evict_overflow()
+
+    def clear_history(self, user_id: str) -> None:
+        """Очищає історію чату користувача, не видаляючи саму сесію."""
+        with self._mutex:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._total_bytes -= session.size_bytes
+                session.history = []
+                session.size_bytes = 0
+
+    def evict_expired(self) -> None:
+        """Видаляє всі сесії, неактивні довше за idle_ttl."""
+        with self._mutex:
+            self._evict_expired(self._clock())
+
+    def stats(self) -> Dict[str, int]:
+        """Поточний розмір сховища та лічильники звернень і витіснень."""
+        with self._mutex:
+            return {"sessions": len(self._sessions), "bytes": self._total_bytes, **self._metrics}
+
+    def _remove(self, user_id: str, reason: str) -> None:
+        session = self._sessions.pop(user_id)
+        self._total_bytes -= session.size_bytes
+        self._metrics[reason] += 1
+
+    def _evict_expired(self, now: float) -> None:
+        # Сесії впорядковані за часом останнього звернення, тож прострочені завжди на початку;
+        # зайняті сесії пропускаються, а перегляд зупиняється на першій непростроченій
+        for user_id, session in list(self._sessions.items()):
+            if now - session.last_access < self.idle_ttl:
+                break
+            if not session.lock.locked():
+                self._remove(user_id, "evicted_ttl")
+
+    def _evict_overflow(self) -> None:
+        # Від найдавніше використаних до нових, пропускаючи зайняті сесії
+        for user_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and self._total_bytes <= self.max_bytes:
+                break
+            if session.lock.locked():
+                continue
+            reason = "evicted_lru" if len(self._sessions) > self.max_sessions else "evicted_memory"
+            self._remove(user_id, reason)
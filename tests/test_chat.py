@@ -0,0 +1,44 @@
+from langchain_core.messages import AIMessage
+
+import chat
+import graph
+from Tools.tool_results import PRODUCT_COLUMNS, SqlRows
+
+ITEMS = {"95832": {"id": 95832, "row_index": "Плед вовняний", "website_link": "https://example.com/95832",
+                   "image_link": "https://example.com/95832.jpg"}}
+
+
+class ScriptedAgent:
+    """Main agent pipeline that replies with the given messages in turn."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def invoke(self, state):
+        return self.replies.pop(0)
+
+
+def test_product_cards_survive_a_mixed_tool_call(monkeypatch):
+    mixed = AIMessage(content="", tool_calls=[
+        {"name": "sql_db_tool", "args": {"question": "Пледи у наявності"}, "id": "call_1"},
+        {"name": "product_lookup_tool", "args": {"product_ids": ["95832"]}, "id": "call_2"},
+    ])
+    answer = AIMessage(content="Ось пледи, які є у наявності.")
+    results = {"sql_db_tool": SqlRows(PRODUCT_COLUMNS, ((95832, "Плед вовняний", 899.0, 4),)),
+               "product_lookup_tool": ITEMS}
+    invoked = []
+
+    def invoke_tool(tool_name, tool_input):
+        invoked.append(tool_name)
+        return results[tool_name]
+
+    agent = ScriptedAgent(mixed, answer)
+    monkeypatch.setattr(graph, "get_main_agent_pipeline", lambda: agent)
+    monkeypatch.setattr(graph, "invoke_tool", invoke_tool)
+    monkeypatch.setattr(graph.tool_call_cache, "lookup", lambda memo, tool_name, tool_input: graph.MISS)
+
+    state = chat.build_graph_state(chat.Session(), "Покажи пледи, які є у наявності")
+    state = graph.compiled_graph.invoke(state, config=chat.graph_config())
+
+    assert sorted(invoked) == ["product_lookup_tool", "sql_db_tool"]
+    assert chat.extract_final_answer(state) == {"response": "Ось пледи, які є у наявності.", "items": ITEMS}
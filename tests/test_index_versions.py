@@ -0,0 +1,32 @@
+import os
+import threading
+
+from Tools.index_builder import _invalidate_cached_results
+from Tools.index_versions import HotIndex, IndexVersions
+from Tools.tool_cache import MISS, tool_call_cache
+
+
+def publish(versions, name, stamp):
+    os.makedirs(versions.path(name))
+    versions.publish(name)
+    # The background check compares the pointer's mtime; set it, so two quick publishes always differ
+    os.utime(versions.pointer_path, ns=(stamp, stamp))
+
+
+def test_background_swap_drops_cached_results(tmp_path):
+    versions = IndexVersions(str(tmp_path), is_index=os.path.isdir)
+    publish(versions, "v1", stamp=10 ** 18)
+    index = HotIndex("shop", versions, load=os.path.basename, check_interval=0)
+    swapped = threading.Event()
+    index.on_swap(_invalidate_cached_results("shop"))
+    assert index.get() == "v1"
+
+    key = 'shop_info_tool:{"query":"Години роботи"}'
+    tool_call_cache.shared.set(key, "Пн-Пт 9:00-18:00")
+    index.on_swap(lambda version: swapped.set())
+    publish(versions, "v2", stamp=2 * 10 ** 18)
+    index.get()
+
+    assert swapped.wait(5)
+    assert index.get() == "v2"
+    assert tool_call_cache.shared.get(key) is MISS
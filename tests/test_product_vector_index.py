@@ -0,0 +1,28 @@
+import shutil
+import sqlite3
+
+from config import PRODUCT_DB_PATH
+from Tools.product_catalog import ProductCatalog
+from Tools.product_vector_index import HashingEmbedder, ProductVectorIndex, build_product_index
+
+
+def test_stock_bitmap_follows_wal_commits(tmp_path):
+    db_path = str(tmp_path / "database.db")
+    shutil.copyfile(PRODUCT_DB_PATH, db_path)
+    embedder = HashingEmbedder(dim=64)
+    build_product_index(embedder, db_path, str(tmp_path / "index"), "hnsw")
+    catalog = ProductCatalog(db_path, refresh_interval=3600)
+    index = ProductVectorIndex.load(str(tmp_path / "index"), embedder, catalog=catalog)
+    # In WAL mode a commit stays in the -wal file while this connection is open: the database file
+    # itself, and so its mtime, does not change
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA journal_mode=WAL")
+
+    (best, _), *_ = index.search("плед", k=1)
+    writer.execute("UPDATE StockTable SET StockProduct = 0 WHERE ProductID = ?", (best,))
+    writer.commit()
+
+    assert best not in [pid for pid, _ in index.search("плед", k=5)]
+    assert best in [pid for pid, _ in index.search("плед", k=5, in_stock_only=False)]
+    writer.close()
+    catalog.pool.close()
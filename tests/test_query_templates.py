@@ -0,0 +1,25 @@
+from Tools.query_templates import QueryTemplateLibrary, read_log
+
+PRODUCTS = ("рушники", "пледи", "подушки", "ковдри", "свічки", "чашки")
+
+
+def record_llm_query(library, question, term):
+    sql = f"SELECT ProductID, ProductTitle FROM StockTable WHERE ProductTitle LIKE '%{term}%'"
+    library.record(question, sql, rows=3, source="llm", llm_calls=1, seconds=0.5)
+
+
+def test_query_log_is_compacted_without_losing_templates(tmp_path):
+    log_path = str(tmp_path / "sql_query_log.jsonl")
+    library = QueryTemplateLibrary(log_path=log_path, max_entries=8)
+    record_llm_query(library, "які є рушники", "Рушник")
+    # Questions whose SQL does not generalize, e.g. the LIKE term is not a word of the question
+    for product in PRODUCTS * 2:
+        record_llm_query(library, f"щось для дому {product}", "Дім")
+
+    entries = list(read_log(log_path))
+    assert len(entries) <= 8
+    assert entries[-1]["question"] == "щось для дому чашки"
+
+    reloaded = QueryTemplateLibrary(log_path=log_path, max_entries=8)
+    reloaded.load()
+    assert reloaded.match("які є пледи").sql.endswith("LIKE '%Плед%'")
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def store_with(clock, **limits):
+    limits = {"max_sessions": 100, "idle_ttl": 60, "max_bytes": 10 ** 9, **limits}
+    return SessionStore(clock=clock, **limits)
+
+
+def hold(session):
+    """Marks the session as busy with a message, as arun_user_query does with its lock."""
+    asyncio.run(session.lock.acquire())
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = store_with(clock, max_sessions=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+
+    assert "b" not in store and "a" in store and "c" in store
+    assert store.stats()["evicted_lru"] == 1
+
+
+def test_idle_sessions_expire(clock):
+    store = store_with(clock, idle_ttl=60)
+    store.get("a")
+    clock.now = 30
+    store.get("b")
+    clock.now = 70
+    store.evict_expired()
+
+    assert "a" not in store and "b" in store
+    assert store.stats()["evicted_ttl"] == 1
+
+
+def test_byte_budget_evicts_oldest_histories(clock):
+    store = store_with(clock, max_bytes=3000)
+    for user_id in ("a", "b", "c"):
+        clock.now += 1
+        store.append_turn(user_id, store.get(user_id), "x" * 500, "y" * 500)
+
+    assert "a" not in store and "b" in store and "c" in store
+    assert store.stats()["evicted_memory"] == 1
+    assert store.stats()["bytes"] <= 3000
+
+
+def test_locked_sessions_are_skipped_without_reordering(clock):
+    store = store_with(clock, max_sessions=2, idle_ttl=60)
+    busy = store.get("busy")
+    hold(busy)
+    clock.now = 10
+    store.get("idle")
+    clock.now = 20
+    store.get("new")
+
+    # The busy session survives the overflow and keeps its place at the head
+    assert "busy" in store and "idle" not in store
+    assert list(store._sessions) == ["busy", "new"]
+
+    clock.now = 85
+    store.evict_expired()
+    # The expired busy head is skipped, the expired session behind it is still evicted
+    assert "busy" in store and "new" not in store
+
+
+def test_evicted_session_is_reinserted_with_its_lock(clock):
+    store = store_with(clock, idle_ttl=60)
+    session = store.get("a")
+    store.append_turn("a", session, "Привіт", "Вітаю!")
+    clock.now = 100
+    store.evict_expired()
+    assert "a" not in store
+
+    store.append_turn("a", session, "Є пледи?", "Так.")
+
+    assert store.get("a") is session
+    assert [role for role, _ in session.history] == ["user", "assistant", "user", "assistant"]
+    assert store.stats()["bytes"] == session.size_bytes
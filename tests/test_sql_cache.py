@@ -0,0 +1,47 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from config import PRODUCT_DB_PATH
+from Tools import sql_db_tool
+from Tools.product_catalog import ProductCatalog
+from Tools.sql_cache import SqlCache
+from Tools.sql_guard import SqlGuard
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    db_path = str(tmp_path / "database.db")
+    shutil.copyfile(PRODUCT_DB_PATH, db_path)
+    return db_path
+
+
+def test_stock_update_bypasses_the_result_cache(db_copy, monkeypatch):
+    # A long refresh interval: only the per-lookup data_version check can notice the update
+    catalog = ProductCatalog(db_copy, refresh_interval=3600)
+    guard = SqlGuard(db_copy)
+    executed = []
+
+    def counting_execute(sql):
+        executed.append(sql)
+        return guard.execute(sql)
+
+    monkeypatch.setattr(sql_db_tool, "sql_cache", SqlCache(catalog))
+    monkeypatch.setattr(sql_db_tool.sql_guard, "execute", counting_execute)
+    with sqlite3.connect(db_copy) as conn:
+        product_id = conn.execute("SELECT ProductID FROM StockTable LIMIT 1").fetchone()[0]
+    query = f"SELECT ProductID, StockProduct FROM StockTable WHERE ProductID = {product_id}"
+
+    sql_db_tool.execute_query({"query": query})
+    sql_db_tool.execute_query({"query": query})
+    assert len(executed) == 1
+
+    with sqlite3.connect(db_copy) as conn:
+        conn.execute("UPDATE StockTable SET StockProduct = 12345 WHERE ProductID = ?", (product_id,))
+    result = sql_db_tool.execute_query({"query": query})["result"]
+
+    assert len(executed) == 2
+    assert result.rows == ((product_id, 12345),)
+    guard.pool.close()
+    catalog.pool.close()
@@ -0,0 +1,88 @@
+import shutil
+
+import pytest
+
+from config import PRODUCT_DB_PATH
+from Tools import sql_db_tool
+from Tools.db_migrations import migrate_database
+from Tools.product_search import ProductSearch, build_match_query
+from Tools.query_templates import QueryTemplateLibrary
+from Tools.sql_cache import SqlCache
+from Tools.tool_results import SqlRows
+
+VALID_QUERY = "SELECT ProductID, ProductTitle, ProductPrice FROM StockTable WHERE ProductTitle LIKE '%Плед%' LIMIT 3"
+
+
+@pytest.fixture
+def isolated_tool(monkeypatch):
+    """sql_db_tool with empty caches, no template log and no FTS/vector shortcuts."""
+    monkeypatch.setattr(sql_db_tool, "sql_cache", SqlCache())
+    monkeypatch.setattr(sql_db_tool, "query_templates", QueryTemplateLibrary(log_path=None))
+    monkeypatch.setattr(sql_db_tool, "SQL_DB_TOOL_FTS_MODE", "off")
+    monkeypatch.setattr(sql_db_tool, "SQL_DB_TOOL_VECTOR_MODE", "off")
+    monkeypatch.setattr(sql_db_tool, "SQL_DB_TOOL_TEMPLATES_ENABLED", False)
+    monkeypatch.setattr(sql_db_tool, "SQL_DB_TOOL_RETRY_MODE", "sequential")
+    return sql_db_tool
+
+
+def test_query_rejected_by_guard_is_rephrased(isolated_tool, monkeypatch):
+    prompts = []
+
+    def rephrase_query(state):
+        prompts.append(state["result"])
+        return VALID_QUERY
+
+    monkeypatch.setattr(isolated_tool, "write_query", lambda state: {"query": "DELETE FROM StockTable"})
+    monkeypatch.setattr(isolated_tool, "rephrase_query", rephrase_query)
+
+    result = isolated_tool.find_data_in_db("Чи є у вас пледи?", [])
+
+    assert isinstance(prompts[0], str) and prompts[0].startswith("Error")
+    assert isinstance(result, SqlRows) and len(result) > 0
+
+
+def test_random_queries_are_not_served_from_the_result_cache(isolated_tool, monkeypatch):
+    executed = []
+    execute = isolated_tool.sql_guard.execute
+
+    def counting_execute(sql):
+        executed.append(sql)
+        return execute(sql)
+
+    monkeypatch.setattr(isolated_tool.sql_guard, "execute", counting_execute)
+    random_query = "SELECT ProductID, ProductTitle FROM StockTable ORDER BY RANDOM() LIMIT 1"
+
+    for query in (random_query, random_query, VALID_QUERY, VALID_QUERY):
+        isolated_tool.execute_query({"query": query})
+
+    assert executed == [random_query, random_query, VALID_QUERY]
+
+
+def test_price_limited_question_gets_approximate_search_rows_after_retries(isolated_tool, monkeypatch, tmp_path):
+    db_path = str(tmp_path / "database.db")
+    shutil.copyfile(PRODUCT_DB_PATH, db_path)
+    migrate_database(db_path)
+    search = ProductSearch(db_path)
+    monkeypatch.setattr(isolated_tool, "search_products", search.search)
+    monkeypatch.setattr(isolated_tool, "SQL_DB_TOOL_FTS_MODE", "fallback")
+    empty_query = "SELECT ProductID, ProductTitle, ProductPrice FROM StockTable WHERE ProductPrice < 0"
+    rephrased = []
+
+    def rephrase_query(state):
+        rephrased.append(state["query"])
+        return empty_query
+
+    monkeypatch.setattr(isolated_tool, "write_query", lambda state: {"query": empty_query})
+    monkeypatch.setattr(isolated_tool, "rephrase_query", rephrase_query)
+
+    result = isolated_tool.find_data_in_db("Покажи подушки до 300 грн", [])
+
+    assert rephrased
+    assert isinstance(result, SqlRows) and len(result) > 0
+    assert result.note and result.to_text().startswith("Note:")
+    search.pool.close()
+
+
+def test_all_words_must_match_before_any_word_does():
+    assert build_match_query("зелений чай", match_all=True).count(" AND ") == 1
+    assert " AND " not in build_match_query("зелений чай")
@@ -0,0 +1,23 @@
+import json
+
+from Tools.sql_guard import cte_names, sql_guard
+
+
+def error_code(result):
+    assert isinstance(result, str) and result.startswith("Error: ")
+    return json.loads(result[len("Error: "):])["code"]
+
+
+def test_recursive_cte_is_allowed():
+    query = "WITH RECURSIVE ids(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM ids WHERE n < 3) SELECT n FROM ids"
+
+    assert sql_guard.execute(query).rows == ((1,), (2,), (3,))
+    assert cte_names("WITH RECURSIVE ids(n) AS (SELECT 1), \"Cheap\" AS (SELECT 2) SELECT 3") == {"ids", "cheap"}
+
+
+def test_authorizer_denials_are_not_reported_as_syntax_errors():
+    assert error_code(sql_guard.execute("SELECT load_extension('x')")) == "not_allowed"
+    assert error_code(sql_guard.execute("SELECT name FROM sqlite_master")) == "not_allowed"
+    assert error_code(sql_guard.execute("WITH sqlite_master AS (SELECT 1) SELECT * FROM main.sqlite_master")) \
+        == "not_allowed"
+    assert error_code(sql_guard.execute("SELECT Missing FROM StockTable")) == "invalid_sql"
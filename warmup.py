@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from config import WARMUP_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Component:
+    """
+    Ресурс, що ініціалізується ліниво: FAISS-індекс, схема бази, LLM-клієнт тощо.
+    Без обов'язкового (required) компонента сервіс не готовий приймати запити.
+    """
+    name: str
+    load: Callable[[], object]
+    required: bool = True
+    state: str = "pending"
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Warmup:
+    """
+    Прогрів лінивих ресурсів у фоні після старту: імпорт застосунку лишається швидким і без побічних
+    ефектів, а перший запит користувача не чекає на завантаження індексів. Компоненти прогріваються
+    паралельно; помилка одного не зупиняє інші й видна в /readyz.
+    """
+
+    def __init__(self, components: Iterable[tuple] = (), max_workers: int = WARMUP_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.components: Dict[str, Component] = {}
+        self.seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        for name, load, required in components:
+            self.register(name, load, required)
+
+    def register(self, name: str, load: Callable[[], object], required: bool = True) -> None:
+        self.components[name] = Component(name, load, required)
+
+    def _load(self, component: Component) -> None:
+        component.state = "loading"
+        started = time.perf_counter()
+        try:
+            component.load()
+            component.state, component.error = "ready", None
+        except Exception as e:
+            component.state, component.error = "failed", f"{type(e).__name__}: {e}"
+            logger.warning("Warm-up of %s failed: %s", component.name, component.error)
+        component.seconds = round(time.perf_counter() - started, 3)
+
+    def run(self) -> None:
+        """Прогріває всі компоненти й чекає на завершення."""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="warmup") as pool:
+            list(pool.map(self._load, self.components.values()))
+        self.seconds = round(time.perf_counter() - started, 3)
+        logger.info("Warm-up finished in %.3f s: %s", self.seconds,
+                    {name: component.state for name, component in self.components.items()})
+
+    def start(self) -> None:
+        """Запускає прогрів у фоновому потоці (повторний виклик нічого не робить)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return all(component.state == "ready" for component in self.components.values() if component.required)
+
+    def report(self) -> Dict[str, dict]:
+        return {name: {"state": component.state, "required": component.required, "seconds": component.seconds,
+                       "error": component.error}
+                for name, component in self.components.items()}
+
+
+def default_components() -> List[tuple]:
+    """(назва, завантаження, обов'язковий) для всіх лінивих ресурсів застосунку."""
+    from Agent.history import count_tokens
+    from Agent.main_agent import get_main_agent_pipeline
+    from Tools import holiday_info_tool, shop_info_tool, sql_db_tool
+    from Tools.db_migrations import migrate_database
+    from Tools.product_catalog import product_catalog
+    from Tools.product_vector_index import get_product_vector_index
+    from Tools.query_templates import query_templates
+
+    def load_product_catalog():
+        # Міграції схеми (індекси, FTS5) пишуть у базу, тому виконуються тут або командою
+        # python -m Tools.db_migrations, а не на шляху запиту, де з'єднання лише для читання
+        migrate_database()
+        product_catalog.refresh(force=True)
+
+    return [
+        ("main_agent", get_main_agent_pipeline, True),
+        ("sql_database", sql_db_tool.get_db, True),
+        ("sql_schema", sql_db_tool.schema_snapshot.table_info, True),
+        ("sql_llm", sql_db_tool.get_llm, True),
+        ("product_catalog", load_product_catalog, True),
+        ("holiday_index", holiday_info_tool.get_vectorstore, True),
+        ("shop_info", shop_info_tool.get_shop_documents, True),
+        ("shop_info_index", shop_info_tool.get_vectorstore, False),
+        # Індекс будується офлайн і може бути відсутнім; тоді векторний пошук просто вимкнений
+        ("product_vector_index", get_product_vector_index, False),
+        # Шаблони SQL вивчаються з журналу запитів до першого питання, а не під час нього
+        ("sql_templates", query_templates.load, False),
+        ("tokenizer", lambda: count_tokens("warm-up"), False),
+    ]
+
+
+warmup = Warmup(default_components())